@@ -1,10 +1,12 @@
 import os
+import json
 import subprocess
 import sys
 import hashlib
 import zipfile
 import tempfile
 from datetime import datetime
+import hw_compiler
 
 def _md5_of_file(path):
     h = hashlib.md5()
@@ -47,6 +49,9 @@ def _compute_current_md5_map(dir_path):
 def _maps_equal(a, b):
     return a == b
 
+# 生成 RP2040 (Cortex-M0+) 机器码，@micropython.native/viper 函数才能编译
+MPY_ARCH = '-march=armv6m'
+
 def _compile_py_files(fw_upload_dir, mpy_cross_path, mpy_out_dir):
     success_count = 0
     fail_count = 0
@@ -59,7 +64,7 @@ def _compile_py_files(fw_upload_dir, mpy_cross_path, mpy_out_dir):
             print(f"Compiling {filename}...", end=" ", flush=True)
             try:
                 result = subprocess.run(
-                    [mpy_cross_path, py_file, '-o', mpy_file],
+                    [mpy_cross_path, MPY_ARCH, py_file, '-o', mpy_file],
                     capture_output=True,
                     text=True,
                     cwd=fw_upload_dir
@@ -79,6 +84,51 @@ def _compile_py_files(fw_upload_dir, mpy_cross_path, mpy_out_dir):
                 fail_count += 1
     return success_count, fail_count
 
+def _report_mpy_sizes(mpy_out_dir):
+    # 各模块 .mpy 大小（即板上导入时需载入的字节码），导入后的实际 RAM 占用用 ram_budget.py 在板上测量
+    sizes = []
+    for name in os.listdir(mpy_out_dir):
+        if name.endswith('.mpy'):
+            sizes.append((os.path.getsize(os.path.join(mpy_out_dir, name)), name))
+    if not sizes:
+        return
+    print("-" * 50)
+    print(f"{'module':<24}{'mpy bytes':>10}")
+    for size, name in sorted(sizes, reverse=True):
+        print(f"{name:<24}{size:>10}")
+    print(f"{'total':<24}{sum(s for s, _ in sizes):>10}")
+
+def _validate_hw_profile(fw_upload_dir):
+    profile_path = os.path.join(fw_upload_dir, 'hw_profile.json')
+    try:
+        with open(profile_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return hw_compiler.compile_profile(config)
+    except (OSError, ValueError) as e:
+        errors = [f"{profile_path}: {e}"]
+    except hw_compiler.ConfigError as e:
+        errors = e.errors
+    print("Error: invalid hw_profile.json")
+    for err in errors:
+        print(f"  {err}")
+    sys.exit(1)
+
+def _compile_device_table(tables, mpy_cross_path, mpy_out_dir):
+    # 生成 hw_devices.py 并编译为 mpy，固件启动时直接加载，不再解析 JSON
+    py_file = os.path.join(mpy_out_dir, 'hw_devices.py')
+    mpy_file = os.path.join(mpy_out_dir, 'hw_devices.mpy')
+    with open(py_file, 'w') as f:
+        f.write(hw_compiler.render_table(*tables))
+    print("Compiling hw_devices.py...", end=" ", flush=True)
+    result = subprocess.run([mpy_cross_path, py_file, '-o', mpy_file], capture_output=True, text=True)
+    os.remove(py_file)
+    if result.returncode == 0:
+        print("OK")
+        return True
+    print("FAILED")
+    print(f"\n  Error: {result.stderr.strip() or result.returncode}")
+    return False
+
 def _write_version(version_path, prefix=None):
     ts = datetime.now().strftime('%Y%m%d%H%M%S')
     value = f"{prefix or 'fw_upload_to_pyboard_'}{ts}"
@@ -135,6 +185,8 @@ def build_mpy():
     print(f"Target: {fw_upload_dir}")
     print("-" * 50)
 
+    tables = _validate_hw_profile(fw_upload_dir)
+
     existing_map = _read_md5_file(md5_path)
     current_map = _compute_current_md5_map(fw_upload_dir)
 
@@ -148,6 +200,10 @@ def build_mpy():
         else:
             print("MD5变更或缺失：开始编译并更新元数据")
         success_count, fail_count = _compile_py_files(fw_upload_dir, mpy_cross_path, mpy_out_dir)
+        if _compile_device_table(tables, mpy_cross_path, mpy_out_dir):
+            success_count += 1
+        else:
+            fail_count += 1
         _write_md5_file(md5_path, current_map)
         new_version = None
         try:
@@ -160,6 +216,7 @@ def build_mpy():
                 new_version = _write_version(version_path)
         except Exception:
             new_version = _write_version(version_path)
+        _report_mpy_sizes(mpy_out_dir)
         _zip_outputs(fw_upload_dir, zip_output_path, mpy_out_dir)
         print("-" * 50)
         print(f"编译完成 成功: {success_count}, 失败: {fail_count}")
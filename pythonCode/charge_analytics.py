@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import zlib
+import argparse
+
+import numpy as np
+
+# 与固件 meas_log.py 的 RECORD '<IBBHhH' 一致
+RECORD_DTYPE = np.dtype([
+    ("ticks", "<u4"),
+    ("slot", "u1"),
+    ("status", "u1"),
+    ("voltage", "<u2"),
+    ("current", "<i2"),
+    ("soc", "<u2"),
+])
+CHUNK_SYNC = b"\xAA\x55"
+CHUNK_HEADER = np.dtype([("first", "<u4"), ("count", "<u2")])
+# MicroPython ticks_ms 在 2**30 处回绕
+TICKS_PERIOD = 1 << 30
+
+SUMMARY_FIELDS = (
+    "fixture", "slot", "samples", "duration_s", "v_min", "v_max", "i_max",
+    "soc_start", "soc_end", "charge_mah", "discharge_mah", "capacity_mah", "soh_pct",
+)
+
+
+def parse_export(data):
+    """解析 log_export 输出的分块二进制流，校验失败的块被丢弃
+    Args:
+        data: 串口抓取的原始字节，可夹杂文本回复
+    Returns:
+        (index, records)：全局记录序号数组与 RECORD_DTYPE 结构化数组，按序号去重排序
+    """
+    data = bytes(data)
+    indexes = []
+    chunks = []
+    pos = data.find(CHUNK_SYNC)
+    while pos >= 0 and pos + 8 <= len(data):
+        header = np.frombuffer(data, CHUNK_HEADER, 1, pos + 2)[0]
+        end = pos + 8 + int(header["count"]) * RECORD_DTYPE.itemsize
+        if end + 4 <= len(data):
+            crc = int.from_bytes(data[end:end + 4], "little")
+            if zlib.crc32(data[pos + 2:end]) == crc:
+                chunks.append(np.frombuffer(data, RECORD_DTYPE, int(header["count"]), pos + 8))
+                indexes.append(np.arange(header["first"], header["first"] + header["count"], dtype=np.int64))
+                pos = data.find(CHUNK_SYNC, end + 4)
+                continue
+        pos = data.find(CHUNK_SYNC, pos + 1)
+    if not chunks:
+        return np.zeros(0, np.int64), np.zeros(0, RECORD_DTYPE)
+    index = np.concatenate(indexes)
+    records = np.concatenate(chunks)
+    index, keep = np.unique(index, return_index=True)
+    return index, records[keep]
+
+
+def load_records(path, mmap=True):
+    """读取原始记录文件（连续 12 字节记录），长时间运行的数据用 memmap 免拷贝"""
+    if mmap:
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, RECORD_DTYPE)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+    return np.fromfile(path, dtype=RECORD_DTYPE)
+
+
+def append_records(path, records):
+    """把记录追加到原始记录文件，供后续 memmap 读取"""
+    with open(path, "ab") as f:
+        np.ascontiguousarray(records, dtype=RECORD_DTYPE).tofile(f)
+
+
+class SampleTable:
+    """多夹具、多通道样本的列式表，按 (fixture, slot, 时间) 排序
+
+    列：fixture, slot, t (s), voltage (V), current (mA), soc (%), status
+    """
+
+    def __init__(self, fixture, slot, t, voltage, current, soc, status):
+        key = fixture.astype(np.int64) * 256 + slot
+        order = np.lexsort((t, key))
+        self.fixture = fixture[order]
+        self.slot = slot[order]
+        self.t = t[order]
+        self.voltage = voltage[order]
+        self.current = current[order]
+        self.soc = soc[order]
+        self.status = status[order]
+        self.key = key[order]
+        # 每个 (fixture, slot) 分组的起始下标，供 reduceat 使用
+        if len(self.key):
+            self.starts = np.flatnonzero(np.r_[True, self.key[1:] != self.key[:-1]])
+        else:
+            self.starts = np.zeros(0, np.int64)
+
+    @classmethod
+    def from_records(cls, records, fixture_ids=None):
+        """由一个或多个夹具的记录数组构建
+        Args:
+            records: RECORD_DTYPE 数组或其列表（每个夹具一个）
+            fixture_ids: 对应的夹具编号，默认 0..n-1
+        """
+        if isinstance(records, np.ndarray):
+            records = [records]
+        if fixture_ids is None:
+            fixture_ids = range(len(records))
+        cols = {name: [] for name in ("fixture", "slot", "t", "voltage", "current", "soc", "status")}
+        for fid, rec in zip(fixture_ids, records):
+            cols["fixture"].append(np.full(len(rec), fid, np.int32))
+            cols["slot"].append(rec["slot"].astype(np.int32))
+            cols["t"].append(unwrap_ticks(rec["ticks"]) / 1000.0)
+            cols["voltage"].append(rec["voltage"] / 1000.0)
+            cols["current"].append(rec["current"].astype(np.float64))
+            cols["soc"].append(rec["soc"] / 256.0)
+            cols["status"].append(rec["status"].astype(np.int32))
+        if not cols["fixture"]:
+            empty = np.zeros(0)
+            return cls(empty.astype(np.int32), empty.astype(np.int32), empty, empty, empty, empty, empty.astype(np.int32))
+        return cls(*[np.concatenate(cols[name]) for name in ("fixture", "slot", "t", "voltage", "current", "soc", "status")])
+
+    def __len__(self):
+        return len(self.t)
+
+    @property
+    def groups(self):
+        return len(self.starts)
+
+    def _group_mask(self):
+        # 相邻两点属于同一分组时为 True
+        return self.key[1:] == self.key[:-1]
+
+
+def unwrap_ticks(ticks):
+    """展开 ticks_ms 回绕，返回从第一条记录起单调递增的毫秒数（int64）"""
+    ticks = np.asarray(ticks, np.int64)
+    if len(ticks) == 0:
+        return ticks
+    step = np.diff(ticks) % TICKS_PERIOD
+    return ticks[0] + np.concatenate(([0], np.cumsum(step)))
+
+
+def coulomb_count(table):
+    """按分组做梯形积分的库仑计数
+    Returns:
+        (charge_mah, discharge_mah)：每个分组的充入/放出电量，均为正数
+    """
+    if table.groups == 0:
+        return np.zeros(0), np.zeros(0)
+    dt_h = np.diff(table.t) / 3600.0
+    i_avg = 0.5 * (table.current[1:] + table.current[:-1])
+    dq = np.where(table._group_mask(), i_avg * dt_h, 0.0)
+    # 第 k 段积分归属于其起点所在的分组
+    dq = np.r_[dq, 0.0]
+    charge = np.add.reduceat(np.where(dq > 0, dq, 0.0), table.starts)
+    discharge = np.add.reduceat(np.where(dq < 0, -dq, 0.0), table.starts)
+    return charge, discharge
+
+
+def summarize(table, design_capacity_mah=None):
+    """计算每个 (fixture, slot) 分组的统计量，返回列名到数组的字典"""
+    starts = table.starts
+    if table.groups == 0:
+        return {name: np.zeros(0) for name in SUMMARY_FIELDS}
+    ends = np.r_[starts[1:], len(table)] - 1
+    charge, discharge = coulomb_count(table)
+    soc_start = table.soc[starts]
+    soc_end = table.soc[ends]
+    d_soc = np.abs(soc_end - soc_start)
+    moved = np.where(charge >= discharge, charge, discharge)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        capacity = np.where(d_soc > 0, moved / (d_soc / 100.0), np.nan)
+        if design_capacity_mah:
+            soh = capacity / float(design_capacity_mah) * 100.0
+        else:
+            soh = np.full(len(starts), np.nan)
+    return {
+        "fixture": table.fixture[starts],
+        "slot": table.slot[starts],
+        "samples": np.diff(np.r_[starts, len(table)]),
+        "duration_s": table.t[ends] - table.t[starts],
+        "v_min": np.minimum.reduceat(table.voltage, starts),
+        "v_max": np.maximum.reduceat(table.voltage, starts),
+        "i_max": np.maximum.reduceat(np.abs(table.current), starts),
+        "soc_start": soc_start,
+        "soc_end": soc_end,
+        "charge_mah": charge,
+        "discharge_mah": discharge,
+        "capacity_mah": capacity,
+        "soh_pct": soh,
+    }
+
+
+def charge_curves(table, grid_s, column="soc"):
+    """把每个分组的曲线插值到统一的相对时间网格上
+    Args:
+        grid_s: 相对各分组起点的时间点（秒）
+        column: 'soc' / 'voltage' / 'current'
+    Returns:
+        (groups, len(grid_s)) 数组，超出分组时间范围的点为 NaN
+    """
+    grid_s = np.asarray(grid_s, np.float64)
+    if table.groups == 0:
+        return np.zeros((0, len(grid_s)))
+    y = getattr(table, column)
+    starts = table.starts
+    ends = np.r_[starts[1:], len(table)]
+    group = np.repeat(np.arange(table.groups), ends - starts)
+    t_rel = table.t - table.t[starts][group]
+    # 分组编号乘以足够大的跨度拼成一条单调时间轴，一次 searchsorted 完成全部分组
+    span = float(np.max(t_rel) + np.max(np.abs(grid_s)) + 1.0)
+    axis = group * span + t_rel
+    query = (np.arange(table.groups)[:, None] * span + grid_s[None, :]).ravel()
+    hi = np.searchsorted(axis, query, side="right")
+    g = np.repeat(np.arange(table.groups), len(grid_s))
+    hi = np.clip(hi, starts[g] + 1, ends[g] - 1)
+    lo = hi - 1
+    x0, x1 = axis[lo], axis[hi]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(x1 > x0, (query - x0) / (x1 - x0), 0.0)
+    out = y[lo] + w * (y[hi] - y[lo])
+    g_last = table.t[ends - 1] - table.t[starts]
+    inside = (grid_s[None, :] >= 0) & (grid_s[None, :] <= g_last[:, None])
+    # 只有一个点的分组仅在 t=0 处有值
+    single = (ends - starts) == 1
+    out = out.reshape(table.groups, len(grid_s))
+    out[single] = y[starts[single]][:, None]
+    return np.where(inside, out, np.nan)
+
+
+def evaluate(summary, limits):
+    """按上下限判定每个分组是否通过
+    Args:
+        summary: summarize() 的结果
+        limits: {列名: [下限, 上限]}，任一端可为 None
+    Returns:
+        (passed, failed)：布尔数组与 {列名: 失败布尔数组}
+    """
+    n = len(summary["slot"])
+    passed = np.ones(n, bool)
+    failed = {}
+    for name, (lo, hi) in limits.items():
+        if name not in summary:
+            raise KeyError(f"unknown summary field '{name}'")
+        v = np.asarray(summary[name], np.float64)
+        bad = np.isnan(v)
+        if lo is not None:
+            bad |= v < lo
+        if hi is not None:
+            bad |= v > hi
+        failed[name] = bad
+        passed &= ~bad
+    return passed, failed
+
+
+def _load_any(path):
+    with open(path, "rb") as f:
+        head = f.read(2)
+    if head == CHUNK_SYNC or path.endswith(".log"):
+        with open(path, "rb") as f:
+            return parse_export(f.read())[1]
+    return load_records(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="充放电数据分析：每个文件为一个夹具的 log_export 抓包或原始记录文件")
+    parser.add_argument("files", nargs="+", help="log_export 抓包 (.log) 或原始记录文件 (.bin)")
+    parser.add_argument("--design-capacity", type=float, default=None, help="电池设计容量 mAh，用于估算 SOH")
+    parser.add_argument("--limits", default=None, help="判定上下限 JSON 文件 {字段: [下限, 上限]}")
+    args = parser.parse_args()
+
+    table = SampleTable.from_records([_load_any(p) for p in args.files])
+    summary = summarize(table, args.design_capacity)
+    limits = {}
+    if args.limits:
+        with open(args.limits, "r", encoding="utf-8") as f:
+            limits = json.load(f)
+    passed, failed = evaluate(summary, limits)
+
+    print(",".join(SUMMARY_FIELDS + ("result", "failed")))
+    for i in range(len(passed)):
+        row = [os.path.basename(args.files[int(summary["fixture"][i])]), str(int(summary["slot"][i]))]
+        row += [f"{float(summary[name][i]):.3f}" for name in SUMMARY_FIELDS[2:]]
+        row.append("PASS" if passed[i] else "FAIL")
+        row.append(" ".join(name for name, bad in failed.items() if bad[i]))
+        print(",".join(row))
+    fail_count = int(np.count_nonzero(~passed))
+    print(f"# {len(passed)} slots, {fail_count} failed, {len(table)} samples", file=sys.stderr)
+    sys.exit(1 if fail_count else 0)
+
+
+if __name__ == "__main__":
+    main()
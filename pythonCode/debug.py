@@ -3,6 +3,12 @@ from mix.driver.bus.soft_i2c import rtSoftI2CBus
 import machine as m
 from mix.driver.ic.cat9555 import CAT9555
 from mix.driver.ic.om70201wv import OM70201WV
+from meas_log import MeasLog
+from slot_test import SlotTester, FrameDispatcher, RUN_PLAN, LOG_EXPORT, log_export_handler
+from fastbits import reverse_bits, field_set
+from i2c_trace import TracingI2CBus
+from sc89620_snapshot import ChargerSnapshot, decode, diff
+from fuel_gauge import FuelGaugeSession
 
 class XL9555GPIO(object):
 
@@ -54,7 +60,7 @@ class XL9555GPIO(object):
             return (12+ slot*3 + 2) % 16
 
 class ByteRegister(object):
-    __slot__ = ['address', 'value']
+    __slots__ = ('address', 'value')
 
     def __init__(self, address, value):
         self.address = address
@@ -65,11 +71,7 @@ class ByteRegister(object):
         return ~value & ((1 << bit_length) - 1)
 
     def _reverse_bits_bitwise(self, value, bit_length=8):
-        reversed_value = 0
-        for i in range(bit_length):
-            # 将最低位移到目标位置
-            reversed_value |= ((value >> i) & 1) << (bit_length - 1 - i)
-        return reversed_value
+        return reverse_bits(value, bit_length)
 
     def get_bytes(self):
         res =  [self.value & 0xff, self.value >> 8]
@@ -78,15 +80,16 @@ class ByteRegister(object):
         return res
 
 i2c_ch0 = rtSoftI2CBus(9, 8, 100000)
-# print(i2c_ch0.scan())
+# print(i2c_ch0.is_ready(0x6B))
 i2c_ch1 = rtSoftI2CBus(7, 6, 100000)
-# print(i2c_ch1.scan())
+# print(i2c_ch1.is_ready(0x6B))
 i2c_ch2 = rtSoftI2CBus(5, 4, 100000)
-# print(i2c_ch2.scan())
-i2c_ch3 = rtSoftI2CBus(3, 2, 100000)
-# print(i2c_ch3.scan())
+# print(i2c_ch2.is_ready(0x6B))
+# slot3 的事务记录在 i2c_ch3.export(...) 中导出，用 i2c_replay.py 解码
+i2c_ch3 = TracingI2CBus(rtSoftI2CBus(3, 2, 100000))
+# print(i2c_ch3.is_ready(0x6B))
 base_i2c = rtSoftI2CBus(15, 14, 100000)
-# print(base_i2c.scan())
+# print(base_i2c.is_ready(0x20), base_i2c.is_ready(0x21))
 # int_ch0 = m.Pin(10, m.Pin.IN, m.Pin.PULL_UP)
 # int_ch1 = m.Pin(11, m.Pin.IN, m.Pin.PULL_UP)
 # int_ch2 = m.Pin(12, m.Pin.IN, m.Pin.PULL_UP)
@@ -97,6 +100,12 @@ slot1 = SC89620(0x6B, i2c_ch1)
 slot2 = SC89620(0x6B, i2c_ch2)
 slot3 = SC89620(0x6B, i2c_ch3)
 soc_3 = OM70201WV(0x38, i2c_ch3)
+# 电量计只初始化一次，SOC 在 max_age_ms 内直接取缓存
+gauge_3 = FuelGaugeSession(soc_3, max_age_ms=1000, bus=i2c_ch3)
+# 每个槽位的寄存器快照，一次轮询每槽只需两次突发读
+snapshots = [ChargerSnapshot(bus) for bus in (i2c_ch0, i2c_ch1, i2c_ch2, i2c_ch3)]
+# 充放电测量记录存在本板（充电芯片所在的板），由 log_export (0x3E) 帧导出
+meas_log = MeasLog()
 
 
 
@@ -105,6 +114,24 @@ com_gpio1 = CAT9555(0x21, base_i2c)
 ctl = XL9555GPIO(com_gpio0, com_gpio1)
 ctl.reset()
 ctl.switch_charge(3, True) # turn charge  switch on
+# run_plan (0x3D): one request runs a whole OQC plan on all four slots
+tester = SlotTester(ctl, [slot0, slot1, slot2, slot3], [None, None, None, gauge_3], log=meas_log,
+                    snapshots=snapshots)
+dispatcher = FrameDispatcher()
+dispatcher.register(RUN_PLAN, tester.handle_run_plan)
+
+
+def serve(uart=None):
+    """从串口接收 0x25 指令帧并应答，get_cmd.py --batch 的 run_plan 由此执行，
+    get_cmd.py --export-log 的测量记录由 log_export 直接写到串口"""
+    uart = uart or m.UART(0, baudrate=115200)
+    dispatcher.register(LOG_EXPORT, log_export_handler(meas_log, uart.write))
+    while True:
+        if uart.any():
+            for frame in dispatcher.feed(uart.read()):
+                uart.write(frame)
+        else:
+            time.sleep_ms(1)
 
 
 def write_read(client, reg, start_bit, value):
@@ -130,7 +157,7 @@ def write_read(client, reg, start_bit, value):
     print(f"寄存器0x{reg:02X}: 0x{current_value:02X} -> 0x{new_value:02X} (bit{start_bit}={value})")
     return new_value
 
-def write_read_multi_bits(client, reg, start_bit, bit_count, value):
+def write_read_multi_bits(client, reg, start_bit, bit_count, value, snap=None, readback=True):
     """
     修改寄存器的多个连续位，其他位保持不变
     
@@ -140,23 +167,24 @@ def write_read_multi_bits(client, reg, start_bit, bit_count, value):
     start_bit: 起始位位置 (0-7)
     bit_count: 位数量
     value: 要设置的值
+    snap: ChargerSnapshot，给出时当前值取自快照，不再单独读取
+    readback: 写入后是否回读确认
     """
-    # 读取当前寄存器值
-    current_value = client.read_register(reg)
-    
-    # 创建掩码，清除目标位
+    # 创建掩码，替换目标位
     mask = ((1 << bit_count) - 1) << start_bit
-    cleared_value = current_value & ~mask
-    
-    # 设置新值
-    new_value = cleared_value | ((value & ((1 << bit_count) - 1)) << start_bit)
-    
-    # 写回新值
-    client.write_register(reg, new_value)
+    if snap is not None:
+        current_value, new_value = snap.update(reg, mask, start_bit, value)
+    else:
+        # 读取当前寄存器值
+        current_value = client.read_register(reg)
+        new_value = field_set(current_value, mask, start_bit, value)
+        # 写回新值
+        client.write_register(reg, new_value)
     print(f"寄存器0x{reg:02X}: 0x{current_value:02X} -> 0x{new_value:02X} (bit{start_bit}~{start_bit+bit_count-1}={value})")
 
-    r = client.read_register(reg)
-    print(f"readback 寄存器0x{reg:02X}: 0x{r:02X}")
+    if readback:
+        r = client.read_register(reg)
+        print(f"readback 寄存器0x{reg:02X}: 0x{r:02X}")
 
 
 
@@ -164,52 +192,74 @@ def write_read_multi_bits(client, reg, start_bit, bit_count, value):
     return new_value
 
 
-def init(client):
+def init(client, snap=None):
+    # 给出快照时先突发读一次，后续改位不再逐个读取寄存器
+    if snap is not None:
+        snap.refresh()
     r = client.read_register(0x38)
     print("PN_Information Register 0x38-->: {:02X}".format(r))
-    write_read_multi_bits(client, 0x17, 7, 1, 1)
+    write_read_multi_bits(client, 0x17, 7, 1, 1, snap)
     client.write_register(0x90, 0x08)
     print("寄存器0x90: 0x08")
     client.write_register(0x91, 0x5D)
     print("寄存器0x91: 0x5D")
     client.write_register(0x92, 0x40)
     print("寄存器0x92: 0x40")
-    write_read_multi_bits(client, 0x18, 5, 1, 0)
-    write_read_multi_bits(client, 0x10, 5, 3, 0b101)
-    write_read_multi_bits(client, 0x18, 4, 1, 0)
+    write_read_multi_bits(client, 0x18, 5, 1, 0, snap)
+    write_read_multi_bits(client, 0x10, 5, 3, 0b101, snap)
+    write_read_multi_bits(client, 0x18, 4, 1, 0, snap)
     # write_read_multi_bits_multi_bits(client, 0x02, 6, )
-    write_read_multi_bits(client, 0x10, 0, 5, 0b00001)
+    write_read_multi_bits(client, 0x10, 0, 5, 0b00001, snap)
     # write_read_multi_bits(client, 0x14, 6, )
-    write_read_multi_bits(client, 0x12, 0, 4, 0b0001)
-    write_read_multi_bits(client, 0x04, 0, 7, 70)
-
-    write_read_multi_bits(client, 0x14, 4, 2, 0b00)
-    write_read_multi_bits(client, 0x14, 0, 1, 0)
-    write_read_multi_bits(client, 0x14, 3, 1, 0b1)
-    write_read_multi_bits(client, 0x15, 4, 1, 0b0)
-    write_read_multi_bits(client, 0x16, 0, 2, 0b00)
-    write_read_multi_bits(client, 0x15, 2, 1, 0b1)
-    write_read_multi_bits(client, 0x15, 1, 1, 0b0)
-    write_read_multi_bits(client, 0x15, 0, 1, 0b0)
-    write_read_multi_bits(client, 0x08, 5, 1, 0b0)
-    write_read_multi_bits(client, 0x06, 6, 2, 0b01)
-    write_read_multi_bits(client, 0x12, 5, 3, 0b011)
-    write_read_multi_bits(client, 0x14, 1, 2, 0b00)
-    write_read_multi_bits(client, 0x23, 2, 1, 1)
-    write_read_multi_bits(client, 0x23, 3, 1, 1)
-
-    write_read_multi_bits(client, 0x15, 6, 1, 0)
-    write_read_multi_bits(client, 0x1A, 7, 1, 1)
+    write_read_multi_bits(client, 0x12, 0, 4, 0b0001, snap)
+    write_read_multi_bits(client, 0x04, 0, 7, 70, snap)
+
+    write_read_multi_bits(client, 0x14, 4, 2, 0b00, snap)
+    write_read_multi_bits(client, 0x14, 0, 1, 0, snap)
+    write_read_multi_bits(client, 0x14, 3, 1, 0b1, snap)
+    write_read_multi_bits(client, 0x15, 4, 1, 0b0, snap)
+    write_read_multi_bits(client, 0x16, 0, 2, 0b00, snap)
+    write_read_multi_bits(client, 0x15, 2, 1, 0b1, snap)
+    write_read_multi_bits(client, 0x15, 1, 1, 0b0, snap)
+    write_read_multi_bits(client, 0x15, 0, 1, 0b0, snap)
+    write_read_multi_bits(client, 0x08, 5, 1, 0b0, snap)
+    write_read_multi_bits(client, 0x06, 6, 2, 0b01, snap)
+    write_read_multi_bits(client, 0x12, 5, 3, 0b011, snap)
+    write_read_multi_bits(client, 0x14, 1, 2, 0b00, snap)
+    write_read_multi_bits(client, 0x23, 2, 1, 1, snap)
+    write_read_multi_bits(client, 0x23, 3, 1, 1, snap)
+
+    write_read_multi_bits(client, 0x15, 6, 1, 0, snap)
+    write_read_multi_bits(client, 0x1A, 7, 1, 1, snap)
 
 
     # print(hex(client.read_register(0x02)))
     # print(hex(client.read_register(0x04)))
 
-def get_soc():
-    soc_3.init_ic()
-    r = soc_3.get_soc()
-    soc_value = r[0] + (r[1]) / 256.0
-    print("SOC: {:.2f}%".format(soc_value))
+def poll_chargers(changes=True):
+    """突发读取四个槽位的全部充电寄存器，打印与上次相比变化的寄存器"""
+    states = []
+    for slot, snap in enumerate(snapshots):
+        prev = snap.copy() if snap.ticks is not None else None
+        try:
+            regs = snap.refresh()
+        except OSError as e:
+            print(f"slot{slot}: {e}")
+            states.append(None)
+            continue
+        if changes and prev is not None:
+            for reg, old, new in diff(prev, regs):
+                print(f"slot{slot} 寄存器0x{reg:02X}: 0x{old:02X} -> 0x{new:02X}")
+        states.append(decode(regs))
+    return states
+
+
+def get_soc(max_age_ms=None):
+    soc = gauge_3.soc(max_age_ms)
+    print("SOC: {}.{:02d}%".format(soc >> 8, (soc & 0xFF) * 100 >> 8))
+    # 同时读取 VBAT/IBAT，作为一条完整记录写入 meas_log
+    mv, ma, soc = tester.sample(3)
+    print("VBAT: {} mV IBAT: {} mA".format(mv, ma))
 
 
 import time
@@ -240,4 +290,6 @@ def init2(client):
 # init(slot3)
 init2(slot3)
 
-# print(hex(slot3.read_register(0x04)))
\ No newline at end of file
+# print(hex(slot3.read_register(0x04)))
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,466 @@
+import os
+import re
+import sys
+import time
+import errno
+import asyncio
+import termios
+import struct
+import argparse
+
+BAUD_RATES = {
+    9600: termios.B9600,
+    19200: termios.B19200,
+    38400: termios.B38400,
+    57600: termios.B57600,
+    115200: termios.B115200,
+}
+for _rate in (230400, 460800, 921600, 1000000, 1500000, 2000000):
+    if hasattr(termios, f"B{_rate}"):
+        BAUD_RATES[_rate] = getattr(termios, f"B{_rate}")
+
+
+# 与 b06_main.BAUD_CONFIRM_MS 对应：确认等待须短于板端窗口，失败后等板端回退
+BAUD_CONFIRM_TIMEOUT = 0.5
+BAUD_REVERT_DELAY = 1.2
+
+
+class FixtureError(Exception):
+    pass
+
+
+class FixtureTimeout(FixtureError):
+    pass
+
+
+class FixtureBusy(FixtureError):
+    pass
+
+
+def open_serial(path, baudrate=115200):
+    """以原始模式、非阻塞方式打开串口或 pty，返回文件描述符"""
+    if baudrate not in BAUD_RATES:
+        raise ValueError(f"unsupported baudrate {baudrate}")
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        set_baudrate(fd, baudrate)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+def set_baudrate(fd, baudrate):
+    """把 fd 配置为 8N1 原始模式并设置波特率"""
+    attrs = termios.tcgetattr(fd)
+    attrs[0] = 0                                              # iflag
+    attrs[1] = 0                                              # oflag
+    attrs[2] = termios.CS8 | termios.CREAD | termios.CLOCAL   # cflag
+    attrs[3] = 0                                              # lflag
+    attrs[4] = attrs[5] = BAUD_RATES[baudrate]
+    attrs[6][termios.VMIN] = 0
+    attrs[6][termios.VTIME] = 0
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+
+class Reply:
+    """一条指令的回复
+    Attributes:
+        ok: 板端返回 [OK] 为 True
+        payload: 状态行之前的全部输出（bytes，可能含二进制导出数据）
+        status: 状态行文本，如 'fixture_run [OK]'
+        latency: 从发出到收到状态行的秒数
+    """
+
+    def __init__(self, port, command, ok, payload, status, latency):
+        self.port = port
+        self.command = command
+        self.ok = ok
+        self.payload = payload
+        self.status = status
+        self.latency = latency
+
+    @property
+    def lines(self):
+        return self.payload.decode(errors="replace").splitlines()
+
+    def __repr__(self):
+        return f"Reply({self.port}, {self.command!r}, ok={self.ok}, status={self.status!r}, {self.latency * 1000:.1f}ms)"
+
+
+def format_command(command, *args):
+    return " ".join([command] + [str(a) for a in args])
+
+
+def decode_oqc_frame(payload):
+    """解析 oqc_loopback 的结果帧
+    Returns:
+        [(输出图案, 输入位), ...]，bit i 对应 OQC_OUTPUTS[i] / OQC_INPUTS[i]
+    """
+    start = payload.find(b"\x25\x30")
+    if start < 0 or len(payload) < start + 7:
+        raise FixtureError("no oqc_loopback frame in reply")
+    n = payload[start + 4]
+    end = start + 5 + n * 3
+    frame = payload[start:end + 2]
+    if len(frame) != n * 3 + 7 or frame[3] != 0x55 or frame[-1] != 0x0A:
+        raise FixtureError("truncated oqc_loopback frame")
+    check = 0
+    for b in frame[:-2]:
+        check ^= b
+    if check != frame[-2]:
+        raise FixtureError("oqc_loopback frame checksum mismatch")
+    return [struct.unpack_from("<BH", frame, 5 + i * 3) for i in range(n)]
+
+
+def _terminators(name):
+    # UARTManager._execute_cmd 的全部结束行
+    return (
+        (f"{name} [OK]\n".encode(), True),
+        (f"{name} [ERR]\n".encode(), False),
+        (b"not found function [ERR]\n", False),
+    )
+
+
+# 带序号的结束行："#<seq> <name> [OK]"、"#<seq> [ERR] <msg>"、"#<seq> [BUSY]"
+_SEQ_STATUS = re.compile(rb"#(\d+) ([^#]*(?:\[OK\]|\[ERR\]|\[BUSY\])[^#]*)\n$")
+
+
+def _find_status(buf, name):
+    """在接收缓冲中查找结束行，返回 (状态行起点, 结束位置, ok)"""
+    best = None
+    for term, ok in _terminators(name):
+        pos = buf.find(term)
+        if pos >= 0 and (best is None or pos < best[0]):
+            best = (pos, pos + len(term), ok)
+    # 异常回复 "[ERR] <msg>\n"，只认行首
+    pos = buf.find(b"[ERR] ")
+    while pos >= 0:
+        if pos == 0 or buf[pos - 1:pos] == b"\n":
+            end = buf.find(b"\n", pos)
+            if end >= 0 and (best is None or pos < best[0]):
+                best = (pos, end + 1, False)
+            break
+        pos = buf.find(b"[ERR] ", pos + 1)
+    return best
+
+
+class FixturePort:
+    """一个夹具串口的持久连接
+
+    sequenced=True 时每条请求带 "#<seq>" 序号，最多 window 条同时在途（流水线），
+    板端在结束行中回显序号，据此匹配回复；板端队列满时回复 [BUSY]，请求稍后重试。
+    sequenced=False 兼容旧固件，一次只有一条在途。在途数达到上限时 request() 挂起（背压）。
+
+    Args:
+        name: 夹具名称
+        path: 串口设备或 pty 路径
+        baudrate: 波特率
+        window: 最多同时在途的请求数，应不大于板端队列深度 (8)
+        sequenced: 是否使用序号
+    """
+
+    BUSY_DELAY = 0.02
+
+    def __init__(self, name, path, baudrate=115200, window=8, sequenced=True):
+        self.name = name
+        self.path = path
+        self.baudrate = baudrate
+        self.sequenced = sequenced
+        self._window = window if sequenced else 1
+        self._fd = None
+        self._rx = bytearray()
+        self._rx_event = None
+        self._slots = None
+        self._write_lock = None
+        self._seq = 0
+        self._inflight = {}
+        self._payload = bytearray()
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self._fd = open_serial(self.path, self.baudrate)
+        self._rx_event = asyncio.Event()
+        self._slots = asyncio.Semaphore(self._window)
+        self._write_lock = asyncio.Lock()
+        loop.add_reader(self._fd, self._on_readable)
+
+    async def close(self):
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        for _line, future, _start in self._inflight.values():
+            if not future.done():
+                future.set_exception(FixtureError(f"{self.name}: port closed"))
+        self._inflight.clear()
+
+    async def request(self, command, *args, timeout=10.0, retries=0):
+        """发送一条指令并等待回复
+        Args:
+            command: 板端方法名，如 'fixture_run'
+            args: 参数，按空格拼接
+            timeout: 单次等待结束行的秒数
+            retries: 超时后的重试次数，只对可重复执行的指令使用；[BUSY] 总会重试
+        Returns:
+            Reply
+        """
+        name = command.lower()
+        line = format_command(command, *args)
+        attempt = 0
+        while True:
+            try:
+                async with self._slots:
+                    if self.sequenced:
+                        return await self._transact_seq(line, timeout)
+                    return await self._transact(name, line, timeout)
+            except FixtureBusy:
+                await asyncio.sleep(self.BUSY_DELAY)
+            except FixtureTimeout:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+
+    async def negotiate_baud(self, rate):
+        """与板端协商切换波特率，确认失败时两端都回到原波特率；
+        协商期间不应有其他请求在途
+        Returns:
+            协商后的波特率
+        """
+        if rate not in BAUD_RATES:
+            raise ValueError(f"unsupported baudrate {rate}")
+        old = self.baudrate
+        if rate == old:
+            return old
+        reply = await self.request("baud", rate)
+        if not reply.ok:
+            return old
+        # 板端发完结束行后才切换
+        await asyncio.sleep(0.01)
+        set_baudrate(self._fd, rate)
+        self._rx.clear()
+        self._payload.clear()
+        try:
+            confirm = await self.request("baud_confirm", timeout=BAUD_CONFIRM_TIMEOUT)
+            if confirm.ok:
+                self.baudrate = rate
+                return rate
+        except FixtureTimeout:
+            pass
+        set_baudrate(self._fd, old)
+        await asyncio.sleep(BAUD_REVERT_DELAY)
+        self._rx.clear()
+        self._payload.clear()
+        return old
+
+    async def _transact_seq(self, line, timeout):
+        self._seq = self._seq % 99999 + 1
+        seq = self._seq
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[seq] = (line, future, time.monotonic())
+        try:
+            await self._write(f"#{seq} {line}\n".encode())
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise FixtureTimeout(f"{self.name}: no reply to '#{seq} {line}' within {timeout}s")
+        finally:
+            self._inflight.pop(seq, None)
+
+    async def _transact(self, name, line, timeout):
+        self._rx.clear()
+        start = time.monotonic()
+        await self._write(line.encode() + b"\n")
+        deadline = start + timeout
+        while True:
+            found = _find_status(self._rx, name)
+            if found:
+                pos, end, ok = found
+                payload = bytes(self._rx[:pos])
+                status = self._rx[pos:end].decode(errors="replace").strip()
+                del self._rx[:end]
+                return Reply(self.name, line, ok, payload, status, time.monotonic() - start)
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self._rx.clear()
+                raise FixtureTimeout(f"{self.name}: no reply to '{line}' within {timeout}s")
+            self._rx_event.clear()
+            try:
+                await asyncio.wait_for(self._rx_event.wait(), left)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _write(self, data):
+        # 多条流水线请求并发写入时保证每行完整
+        async with self._write_lock:
+            view = memoryview(data)
+            while view:
+                try:
+                    n = os.write(self._fd, view)
+                    view = view[n:]
+                except BlockingIOError:
+                    await self._wait_writable()
+
+    async def _wait_writable(self):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_writer(self._fd, ready.set_result, None)
+        try:
+            await ready
+        finally:
+            loop.remove_writer(self._fd)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EIO):
+                return
+            raise
+        if not data:
+            return
+        self._rx += data
+        if self.sequenced:
+            self._dispatch_lines()
+        else:
+            self._rx_event.set()
+
+    def _dispatch_lines(self):
+        # 指令按序执行，上一结束行之后、本结束行之前的输出都属于本条指令
+        while True:
+            end = self._rx.find(b"\n")
+            if end < 0:
+                return
+            line = bytes(self._rx[:end + 1])
+            del self._rx[:end + 1]
+            match = None
+            for match in _SEQ_STATUS.finditer(line):
+                pass
+            if match is None:
+                self._payload += line
+                continue
+            self._payload += line[:match.start()]
+            seq = int(match.group(1))
+            status = match.group(2).decode(errors="replace").strip()
+            payload = bytes(self._payload)
+            self._payload.clear()
+            entry = self._inflight.get(seq)
+            if entry is None:
+                # 已超时请求的迟到回复，连同其输出一起丢弃
+                continue
+            line_sent, future, start = entry
+            if future.done():
+                continue
+            if status == "[BUSY]":
+                future.set_exception(FixtureBusy(f"{self.name}: board queue full"))
+            else:
+                ok = status.endswith("[OK]")
+                future.set_result(Reply(self.name, line_sent, ok, payload, status, time.monotonic() - start))
+
+
+class FixtureLine:
+    """同时控制多台夹具
+
+    .. code-block:: python
+
+        async with FixtureLine({"A": "/dev/ttyACM0", "B": "/dev/ttyACM1"}) as line:
+            replies = await line.run_all("fixture_run")
+    """
+
+    def __init__(self, ports, baudrate=115200, window=8, sequenced=True):
+        self.ports = {name: FixturePort(name, path, baudrate, window, sequenced) for name, path in ports.items()}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        await asyncio.gather(*[port.open() for port in self.ports.values()])
+
+    async def close(self):
+        await asyncio.gather(*[port.close() for port in self.ports.values()])
+
+    async def negotiate_baud(self, rate):
+        """所有夹具并发协商波特率
+        Returns:
+            {name: 协商后的波特率}
+        """
+        names = list(self.ports)
+        rates = await asyncio.gather(*[self.ports[n].negotiate_baud(rate) for n in names])
+        return dict(zip(names, rates))
+
+    async def run(self, name, command, *args, **kwargs):
+        return await self.ports[name].request(command, *args, **kwargs)
+
+    async def run_all(self, command, *args, names=None, **kwargs):
+        """在多台夹具上并发执行同一条指令
+        Returns:
+            {夹具名: Reply 或异常}
+        """
+        names = list(self.ports) if names is None else list(names)
+        results = await asyncio.gather(
+            *[self.ports[n].request(command, *args, **kwargs) for n in names],
+            return_exceptions=True,
+        )
+        return dict(zip(names, results))
+
+    async def pipeline(self, name, commands, **kwargs):
+        """在一台夹具上流水线发送多条指令，按发送顺序返回回复
+        Args:
+            commands: [(command, arg, ...), ...]
+        """
+        return await asyncio.gather(*[self.ports[name].request(*cmd, **kwargs) for cmd in commands])
+
+
+def _parse_port(text):
+    if "=" in text:
+        name, path = text.split("=", 1)
+    else:
+        name, path = os.path.basename(text), text
+    return name, path
+
+
+async def _main(args):
+    ports = dict(_parse_port(p) for p in args.port)
+    async with FixtureLine(ports, args.baud, sequenced=not args.no_seq) as line:
+        if args.fast_baud:
+            for name, rate in (await line.negotiate_baud(args.fast_baud)).items():
+                if rate != args.fast_baud:
+                    print(f"{name}: staying at {rate} baud", file=sys.stderr)
+        results = await line.run_all(args.command, *args.args, timeout=args.timeout, retries=args.retries)
+    failed = 0
+    for name, reply in results.items():
+        if isinstance(reply, Exception):
+            failed += 1
+            print(f"{name}: ERROR {reply}")
+            continue
+        if not reply.ok:
+            failed += 1
+        if args.command.lower() == "oqc_loopback":
+            for pattern, bits in decode_oqc_frame(reply.payload):
+                print(f"{name}: out {pattern:08b} -> in {bits:012b}")
+        else:
+            for text in reply.lines:
+                print(f"{name}: {text}")
+        print(f"{name}: {reply.status} ({reply.latency * 1000:.1f} ms)")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在多台夹具上并发执行 b06_main 指令")
+    parser.add_argument("--port", action="append", required=True, help="NAME=/dev/ttyACM0，可重复")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--retries", type=int, default=0)
+    parser.add_argument("--no-seq", action="store_true", help="不带序号，兼容旧固件")
+    parser.add_argument("--fast-baud", type=int, default=0, help="执行前协商切换到该波特率，如 921600")
+    parser.add_argument("command")
+    parser.add_argument("args", nargs="*")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args)))
+
+
+if __name__ == "__main__":
+    main()
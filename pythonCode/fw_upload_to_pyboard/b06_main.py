@@ -1,35 +1,144 @@
 import re
 import time
+import micropython
+from array import array
 from machine import Pin, UART, PWM
 from led_board import LEDBoard
+from mem_profiler import MemProfiler
+from supervisor import Supervisor
+from kvstore import KVStore
+from timing import timed
+from wakeup import Wakeup, EV_INPUT
+from i2c_trace import TracingI2CBus
+from i2c_worker import I2CWorker
+from gpio_sampler import GPIOSampler
+from oqc_loopback import OQCLoopback, walking_ones
+from uart_tx import TxBuffer, BAUD_RATES
+import timing
 import json
-from machine import Timer, WDT
+from machine import Timer
+
+# 硬中断中出错时仍能打印异常
+micropython.alloc_emergency_exception_buf(100)
+
+DEFAULT_BAUDRATE = 115200
+# 切换波特率后等待主机 baud_confirm 的时间，超时回退到原波特率
+BAUD_CONFIRM_MS = 1000
+# 指令返回此值时结束行由 worker 回调在执行完成后发出
+_DEFERRED = object()
 
 
 class UARTManager:
 
-    def __init__(self):
-        self.uart = UART(0, baudrate=115200, tx=Pin(0), rx=Pin(1))
+    def __init__(self, queue_depth=8):
+        # 一条指令的全部输出先写入 TxBuffer，执行完后一次发出
+        self.uart = TxBuffer(UART(0, baudrate=DEFAULT_BAUDRATE, tx=Pin(0), rx=Pin(1)))
+        self.baudrate = DEFAULT_BAUDRATE
+        self._baud_pending = None
+        self._baud_prev = None
+        self._baud_deadline = None
         self.buffer = bytearray()
         self._running = True
-        
+        # 待执行指令队列 (seq, cmd)，seq 为 None 表示未带序号
+        self._cmd_queue = []
+        self._queue_depth = queue_depth
+        # 正在执行的指令序号，供延后回复的指令使用
+        self._seq = None
+        # 主循环在 machine.idle() 中等待，收到数据后由 UART 中断唤醒
+        self.wake = Wakeup()
+        self._has_input = self.has_input
+        self._uart_irq()
+
+    def _uart_irq(self):
+        try:
+            self.uart.irq(handler=self.wake.uart_handler, trigger=UART.IRQ_RXIDLE)
+        except (AttributeError, ValueError, TypeError):
+            # 固件不支持 UART 中断时，每次唤醒轮询 uart.any()
+            pass
+
+    def has_input(self):
+        return bool(self._cmd_queue) or self.uart.any() > 0
+
+    @timed("process")
     def process(self):
+        if self._baud_deadline is not None and time.ticks_diff(time.ticks_ms(), self._baud_deadline) >= 0:
+            # 主机没有在新波特率下确认，回到原波特率
+            self._baud_deadline = None
+            self._set_baud(self._baud_prev)
         if self.uart.any() > 0:
-            time.sleep_ms(20)
+            # 不完整的行留在 buffer 中，等下一次唤醒补齐
             data = self.uart.read()
             for byte in data:
                 self.buffer.append(byte)
                 if byte == 0x0A:  # 检测换行符
-                    cmd = bytes(self.buffer).strip()
-                    self._execute_cmd(cmd)
+                    self._enqueue_cmd(bytes(self.buffer).strip())
                     self.buffer = bytearray()
+        # 每次循环只执行一条，保证 scan/看门狗在连续指令之间得到运行
+        if self._cmd_queue:
+            seq, cmd = self._cmd_queue.pop(0)
+            self._execute_cmd(cmd, seq)
+        self.uart.flush()
+        if self._baud_pending is not None:
+            # 结束行以原波特率发完后再切换
+            rate = self._baud_pending
+            self._baud_pending = None
+            self._baud_prev = self.baudrate
+            self._set_baud(rate)
+            self._baud_deadline = time.ticks_add(time.ticks_ms(), BAUD_CONFIRM_MS)
+
+    def _set_baud(self, rate):
+        self.uart.drain()
+        self.uart.init(baudrate=rate)
+        self._uart_irq()
+        self.baudrate = rate
+        # 切换前后收到的字节按错误的波特率解码，丢弃
+        self.buffer = bytearray()
+        if self.uart.any() > 0:
+            self.uart.read()
+
+    def baud(self, rate):
+        """协商切换波特率：回复 [OK] 后切换，主机须在 BAUD_CONFIRM_MS 内
+        以新波特率发送 baud_confirm，否则自动回退
+        Args:
+            rate: 目标波特率，见 BAUD_RATES
+        """
+        if rate not in BAUD_RATES:
+            self.uart.write("supported: {}\n".format(" ".join(str(r) for r in BAUD_RATES)))
+            return False
+        self._baud_pending = rate
+        return True
+
+    def baud_confirm(self):
+        if self._baud_deadline is None:
+            return False
+        self._baud_deadline = None
+        self.uart.write("baud {} tx_writes {} tx_bytes {}\n".format(self.baudrate, self.uart.writes, self.uart.sent))
+        return True
+
+    def _enqueue_cmd(self, cmd):
+        """指令入队，"#<seq> <cmd>" 形式的序号会在结束行中原样返回"""
+        seq = None
+        if cmd.startswith(b"#"):
+            head, _, cmd = cmd.partition(b" ")
+            seq = head[1:].decode()
+        if len(self._cmd_queue) >= self._queue_depth:
+            self._reply_status(seq, "[BUSY]")
+            return
+        self._cmd_queue.append((seq, cmd))
+
+    def _reply_status(self, seq, text):
+        if seq is None:
+            self.uart.write("{}\n".format(text))
+        else:
+            self.uart.write("#{} {}\n".format(seq, text))
 
     def stop(self):
         self._running = False
         if self.uart:
             self.uart = None
                 
-    def _execute_cmd(self, command):
+    @timed("execute_cmd")
+    def _execute_cmd(self, command, seq=None):
         command = command.decode().lower()  # 将字节类型转换为字符串并转换为小写
         cmd_list = command.split(" ")
         func_name = cmd_list.pop(0)
@@ -39,25 +148,21 @@ class UARTManager:
                 args.append(self._parse_value(i))
         func = getattr(self, func_name, None)
         if callable(func):
-            if len(args) > 0:
-                try:
-                    if func(*args):
-                        self.uart.write(b"{} [OK]\n".format(func_name))
-                    else:
-                        self.uart.write(b"{} [ERR]\n".format(func_name))
-                except Exception as e:
-                    self.uart.write(b"[ERR] " + str(e).encode() + b"\n")
-            else:
-                try:
-                    if func():
-                        self.uart.write(b"{} [OK]\n".format(func_name))
-                    else:
-                        self.uart.write(b"{} [ERR]\n".format(func_name))
-                except Exception as e:
-                    self.uart.write(b"[ERR] " + str(e).encode() + b"\n")
+            self.sup.mark(func_name)
+            self._seq = seq
+            try:
+                result = func(*args)
+                if result is _DEFERRED:
+                    pass
+                elif result:
+                    self._reply_status(seq, "{} [OK]".format(func_name))
+                else:
+                    self._reply_status(seq, "{} [ERR]".format(func_name))
+            except Exception as e:
+                self._reply_status(seq, "[ERR] " + str(e))
         else:
             #not found function
-            self.uart.write(b"not found function [ERR]\n")
+            self._reply_status(seq, "not found function [ERR]")
 
     def _parse_value(self, value):
 
@@ -129,33 +234,95 @@ class InputDev:
 
     def __init__(self, pin, pull_up=True):
         self.pin = Pin(pin, Pin.IN, Pin.PULL_UP if pull_up else Pin.PULL_DOWN)
+        self.bit = 1 << pin
+        self.pull_up = pull_up
+        # 接入 GPIOSampler 后读取去抖后的电平
+        self.sampler = None
+        self._watch = None
         if pull_up:
             self.last_state = 1
         else:
             self.last_state = 0
         # self.last_state = self.pin.value()
         self.dev = []
-
-    def read(self):
-        if self.pin.value() != self.last_state:
+        # 绑定动作在 bind 时固定为元组，中断里只记录电平和时间戳
+        self._actions = ()
+        self._edge_level = 0
+        self._edge_stamp = 0
+        self._pending = False
+        # edges, runs, coalesced, dropped, total us, max us
+        self.irq_stats = array('I', [0] * 6)
+        self._run_actions_ref = self._run_actions
+
+    def level(self, state=None):
+        """当前电平，有采样器时取去抖后的快照
+        Args:
+            state: GPIOSampler.state 快照，None 表示取最新值
+        """
+        if self.sampler is None:
+            return self.pin.value()
+        if state is None:
+            state = self.sampler.state
+        return 1 if state & self.bit else 0
+
+    def read(self, state=None):
+        if self.level(state) != self.last_state:
             return True
         return False
 
     def bind(self, dev, mode):
         self.dev.append(dev)
-        self.pin.irq(handler=self.callback, trigger=InputDev.mode[mode])
+        self._actions = tuple(self.dev)
+        self.pin.irq(handler=self.callback, trigger=InputDev.mode[mode], hard=True)
         
     def unbind(self):
         self.dev = []
-        self.pin.irq(None)
+        self._actions = ()
+        if self._watch is not None:
+            self.pin.irq(handler=self._watch, trigger=InputDev.mode["IRQ_RISING_FALLING"])
+        else:
+            self.pin.irq(None)
+
+    def watch(self, handler):
+        """电平变化时调用 handler(pin) 唤醒主循环，已绑定的输入在 callback 中调用"""
+        self._watch = handler
+        if not self.dev:
+            self.pin.irq(handler=handler, trigger=InputDev.mode["IRQ_RISING_FALLING"])
 
     def callback(self, _pin):
-        current_state = _pin.value()
+        """硬中断：不分配内存，记录电平后由 micropython.schedule 执行动作"""
+        self.irq_stats[0] += 1
+        self._edge_level = _pin.value()
+        if self._pending:
+            # 上一次边沿的动作尚未执行，按最新电平合并执行
+            self.irq_stats[2] += 1
+        else:
+            self._edge_stamp = time.ticks_us()
+            self._pending = True
+            try:
+                micropython.schedule(self._run_actions_ref, None)
+            except RuntimeError:
+                self._pending = False
+                self.irq_stats[3] += 1
+        if self._watch is not None:
+            self._watch(_pin)
+
+    def _run_actions(self, _arg):
+        current_state = self._edge_level
+        self._pending = False
         if current_state == 0:  # 按钮被按下
-            [dev.on() for dev in self.dev]
+            for dev in self._actions:
+                dev.on()
         else:  # 按钮被释放
-            [dev.off() for dev in self.dev]
+            for dev in self._actions:
+                dev.off()
         self.last_state = current_state
+        stats = self.irq_stats
+        latency = time.ticks_diff(time.ticks_us(), self._edge_stamp)
+        stats[1] += 1
+        stats[4] = (stats[4] + latency) & 0xFFFFFFFF
+        if latency > stats[5]:
+            stats[5] = latency
 
 class Button(InputDev):
     def __init__(self, pin, pull_up=True, long_press=1500):
@@ -164,8 +331,8 @@ class Button(InputDev):
         self.last_time = None
         self.state = 0
 
-    def read_status(self):
-        current_state = self.pin.value()
+    def read_status(self, state=None):
+        current_state = self.level(state)
         current_time = time.ticks_ms()
         # 对于上拉按钮，0表示按下，1表示释放
         if current_state == 0:  # 按钮被按下
@@ -186,27 +353,93 @@ class Sensor(InputDev):
         super().__init__(pin, pull_up)
 
 
+DEVICE_CLASSES = {
+    "OutputDev": OutputDev,
+    "LED": LED,
+    "Cylinder": Cylinder,
+    "Button": Button,
+    "Sensor": Sensor,
+}
+
+
+SCAN_PERIOD_MS = 10
+IDLE_PERIOD_MS = 50
+# 输入采样周期，4 次采样一致才认为电平变化
+SAMPLE_PERIOD_MS = 2
+FIXTURE_SENSORS = ("in_sensor", "out_sensor", "up_sensor", "down_sensor")
+
+
 class ControlBoardManager(UARTManager):
     def __init__(self, config_file):
         super().__init__()
         self.devices = {}
-        self.devices['ledboard'] = LEDBoard()
-        self.fixture_config = {}
+        self.use_i2c_worker = False
         self.load_config(config_file)
         self.load_fixture_config()
+        self.sup = Supervisor(timeout=500, deadline=100)
+        self._breath_task = self.sup.register("breath")
+        # LEDBoard 的 I2C 全部经 worker 执行；未启用时 submit 直接在本核心调用
+        self.worker = I2CWorker(sup=self.sup)
+        if self.use_i2c_worker:
+            self.worker.start()
         self.timer = Timer()
         self.duty = 32768
         self.step = 400
         self.pwm = PWM(Pin(29, Pin.OUT), freq=1000, duty_u16=32768)
         self.timer.init(period=10, mode=Timer.PERIODIC, callback=self.breath)
         self.flag = False
-        # self.wdt = WDT(timeout=8388)
+        # 按键按下期间按 SCAN_PERIOD_MS 轮询长按，否则只在输入中断后扫描
+        self._held = False
+        for dev in self.devices.values():
+            if isinstance(dev, InputDev):
+                dev.watch(self.wake.input_handler)
+        self._init_sampler()
+        self.mem = MemProfiler()
+        self.i2c_trace = None
+        # OQC 引脚表在首次 oqc_* 指令时创建，会把传感器输入改为无上拉
+        self._oqc = None
+
+    def _init_sampler(self):
+        """所有输入由 GPIOSampler 一次读取并去抖，去抖后的变化唤醒主循环"""
+        pins = rest = 0
+        inputs = [dev for dev in self.devices.values() if isinstance(dev, InputDev)]
+        for dev in inputs:
+            pins |= dev.bit
+            if dev.pull_up:
+                rest |= dev.bit
+        self.sampler = GPIOSampler(pins, rest, on_change=self.wake.input_handler)
+        for dev in inputs:
+            dev.sampler = self.sampler
+        # 联锁条件 (mask, value) 按需计算一次后缓存
+        self._locks = {}
+        self.sampler.start(SAMPLE_PERIOD_MS)
+
+    def _interlock(self, names, levels):
+        """传感器联锁条件
+        Args:
+            names: 传感器名称元组
+            levels: 对应的期望 read() 结果元组
+        Returns:
+            GPIOSampler.check 使用的 (mask, value)
+        """
+        key = (names, levels)
+        lock = self._locks.get(key)
+        if lock is None:
+            active = inactive = 0
+            for name, level in zip(names, levels):
+                if level:
+                    active |= self.devices[name].bit
+                else:
+                    inactive |= self.devices[name].bit
+            lock = self._locks[key] = self.sampler.interlock(active, inactive)
+        return lock
 
     def breath(self, t):
         self.pwm.duty_u16(self.duty)
         self.duty += self.step
         if self.duty >= 65535 or self.duty <= 0:
             self.step = -self.step
+        self.sup.watch(self._breath_task)
         # self.devices['ledboard'] = LEDBoard()
 
     def bind_device(self, source_name, target_name, mode):
@@ -222,7 +455,7 @@ class ControlBoardManager(UARTManager):
 
     def create_device(self, name, config):
         # 获取设备类型
-        device_class = globals().get(config['class'])
+        device_class = DEVICE_CLASSES.get(config['class'])
         if not device_class:
             raise ValueError(f"Unknown device class: {config['class']}")
             
@@ -232,10 +465,37 @@ class ControlBoardManager(UARTManager):
         self.devices[name] = device
         return device
 
+    def load_device_table(self, devices, bindings, ledboard=None):
+        """加载 hw_compiler.py 预编译的设备表，已在构建时校验
+        Args:
+            devices: (name, class, args) 元组序列
+            bindings: (source, target, mode) 元组序列
+            ledboard: LEDBoard 的关键字参数 (扩展芯片地址、槽位数、引脚)
+        """
+        self.devices['ledboard'] = LEDBoard(**(ledboard or {}))
+        for name, cls, args in devices:
+            self.devices[name] = DEVICE_CLASSES[cls](*args)
+        for source, target, mode in bindings:
+            if mode:
+                self.devices[source].bind(self.devices[target], mode)
+            else:
+                self.devices[source].bind(self.devices[target])
+
     def load_config(self, config_file):
+        # 优先使用构建时生成的设备表，缺失时回退到解析 JSON
+        try:
+            import hw_devices
+        except ImportError:
+            hw_devices = None
+        if hw_devices is not None:
+            self.load_device_table(hw_devices.DEVICES, hw_devices.BINDINGS, getattr(hw_devices, "LEDBOARD", None))
+            self.use_i2c_worker = getattr(hw_devices, "I2C_WORKER", False)
+            return
         with open(config_file, 'r') as f:
             config = json.load(f)
-            
+        self.use_i2c_worker = config.get('i2c_worker', False)
+        self.devices['ledboard'] = LEDBoard(**config.get('ledboard', {}))
+
         # 创建设备
         for name, device_config in config['device'].items():
             self.create_device(name, device_config)
@@ -275,33 +535,28 @@ class ControlBoardManager(UARTManager):
             raise ValueError(f"Device '{name}' not found")
         return device
 
-    def load_fixture_config(self, config_file="fixture_config.json"):
-        """加载夹具配置参数
+    def load_fixture_config(self, config_file="fixture_config.kv", legacy_file="fixture_config.json"):
+        """加载夹具配置参数，首次启动时从 legacy_file 导入
         Args:
-            config_file: 配置文件路径
+            config_file: 追加写日志文件路径
+            legacy_file: 旧版 JSON 配置文件路径
         """
-        try:
-            with open(config_file, 'r') as f:
-                self.fixture_config = json.load(f)
-        except Exception as e:
-            print(f"Error loading fixture config: {str(e)}")
-            self.fixture_config = {}
+        self.fixture_config = KVStore(config_file, legacy_file=legacy_file)
 
-    def save_fixture_config(self, config_file="fixture_config.json"):
-        """保存夹具配置参数
-        Args:
-            config_file: 配置文件路径
-        """
+    def save_fixture_config(self):
+        """压缩夹具配置日志，每个参数只保留一条记录"""
         try:
-            self.fixture_config["last_modified"] = time.strftime("%Y-%m-%d")
-            with open(config_file, 'w') as f:
-                f.write(json.dumps(self.fixture_config))
+            self.fixture_config.compact()
         except Exception as e:
             print(f"Error saving fixture config: {str(e)}")
 
+    @timed("scan")
     def scan(self):
-        reset_button = self.devices.get("reset_button").read_status()
-        start_button = self.devices.get("start_button").read_status()
+        # 两个按键取同一次采样的快照
+        state = self.sampler.state
+        reset_button = self.devices.get("reset_button").read_status(state)
+        start_button = self.devices.get("start_button").read_status(state)
+        self._held = reset_button != 0 or start_button != 0
         if reset_button == 2 and not self.flag:
             self.fixture_reset()
             self.flag = True
@@ -312,27 +567,41 @@ class ControlBoardManager(UARTManager):
             self.flag = False
 
     def run(self):
-
+        events = EV_INPUT  # 启动后先扫描一次按键
         while self._running:
-            self.scan()
+            self.mem.begin()
+            if events & EV_INPUT or self._held:
+                self.sup.mark("scan")
+                self.scan()
+            self.sup.mark("process")
             self.process()
-            time.sleep_ms(10)
-            # self.wdt.feed()
+            if self.worker.dispatch():
+                # 回调写入的结束行立即发出
+                self.uart.flush()
+            self.mem.end(self.uart.any() == 0)
+            # kick() 只在 RAM 中记录超时，在这里写入 flash
+            self.sup.mark("log")
+            self.sup.flush_log()
+            self.sup.mark("idle")
+            # 空闲等待不超过 IDLE_PERIOD_MS，保证看门狗 deadline 内 kick
+            events = self.wake.wait(SCAN_PERIOD_MS if self._held else IDLE_PERIOD_MS, self._has_input)
+            self.sup.kick()
 
     def fixture_in1(self):
         """
         in_out_cylder
         up_down_cylder
         """     
-        key_name_list = ["up_sensor", "down_sensor"]
-        if [self.devices[dev].read() for dev in key_name_list] == [True, False]:
+        if self.sampler.check(self._interlock(("up_sensor", "down_sensor"), (True, False))):
             _cylder = self.devices.get("in_out_cylder", None)
             if _cylder is None:
                 raise ValueError("Device in_out_cylder not found")
             _cylder.off()
+            scan_clear = self._interlock(("scan_sensor",), (False,))
             start_time = time.ticks_ms()
             while (True):
-                if not self.devices["scan_sensor"].read():
+                self.sup.kick()
+                if self.sampler.check(scan_clear):
                     _cylder.stop()
                     return True
                 if time.ticks_diff(time.ticks_ms(), start_time) > 3000:
@@ -356,8 +625,7 @@ class ControlBoardManager(UARTManager):
         in_out_cylder
         up_down_cylder
         """
-        key_name_list = ["up_sensor", "down_sensor"]
-        if [self.devices[dev].read() for dev in key_name_list] == [True, False]:
+        if self.sampler.check(self._interlock(("up_sensor", "down_sensor"), (True, False))):
         # return self._fix_ctl("in_out_cylder", "in_sensor", "out_sensor", False, True, True)
             return self._fix_ctl("in_out_cylder", False, True, True, False, False)
         else:
@@ -368,8 +636,7 @@ class ControlBoardManager(UARTManager):
         in_out_cylder
         up_down_cylder
         """
-        key_name_list = ["in_sensor", "out_sensor"]
-        if [self.devices[dev].read() for dev in key_name_list] == [True, False]:
+        if self.sampler.check(self._interlock(("in_sensor", "out_sensor"), (True, False))):
             return self._fix_ctl("up_down_cylder", True, False, True, False, True)
         else:
             return False
@@ -380,8 +647,7 @@ class ControlBoardManager(UARTManager):
         in_out_cylder
         up_down_cylder
         """
-        key_name_list = ["in_sensor", "out_sensor"]
-        if [self.devices[dev].read() for dev in key_name_list] == [True, False]:
+        if self.sampler.check(self._interlock(("in_sensor", "out_sensor"), (True, False))):
             return self._fix_ctl("up_down_cylder", True, False, False, True, False)
         else:
             return False
@@ -394,14 +660,14 @@ class ControlBoardManager(UARTManager):
         """
         # self.ctl_out(0)
         self.fixture_uninsert(1)
-        time.sleep_ms(500)
+        self.sup.sleep_ms(500)
         self._fix_ctl("up_down_cylder", True, False, True, False, True)
         return self._fix_ctl("in_out_cylder", False, True, True, False, False)
         
     def fixture_run(self):
         self.fixture_in()
         self.fixture_down()
-        time.sleep_ms(500)
+        self.sup.sleep_ms(500)
         return self.fixture_uninsert(0)
         # return self.ctl_out(1)
     
@@ -417,9 +683,9 @@ class ControlBoardManager(UARTManager):
     def loop_test(self, num):
         for i in range(num):
             self.fixture_run()
-            time.sleep_ms(1000)
+            self.sup.sleep_ms(1000)
             self.fixture_reset()
-            time.sleep_ms(1000)
+            self.sup.sleep_ms(1000)
         return True
 
     def loop_test1(self, num):
@@ -427,53 +693,99 @@ class ControlBoardManager(UARTManager):
             self.fixture_in()
             if not self.fixture_uninsert():
                 return False
-            time.sleep_ms(1000)
+            self.sup.sleep_ms(1000)
             self.fixture_out()
-            time.sleep_ms(1000)
+            self.sup.sleep_ms(1000)
         return True
 
+    def _submit_cmd(self, name, func, args=()):
+        """把指令的 I2C 操作交给 worker，结束行按执行结果回复
+        Args:
+            name: 指令名，用于结束行
+            func: 在 worker 中执行的函数
+            args: func 的参数
+        Returns:
+            _DEFERRED，已入队或已执行并回复；请求队列满时 False
+        """
+        seq = self._seq
+        replied = []
+
+        def done(value, error):
+            replied.append(1)
+            if error is not None:
+                self._reply_status(seq, "[ERR] " + str(error))
+            else:
+                self._reply_status(seq, "{} [{}]".format(name, "OK" if value else "ERR"))
+
+        # worker 未启动时 submit 直接执行并调用 done，异常由 _execute_cmd 回复
+        if self.worker.submit(func, args, done) is True or replied:
+            return _DEFERRED
+        return False
+
     def led_state_value(self, slot, value):
-        return self.devices["ledboard"].setState(slot, value)
+        board = self.devices["ledboard"]
+        # 参数在本核心检查，错误参数不进入 worker 队列
+        if not isinstance(slot, int) or not 0 <= slot < board.slots:
+            self.uart.write("slot must be 0-{}\n".format(board.slots - 1))
+            return False
+        if value not in ("r", "g", "b", "off"):
+            self.uart.write("state must be r, g, b or off\n")
+            return False
+        return self._submit_cmd("led_state_value", board.setState, (slot, value))
     
     def led_off(self):
-        return self.devices["ledboard"].reset()
+        return self._submit_cmd("led_off", self.devices["ledboard"].reset)
+
+    def workerinfo(self):
+        self.uart.write(self.worker.report())
+        return True
+
+    def _oqc_pins(self):
+        if self._oqc is None:
+            self._oqc = OQCLoopback()
+            self._oqc_labels = ["pin_{}: ".format(p) for p in self._oqc.inputs]
+        return self._oqc
 
     def oqc_test(self, _value=1):
-        input_pin = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21]
-        output_pin = [2, 3, 4, 5, 6, 7, 8, 9]
-        _input_list = []
-        for i in input_pin:
-            _input_list.append(Pin(i, Pin.IN))
-        _output_list = []
-        for i,v in enumerate(output_pin):
-            _output_list.append(Pin(v, Pin.OUT, Pin.PULL_DOWN))
-            _output_list[i].value(_value)
-        str_return = ""
-        for index, _pin in enumerate(_input_list):
-            str_return += "pin_{}: {}\n".format(input_pin[index], _pin.value())
-        self.uart.write(str_return)
+        oqc = self._oqc_pins()
+        oqc.drive((1 << len(oqc.outputs)) - 1 if _value else 0)
+        bits = oqc.read_inputs()
+        self.uart.write("".join([label + ("1\n" if bits & (1 << i) else "0\n")
+                                 for i, label in enumerate(self._oqc_labels)]))
         return True
 
     def oqc_get_status(self, pin_num):
-        input_pin = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21]
-        output_pin = [2, 3, 4, 5, 6, 7, 8, 9]
-        str_return = ""
-        if pin_num in input_pin:
-            _value = Pin(pin_num, Pin.IN).value()
-        elif pin_num in output_pin:
-            _value = Pin(pin_num, Pin.OUT, Pin.PULL_DOWN).value()
+        _pin = self._oqc_pins().pin(pin_num)
+        if _pin is None:
+            self.uart.write("pin_num error")
         else:
-            str_return = "pin_num error"
-        self.uart.write(str_return)
+            self.uart.write("pin_{}: {}\n".format(pin_num, _pin.value()))
         return True
 
     def oqc_set_pin(self, pin_num, value):
-        output_pin = [2, 3, 4, 5, 6, 7, 8, 9]
-        assert pin_num in output_pin
+        oqc = self._oqc_pins()
+        assert pin_num in oqc.outputs
         assert value in [0, 1]
-        Pin(pin_num, Pin.OUT, Pin.PULL_DOWN).value(value)
+        oqc.pin(pin_num).value(value)
         return True
 
+    def oqc_loopback(self, save=0):
+        """走 1 自检：全低、全高、逐个输出置高，每个图案一次性读回全部输入
+        Args:
+            save: 1 表示把本次结果保存为夹具配置 oqc_golden
+        Returns:
+            与 oqc_golden 一致（或尚未保存）时为 True，结果帧总是输出
+        """
+        oqc = self._oqc_pins()
+        results = oqc.sweep(walking_ones(len(oqc.outputs)))
+        self.uart.write(oqc.frame(results))
+        bits = [b for _, b in results]
+        if save:
+            self.fixture_config.set("oqc_golden", bits)
+            return True
+        golden = self.fixture_config.get("oqc_golden")
+        return golden is None or golden == bits
+
     def get_pin_status(self, name):
         dev = self.devices.get(name)
         try:
@@ -505,22 +817,85 @@ class ControlBoardManager(UARTManager):
             else:
                 self.uart.write("{}: {} \n".format(k, "None"))
         return True
+
+    def meminfo(self, collect=0):
+        if collect:
+            self.mem.collect()
+        self.uart.write(self.mem.report())
+        return True
+
+    def trace_i2c(self, enable=1, depth=256):
+        """开关 LEDBoard I2C 总线跟踪，跟踪缓冲在首次开启时分配
+        Args:
+            enable: 1 开启 / 0 关闭
+            depth: 记录条数，仅首次开启时有效
+        """
+        board = self.devices["ledboard"]
+        if self.i2c_trace is None:
+            if not enable:
+                return True
+            self.i2c_trace = TracingI2CBus(board._i2c, depth)
+        self.worker.submit(board.set_bus, (self.i2c_trace if enable else self.i2c_trace.bus,))
+        return True
+
+    def trace_export(self, clear=0):
+        if self.i2c_trace is None:
+            self.uart.write("trace off\n")
+            return False
+        self.i2c_trace.export(self.uart.write, kick=self.sup.kick)
+        if clear:
+            self.i2c_trace.clear()
+        return True
+
+    def wdtinfo(self):
+        self.uart.write(self.sup.report())
+        return True
+
+    def irqstat(self, clear=0):
+        """已绑定输入从边沿到动作执行的延时统计"""
+        for name, dev in self.devices.items():
+            if isinstance(dev, InputDev) and dev._actions:
+                s = dev.irq_stats
+                self.uart.write("{}: edges={} runs={} coalesced={} dropped={} avg_us={} max_us={}\n".format(
+                    name, s[0], s[1], s[2], s[3], s[4] // s[1] if s[1] else 0, s[5]))
+                if clear:
+                    for i in range(len(s)):
+                        s[i] = 0
+        return True
+
+    def gpioinfo(self):
+        self.uart.write(self.sampler.report())
+        return True
+
+    def loopstat(self, clear=0):
+        self.uart.write(self.wake.report())
+        if clear:
+            self.wake.reset()
+        return True
+
+    def timinginfo(self, clear=0):
+        self.uart.write(timing.report())
+        if clear:
+            timing.reset()
+        return True
             
 
     def _get_status(self):
         info = dict()
+        state = self.sampler.state
         for k, v in self.devices.items():
             if isinstance(v, InputDev):
-                info[k] = v.read()
+                info[k] = v.read(state)
         self.uart.write(json.dumps(info))
 
     def _fixture_para_get(self, key):
-        r = self.fixture_config.get(key)
+        # UART 参数可能被解析成数字，读写都按字符串键
+        r = self.fixture_config.get(str(key))
         self.uart.write(json.dumps(r))
 
     def _fixture_para_set(self, key, value):
-        self.fixture_config[key] = value
-        self.save_fixture_config()
+        self.fixture_config.set(str(key), value)
+        self.fixture_config.set("last_modified", "{:04d}-{:02d}-{:02d}".format(*time.localtime()[:3]))
         self.uart.write("Save   OK")
 
     def _fix_ctl(self, cylder_name, s1, s2, s3, s4, reverse=False, timeout=5000):
@@ -538,36 +913,29 @@ class ControlBoardManager(UARTManager):
         up_sensor  True
         down_sensor False
         """
-        key_name_list = ["in_sensor", "out_sensor", "up_sensor", "down_sensor"]
+        lock = self._interlock(FIXTURE_SENSORS, (s1, s2, s3, s4))
         start_time = time.ticks_ms()
         while time.ticks_diff(time.ticks_ms(), start_time) < timeout:
-            if [self.devices.get(k).read() for k in key_name_list] == [s1, s2, s3, s4]:
-            # k1_sensor = self.devices.get(k1).read()
-            # k2_sensor = self.devices.get(k2).read()
-            # k3_sensor = self.devices.get(k3).read()
-            # k4_sensor = self.devices.get(k4).read()
-            # if (k1_sensor, k2_sensor, k3_sensor, k4_sensor) 
+            if self.sampler.check(lock):
                 return True
-            time.sleep_ms(10)
+            self.sup.sleep_ms(10)
         return False
 
     def _ctl_out(self, value):
         name_list = ["ctl_out1", "ctl_out2"]
-        sensor_list = ['typec_sensor1', 'typec_sensor2']
+        sensor_list = ('typec_sensor1', 'typec_sensor2')
         try:
             if value:
                 [self.devices[name].on() for name in name_list]
+                lock = self._interlock(sensor_list, (True, True))
             else:
                 [self.devices[name].off() for name in name_list]
+                lock = self._interlock(sensor_list, (False, False))
             start_time = time.ticks_ms()
             while time.ticks_diff(time.ticks_ms(), start_time) < 2000:
-                if value:
-                    if [self.devices[name].read() for name in sensor_list] == [True, True]:
-                        return True
-                else:
-                    if [self.devices[name].read() for name in sensor_list] == [False, False]:
-                        return True
-                time.sleep_ms(10)
+                if self.sampler.check(lock):
+                    return True
+                self.sup.sleep_ms(10)
             return False
         except Exception as e:
             return False
@@ -1,20 +1,20 @@
 # -*- coding: utf-8 -*-
+from micropython import const
+from timing import timed
+
 
 __author__ = 'Ming@PRM'
 __version__ = '0.1'
 
 
-class CAT9555Def:
-    INPUT_PORT_0_REGISTER = 0x00
-    INPUT_PORT_1_REGISTER = 0x01
-    OUTPUT_PORT_0_REGISTER = 0x02
-    OUTPUT_PORT_1_REGISTER = 0x03
-    INVERSION_PORT_0_REGISTER = 0x04
-    INVERSION_PORT_1_REGISTER = 0x05
-    DIR_CONFIG_PORT_0_REGISTER = 0x06
-    DIR_CONFIG_PORT_1_REGISTER = 0x07
-    PIN_DIR_INPUT = 'input'
-    PIN_DIR_OUTPUT = 'output'
+# register addresses, folded into the bytecode by const()
+_INPUT_PORT_0_REGISTER = const(0x00)
+_OUTPUT_PORT_0_REGISTER = const(0x02)
+_INVERSION_PORT_0_REGISTER = const(0x04)
+_DIR_CONFIG_PORT_0_REGISTER = const(0x06)
+
+PIN_DIR_INPUT = 'input'
+PIN_DIR_OUTPUT = 'output'
 
 
 class CAT9555:
@@ -28,18 +28,13 @@ class CAT9555:
     :example:
                 cat9555 = CAT9555(0x20,'/dev/MIX_I2C_0')
     '''
-    rpc_public_api = ["read_register", "write_register", "set_pin_dir", "get_pin_dir", "set_pin",
-                      "get_pin", "get_pin_state", "set_pin_inversion", "get_pin_inversion",
-                      "set_pins_dir", "get_pins_dir", "get_ports", "set_ports", "get_ports_state",
-                      "set_ports_inversion", "get_ports_inversion"
-                     ]
-
     def __init__(self, dev_addr, i2c_bus=None):
         assert (dev_addr & (~0x07)) == 0x20
         self.i2c_bus = i2c_bus
         self.dev_addr = dev_addr
         super(CAT9555, self).__init__()
 
+    @timed("cat9555.read_register")
     def read_register(self, reg_addr, rd_len):
         '''
         CAT9555 read specific length datas from address
@@ -54,6 +49,7 @@ class CAT9555:
         result = self.i2c_bus.write_and_read(self.dev_addr, [reg_addr], rd_len)
         return result
 
+    @timed("cat9555.write_register")
     def write_register(self, reg_addr, write_data):
         '''
         CAT9555 write datas to address, support cross pages writing operation
@@ -79,12 +75,12 @@ class CAT9555:
                    cat9555.set_pin_dir(15,'output')
         '''
         assert pin_id >= 0 and pin_id <= 15
-        assert dir in [CAT9555Def.PIN_DIR_INPUT, CAT9555Def.PIN_DIR_OUTPUT]
+        assert dir in [PIN_DIR_INPUT, PIN_DIR_OUTPUT]
 
         rd_data = self.get_pins_dir()
         dir_config = rd_data[0] | (rd_data[1] << 8)
         dir_config &= ~(1 << pin_id)
-        if dir == CAT9555Def.PIN_DIR_INPUT:
+        if dir == PIN_DIR_INPUT:
             dir_config |= (1 << pin_id)
         self.set_pins_dir([dir_config & 0xFF, (dir_config >> 8) & 0xFF])
 
@@ -103,9 +99,9 @@ class CAT9555:
         rd_data = self.get_pins_dir()
         dir_config = rd_data[0] | (rd_data[1] << 8)
         if (dir_config & (1 << pin_id)) != 0:
-            return CAT9555Def.PIN_DIR_INPUT
+            return PIN_DIR_INPUT
         else:
-            return CAT9555Def.PIN_DIR_OUTPUT
+            return PIN_DIR_OUTPUT
 
     def set_pin(self, pin_id, level):
         '''
@@ -209,7 +205,7 @@ class CAT9555:
         '''
         assert (len(pins_dir_mask) == 1) or (len(pins_dir_mask) == 2)
         self.write_register(
-            CAT9555Def.DIR_CONFIG_PORT_0_REGISTER, pins_dir_mask)
+            _DIR_CONFIG_PORT_0_REGISTER, pins_dir_mask)
 
     def get_pins_dir(self):
         '''
@@ -220,7 +216,7 @@ class CAT9555:
                    result = cat9555.get_pins_dir()
                    print(result)
         '''
-        return self.read_register(CAT9555Def.DIR_CONFIG_PORT_0_REGISTER, 2)
+        return self.read_register(_DIR_CONFIG_PORT_0_REGISTER, 2)
 
     def get_ports(self):
         '''
@@ -231,7 +227,7 @@ class CAT9555:
                    result = cat9555.get_ports()
                    print(result)
         '''
-        return self.read_register(CAT9555Def.INPUT_PORT_0_REGISTER, 2)
+        return self.read_register(_INPUT_PORT_0_REGISTER, 2)
 
     def set_ports(self, ports_level_mask):
         '''
@@ -244,7 +240,7 @@ class CAT9555:
         '''
         assert (len(ports_level_mask) == 1) or (len(ports_level_mask) == 2)
         self.write_register(
-            CAT9555Def.OUTPUT_PORT_0_REGISTER, ports_level_mask)
+            _OUTPUT_PORT_0_REGISTER, ports_level_mask)
 
     def get_ports_state(self):
         '''
@@ -255,7 +251,7 @@ class CAT9555:
                   result = cat9555.get_ports_state()
                   print(result)
         '''
-        return self.read_register(CAT9555Def.OUTPUT_PORT_0_REGISTER, 2)
+        return self.read_register(_OUTPUT_PORT_0_REGISTER, 2)
 
     def set_ports_inversion(self, ports_inversion_mask):
         '''
@@ -269,7 +265,7 @@ class CAT9555:
         assert (len(ports_inversion_mask) == 1) or (
             len(ports_inversion_mask) == 2)
         self.write_register(
-            CAT9555Def.INVERSION_PORT_0_REGISTER, ports_inversion_mask)
+            _INVERSION_PORT_0_REGISTER, ports_inversion_mask)
 
     def get_ports_inversion(self):
         '''
@@ -280,4 +276,4 @@ class CAT9555:
                    result = cat9555.get_ports_inversion()
                    print(result)
         '''
-        return self.read_register(CAT9555Def.INVERSION_PORT_0_REGISTER, 2)
+        return self.read_register(_INVERSION_PORT_0_REGISTER, 2)
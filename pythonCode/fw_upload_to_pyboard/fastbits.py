@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import time
+
+
+__version__ = '0.1'
+
+
+def _make_rev8():
+    table = bytearray(256)
+    for v in range(256):
+        r = 0
+        for i in range(8):
+            r |= ((v >> i) & 1) << (7 - i)
+        table[v] = r
+    return bytes(table)
+
+
+# REV8[v] is v with its 8 bits reversed
+REV8 = _make_rev8()
+
+
+def reverse8(v):
+    '''
+    :returns: int, v & 0xFF with its 8 bits reversed
+    '''
+    return REV8[v & 0xFF]
+
+
+def reverse_bits(value, bit_length=8):
+    '''
+    Reverse the low bit_length bits of value, one table lookup per byte
+
+    :param value:      int, value to reverse
+    :param bit_length: int, number of low bits to reverse
+    :returns: int
+    '''
+    out = 0
+    n = (bit_length + 7) >> 3
+    for i in range(n):
+        out = out << 8 | reverse8(value >> (i << 3))
+    return out >> ((n << 3) - bit_length)
+
+
+def bitwise_not(value, bit_length=8):
+    return ~value & ((1 << bit_length) - 1)
+
+
+def xor_sum(buf, start=0, end=-1):
+    '''
+    XOR of buf[start:end], the frame checksum of the 0x25 protocol
+
+    :param buf:   bytes/bytearray/memoryview
+    :param start: int, first byte
+    :param end:   int, stop before this byte, -1 for len(buf)
+    :returns: int(0-255)
+    '''
+    if end < 0:
+        end = len(buf)
+    x = 0
+    for i in range(start, end):
+        x ^= buf[i]
+    return x
+
+
+def field_get(value, mask, offset):
+    '''
+    :param mask:   int, field mask already shifted to offset
+    :param offset: int, lowest bit of the field
+    :returns: int, field value
+    '''
+    return (value & mask) >> offset
+
+
+def field_set(value, mask, offset, v):
+    '''
+    :param mask:   int, field mask already shifted to offset
+    :param offset: int, lowest bit of the field
+    :param v:      int, new field value, extra bits are dropped
+    :returns: int, value with the field replaced
+    '''
+    return (value & ~mask) | ((v << offset) & mask)
+
+
+_PURE = (reverse8, xor_sum, field_get, field_set)
+EMITTER = 'bytecode'
+
+
+def verify(impl):
+    '''
+    Compare an implementation module against the bytecode versions above
+
+    :returns: bool
+    '''
+    for v in range(256):
+        if impl.reverse8(v) != REV8[v]:
+            return False
+    buf = bytes(range(7, 250, 3))
+    for start, end in ((0, len(buf)), (3, 17), (5, 5)):
+        if impl.xor_sum(buf, start, end) != xor_sum(buf, start, end):
+            return False
+    for value in (0, 0x5A5A5A5A, 0xFFFFFFFF, 0x12345678):
+        for width, offset in ((1, 0), (3, 9), (8, 24), (16, 16), (1, 31)):
+            mask = ((1 << width) - 1) << offset
+            if impl.field_get(value, mask, offset) != field_get(value, mask, offset):
+                return False
+            for v in (0, 5, 0xFFFF):
+                if impl.field_set(value, mask, offset, v) != field_set(value, mask, offset, v):
+                    return False
+    return True
+
+
+# fastbits_native holds @micropython.viper versions. It only loads where the
+# native emitter exists (mpy-cross -march matches the board) and it is only
+# used when it gives the same results as the bytecode versions.
+try:
+    import fastbits_native
+    if verify(fastbits_native):
+        reverse8 = fastbits_native.reverse8
+        xor_sum = fastbits_native.xor_sum
+        field_get = fastbits_native.field_get
+        field_set = fastbits_native.field_set
+        EMITTER = 'viper'
+    else:
+        print("fastbits: native helpers failed verification, using bytecode")
+except (ImportError, SyntaxError, ValueError, AttributeError, NameError):
+    pass
+
+
+def _time_us(func, args, n):
+    start = time.ticks_us()
+    for _ in range(n):
+        func(*args)
+    return time.ticks_diff(time.ticks_us(), start) / n
+
+
+def bench(n=2000):
+    '''
+    Print the per-call time of the bytecode and the selected helpers
+
+    .. code-block:: python
+
+        import fastbits
+        fastbits.bench()
+    '''
+    frame = bytes(range(32))
+    mask = 0x7 << 9
+    cases = (
+        ("reverse8", (0xA5,)),
+        ("xor_sum", (frame, 0, len(frame))),
+        ("field_get", (0x12345678, mask, 9)),
+        ("field_set", (0x12345678, mask, 9, 5)),
+    )
+    active = (reverse8, xor_sum, field_get, field_set)
+    print("fastbits: emitter {}, {} calls each".format(EMITTER, n))
+    for i in range(len(cases)):
+        name, args = cases[i]
+        pure = _time_us(_PURE[i], args, n)
+        fast = _time_us(active[i], args, n)
+        print("  {:<10} bytecode {:7.2f} us  selected {:7.2f} us  x{:.1f}".format(
+            name, pure, fast, pure / fast if fast else 0))
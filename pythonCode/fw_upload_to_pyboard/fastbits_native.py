@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import micropython
+
+
+__version__ = '0.1'
+
+# viper versions of the fastbits helpers, loaded by fastbits when the
+# native emitter is available. Keep them in step with fastbits.py.
+
+
+@micropython.viper
+def reverse8(v: uint) -> uint:
+    v = ((v & 0xF0) >> 4) | ((v & 0x0F) << 4)
+    v = ((v & 0xCC) >> 2) | ((v & 0x33) << 2)
+    return ((v & 0xAA) >> 1) | ((v & 0x55) << 1)
+
+
+@micropython.viper
+def xor_sum(buf, start: int, end: int) -> int:
+    p = ptr8(buf)
+    if end < 0:
+        end = int(len(buf))
+    x = 0
+    i = start
+    while i < end:
+        x ^= p[i]
+        i += 1
+    return x
+
+
+@micropython.viper
+def field_get(value: uint, mask: uint, offset: uint) -> uint:
+    return (value & mask) >> offset
+
+
+@micropython.viper
+def field_set(value: uint, mask: uint, offset: uint, v: uint) -> uint:
+    return (value & ~mask) | ((v << offset) & mask)
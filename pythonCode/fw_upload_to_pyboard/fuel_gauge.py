@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import time
+from soft_i2c import require_present
+
+
+__version__ = '0.1'
+
+
+class FuelGaugeSession(object):
+    '''
+    FuelGaugeSession wraps an OM70201WV driver. It runs init_ic() once and
+    again only after a read failed (battery pulled, gauge reset), and
+    serves SOC from a cache until it is older than max_age_ms. SOC is kept
+    as the gauge reports it, a fixed point percentage * 256, so no float
+    math is done per read. The voltage is cached the same way when the
+    driver has get_voltage(). With bus given, a gauge that is missing from
+    the bus presence map is probed instead of running init_ic() and a read.
+
+    service() refreshes the cache when it is older than refresh_ms and can
+    run from a main loop or as an I2CWorker poll, so callers mostly get
+    cached values without touching the bus.
+
+    :param gauge:      OM70201WV, fuel gauge driver
+    :param max_age_ms: int, oldest cached value soc() returns
+    :param refresh_ms: int, age at which service() refreshes, defaults to max_age_ms // 2
+    :param bus:        SoftI2CBus/None, bus of the gauge, gates refresh() on its presence map
+    :param addr:       int, I2C address of the gauge on bus
+
+    .. code-block:: python
+
+        session = FuelGaugeSession(OM70201WV(0x38, i2c_ch3), max_age_ms=2000)
+        worker.poll(session.service, 500)
+        soc = session.soc()
+        print("{}.{:02d}%".format(soc >> 8, (soc & 0xFF) * 100 >> 8))
+    '''
+
+    def __init__(self, gauge, max_age_ms=1000, refresh_ms=None, bus=None, addr=0x38):
+        self.gauge = gauge
+        self.bus = bus
+        self.addr = addr
+        self.max_age_ms = max_age_ms
+        self.refresh_ms = max_age_ms // 2 if refresh_ms is None else refresh_ms
+        self.initialized = False
+        self._soc = 0
+        self._voltage = None
+        self._ticks = None
+        self._get_voltage = getattr(gauge, 'get_voltage', None)
+        # bus reads, cache hits, init_ic calls, read errors
+        self.reads = 0
+        self.hits = 0
+        self.inits = 0
+        self.errors = 0
+
+    def invalidate(self):
+        '''
+        Force init_ic() and a bus read on the next access
+        '''
+        self.initialized = False
+        self._ticks = None
+
+    def age(self):
+        '''
+        :returns: int, ms since the last successful read, None before the first one
+        '''
+        if self._ticks is None:
+            return None
+        return time.ticks_diff(time.ticks_ms(), self._ticks)
+
+    def refresh(self):
+        if self.bus is not None:
+            try:
+                require_present(self.bus, self.addr)
+            except OSError:
+                self.errors += 1
+                self.invalidate()
+                raise
+        if not self.initialized:
+            self.gauge.init_ic()
+            self.inits += 1
+            self.initialized = True
+        try:
+            r = self.gauge.get_soc()
+            if self._get_voltage is not None:
+                self._voltage = self._get_voltage()
+        except OSError:
+            self.errors += 1
+            self.invalidate()
+            raise
+        self._soc = r[0] << 8 | r[1]
+        self._ticks = time.ticks_ms()
+        self.reads += 1
+
+    def _fresh(self, max_age):
+        age = self.age()
+        if age is not None and age <= max_age:
+            self.hits += 1
+            return
+        self.refresh()
+
+    def service(self):
+        '''
+        Refresh when the cache is older than refresh_ms
+
+        :returns: bool, True when the bus was read
+        '''
+        age = self.age()
+        if age is not None and age < self.refresh_ms:
+            return False
+        self.refresh()
+        return True
+
+    def soc(self, max_age_ms=None):
+        '''
+        :returns: int, SOC in % * 256
+        '''
+        self._fresh(self.max_age_ms if max_age_ms is None else max_age_ms)
+        return self._soc
+
+    def voltage(self, max_age_ms=None):
+        '''
+        :returns: voltage as reported by the driver, None when it has no get_voltage()
+        '''
+        self._fresh(self.max_age_ms if max_age_ms is None else max_age_ms)
+        return self._voltage
+
+    def get_soc(self):
+        '''
+        Same result layout as OM70201WV.get_soc() (integer %, 1/256 %), so a
+        session can stand in for the driver, e.g. in SlotTester
+        '''
+        soc = self.soc()
+        return (soc >> 8, soc & 0xFF)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from machine import Timer, mem32
+from micropython import const
+
+
+__version__ = '0.1'
+
+# RP2040 SIO GPIO_IN: level of GPIO0..29 in one word
+SIO_GPIO_IN = const(0xD0000004)
+# all bank 0 pins, keeps every value a small int so sample() does not allocate
+GPIO_ALL = const(0x3FFFFFFF)
+# sample/change counters wrap inside the small int range, an increment in
+# the timer IRQ never allocates (2 ms ticks would pass 2^30 after ~25 days)
+COUNTER_MASK = const(0x3FFFFFFF)
+
+
+class GPIOSampler(object):
+    '''
+    GPIOSampler reads the whole GPIO input bank with one SIO register read
+    per timer tick and debounces every input at once with a two bit vertical
+    counter: a pin changes its debounced level after four equal samples in a
+    row. state is a single int, so a check against any set of inputs is one
+    mask and compare on a glitch free snapshot, and all inputs in a check
+    come from the same tick.
+
+    Interlocks are (mask, value) pairs over active inputs, built once with
+    interlock() and tested with check(). An input is active when its level
+    differs from its rest level, e.g. low for a pin with pull up.
+
+    :param pins:      int, bit n set to debounce GPIOn
+    :param rest:      int, bit n set when GPIOn is high at rest (pull up)
+    :param on_change: callable/None, called with the changed bits from the
+                      timer callback, e.g. Wakeup.input_handler
+    :param read:      callable/None, returns the raw input word, for tests
+
+    .. code-block:: python
+
+        sampler = GPIOSampler(1 << 18 | 1 << 19, rest=1 << 18 | 1 << 19)
+        sampler.start(2)
+        up_only = sampler.interlock(active=1 << 18, inactive=1 << 19)
+        if sampler.check(up_only):
+            print("up")
+    '''
+
+    def __init__(self, pins, rest=0, on_change=None, read=None):
+        self.pins = pins & GPIO_ALL
+        self.rest = rest & self.pins
+        self._on_change = on_change
+        self._read = read
+        self.state = self._sample_raw()
+        # counters start at 3 (idle) for every pin
+        self._ct0 = GPIO_ALL
+        self._ct1 = GPIO_ALL
+        self.samples = 0
+        self.changes = 0
+        self._timer = None
+        self.sample_handler = self.sample
+
+    def _sample_raw(self):
+        if self._read is not None:
+            return self._read() & self.pins
+        return mem32[SIO_GPIO_IN] & self.pins
+
+    def sample(self, _timer=None):
+        '''
+        Take one sample, run from the timer
+        '''
+        diff = self._sample_raw() ^ self.state
+        ct0 = ~(self._ct0 & diff) & GPIO_ALL
+        ct1 = ct0 ^ (self._ct1 & diff)
+        self._ct0 = ct0
+        self._ct1 = ct1
+        toggle = diff & ct0 & ct1
+        self.samples = (self.samples + 1) & COUNTER_MASK
+        if toggle:
+            self.state ^= toggle
+            self.changes = (self.changes + 1) & COUNTER_MASK
+            if self._on_change is not None:
+                self._on_change(toggle)
+
+    def start(self, period_ms=2):
+        self._timer = Timer()
+        self._timer.init(period=period_ms, mode=Timer.PERIODIC, callback=self.sample_handler)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+
+    def active(self):
+        '''
+        :returns: int, bit n set while GPIOn is away from its rest level
+        '''
+        return self.state ^ self.rest
+
+    def interlock(self, active=0, inactive=0):
+        '''
+        Precompute a condition over active inputs
+
+        :param active:   int, pins that must be active
+        :param inactive: int, pins that must be at rest
+        :returns: (mask, value) for check()
+        '''
+        if active & inactive:
+            raise ValueError("pins 0x{:X} both active and inactive".format(active & inactive))
+        if (active | inactive) & ~self.pins:
+            raise ValueError("pins 0x{:X} are not sampled".format((active | inactive) & ~self.pins))
+        return active | inactive, active
+
+    def check(self, lock, state=None):
+        '''
+        :param lock:  (mask, value) from interlock()
+        :param state: int/None, snapshot to test, the current state by default
+        :returns: bool
+        '''
+        if state is None:
+            state = self.state
+        return (state ^ self.rest) & lock[0] == lock[1]
+
+    def report(self):
+        return "pins: 0x{:08X}\nstate: 0x{:08X}\nactive: 0x{:08X}\nsamples: {}\nchanges: {}\n".format(
+            self.pins, self.state, self.active(), self.samples, self.changes)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import time
+import struct
+from binascii import crc32
+from micropython import const
+
+
+__version__ = '0.1'
+
+# record: ticks_us, duration us, op, address, register, result, data length,
+# first DATA_BYTES data bytes (longer transfers are truncated, length is kept)
+RECORD = '<IHBBBBB'
+RECORD_SIZE = const(16)
+DATA_BYTES = const(5)
+_DATA_OFFSET = const(11)
+
+OP_READ = const(1)      # read / write_and_read: register read
+OP_WRITE = const(2)     # write: register write
+OP_RECV = const(3)      # recv: plain read, no register
+OP_SEND = const(4)      # send: plain write, first byte in the register field
+OP_PROBE = const(5)     # probe / is_ready, data: ack
+OP_SCAN = const(6)      # scan, data: number of devices found
+
+RESULT_OK = const(0)
+# any other result is the OSError errno & 0xFF, 0xFF when there is none
+
+# export chunk: sync, first record sequence number, record count, records..., crc32
+CHUNK_SYNC = b'\xAA\x5A'
+CHUNK_HEADER = '<IH'
+
+
+class TracingI2CBus(object):
+    '''
+    TracingI2CBus wraps a SoftI2CBus (or any bus with the same API) and
+    records every transaction into a fixed binary ring buffer: address,
+    register, data, duration and result. The buffer is allocated once, so
+    tracing can stay on in production and be exported over UART when a
+    device misbehaves. Methods the wrapper does not know are passed to the
+    wrapped bus untraced.
+
+    :param bus:   SoftI2CBus, bus to trace
+    :param depth: int, number of records kept
+
+    .. code-block:: python
+
+        i2c = TracingI2CBus(SoftI2CBus(scl=22, sda=23))
+        cat9555 = CAT9555(0x20, i2c)
+        cat9555.set_pin(3, 1)
+        i2c.export(uart.write)
+    '''
+
+    def __init__(self, bus, depth=256):
+        self.bus = bus
+        self._depth = depth
+        self._ring = bytearray(depth * RECORD_SIZE)
+        self._seq = 0
+        self.enabled = True
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+    def read(self, addr, rd_data, length, addrsize=8):
+        return self._call(OP_READ, addr, _reg(rd_data), self.bus.read, (addr, rd_data, length, addrsize), None)
+
+    def write(self, addr, data, addrsize=8):
+        return self._call(OP_WRITE if len(data) > 1 else OP_SEND, addr, data[0],
+                          self.bus.write, (addr, data, addrsize), data[1:])
+
+    def recv(self, addr, length):
+        return self._call(OP_RECV, addr, 0, self.bus.recv, (addr, length), None)
+
+    def send(self, addr, data):
+        return self._call(OP_SEND, addr, data[0], self.bus.send, (addr, data), data[1:])
+
+    def write_and_read(self, addr, wr_data, length, addrsize=8):
+        return self._call(OP_READ, addr, wr_data[0], self.bus.write_and_read,
+                          (addr, wr_data, length, addrsize), None)
+
+    def probe(self, addr):
+        return self._call(OP_PROBE, addr, 0, self.bus.probe, (addr,), None)
+
+    def is_ready(self, addr):
+        return self._call(OP_PROBE, addr, 0, self.bus.is_ready, (addr,), None)
+
+    def scan(self):
+        return self._call(OP_SCAN, 0xFF, 0, self.bus.scan, (), None)
+
+    def _call(self, op, addr, reg, func, args, data):
+        if not self.enabled:
+            return func(*args)
+        start = time.ticks_us()
+        try:
+            result = func(*args)
+        except OSError as e:
+            code = e.args[0] & 0xFF if e.args and isinstance(e.args[0], int) else 0xFF
+            self._record(start, op, addr, reg, code or 0xFF, data)
+            raise
+        if op == OP_PROBE:
+            data = (1 if result else 0,)
+        elif op == OP_SCAN:
+            data = (len(result),)
+        elif data is None:
+            data = result
+        self._record(start, op, addr, reg, RESULT_OK, data)
+        return result
+
+    def _record(self, start, op, addr, reg, code, data):
+        duration = time.ticks_diff(time.ticks_us(), start)
+        pos = (self._seq % self._depth) * RECORD_SIZE
+        n = len(data) if data else 0
+        struct.pack_into(RECORD, self._ring, pos, start, duration if duration < 0xFFFF else 0xFFFF,
+                         op, addr & 0xFF, reg & 0xFF, code, n if n < 0xFF else 0xFF)
+        pos += _DATA_OFFSET
+        ring = self._ring
+        for i in range(DATA_BYTES):
+            ring[pos + i] = data[i] & 0xFF if i < n else 0
+        self._seq += 1
+
+    def clear(self):
+        self._seq = 0
+
+    def count(self):
+        '''
+        :returns: (first, next) record sequence numbers held in the ring
+        '''
+        first = self._seq - self._depth
+        return (first if first > 0 else 0), self._seq
+
+    def export(self, write, chunk_recs=32, kick=None):
+        '''
+        Stream the ring oldest first as checksummed binary chunks:
+        b'\\xAA\\x5A' + <first seq:u32><records:u16> + records + <crc32:u32>,
+        crc32 covers header and records
+
+        :param write:      callable, e.g. uart.write
+        :param chunk_recs: int, records per chunk
+        :param kick:       callable/None, called after every chunk, e.g. Supervisor.kick
+        :returns: int, number of records sent
+        '''
+        seq, stop = self.count()
+        sent = 0
+        view = memoryview(self._ring)
+        while seq < stop:
+            # a chunk never wraps around the end of the ring
+            pos = seq % self._depth
+            n = min(chunk_recs, stop - seq, self._depth - pos)
+            data = view[pos * RECORD_SIZE:(pos + n) * RECORD_SIZE]
+            header = struct.pack(CHUNK_HEADER, seq, n)
+            write(CHUNK_SYNC)
+            write(header)
+            write(data)
+            write(struct.pack('<I', crc32(data, crc32(header))))
+            seq += n
+            sent += n
+            if kick is not None:
+                kick()
+        return sent
+
+
+def _reg(rd_data):
+    # SoftI2CBus.read takes the register as int, some callers pass a list
+    if isinstance(rd_data, int):
+        return rd_data
+    return rd_data[0]
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import time
+from array import array
+
+
+__version__ = '0.1'
+
+
+class Mailbox(object):
+    '''
+    Single producer / single consumer ring of object references. The
+    producer only writes the head index and the consumer only writes the
+    tail index, each a single aligned word store, so one core can put while
+    the other gets without a lock. Indexes run modulo 2 * depth to tell a
+    full ring from an empty one.
+
+    :param depth: int, number of slots
+
+    .. code-block:: python
+
+        box = Mailbox(8)
+        box.put(("flush", None))    # core 0
+        item = box.get()            # core 1, None when empty
+    '''
+
+    def __init__(self, depth=8):
+        self._depth = depth
+        self._wrap = 2 * depth
+        self._slots = [None] * depth
+        # [head, tail]
+        self._idx = array('I', [0, 0])
+
+    def put(self, item):
+        '''
+        :returns: bool, False when the ring is full
+        '''
+        head = self._idx[0]
+        if (head - self._idx[1]) % self._wrap >= self._depth:
+            return False
+        self._slots[head % self._depth] = item
+        self._idx[0] = (head + 1) % self._wrap
+        return True
+
+    def get(self):
+        '''
+        :returns: the oldest item, None when the ring is empty
+        '''
+        tail = self._idx[1]
+        if tail == self._idx[0]:
+            return None
+        pos = tail % self._depth
+        item = self._slots[pos]
+        self._slots[pos] = None
+        self._idx[1] = (tail + 1) % self._wrap
+        return item
+
+    def __len__(self):
+        return (self._idx[0] - self._idx[1]) % self._wrap
+
+
+class I2CWorker(object):
+    '''
+    I2CWorker runs every I2C transaction of its owner on the second RP2040
+    core, so slow bit-banged transfers no longer hold up UART handling and
+    motion control on core 0. Jobs go to core 1 through a request Mailbox
+    and their results come back through a result Mailbox; dispatch() runs
+    the result callbacks on core 0. Periodic jobs (charger/SOC polling) are
+    run by the worker itself and only their latest result is kept, one
+    reference per job, so core 0 reads it without waiting.
+
+    Once the worker is started, only the worker may touch the buses it owns.
+
+    :param depth:   int, request and result mailbox depth
+    :param sup:     Supervisor/None, core 1 reports progress to it so a hung
+                    worker stops the WDT feed
+    :param idle_ms: int, worker sleep when there is nothing to do
+
+    .. code-block:: python
+
+        worker = I2CWorker(sup=sup)
+        soc = worker.poll(gauge.get_soc, 1000)
+        worker.start()
+        worker.submit(board.setState, (2, "g"))
+        ticks, value, error = worker.latest(soc)
+    '''
+
+    def __init__(self, depth=8, sup=None, idle_ms=1):
+        self.requests = Mailbox(depth)
+        self.results = Mailbox(depth)
+        self._idle_ms = idle_ms
+        self._sup = sup
+        self._task = 0
+        self._polls = []
+        self._latest = []
+        self._running = False
+        # counters written by core 1 only: jobs, errors, polls, max job us
+        self._stats = array('I', [0, 0, 0, 0])
+        self._rejected = 0
+
+    def poll(self, func, period_ms, args=()):
+        '''
+        Run func(*args) every period_ms on core 1, register before start()
+
+        :returns: int, index for latest()
+        '''
+        if self._running:
+            raise RuntimeError("register polls before start()")
+        self._polls.append([func, args, period_ms, time.ticks_ms()])
+        self._latest.append(None)
+        return len(self._polls) - 1
+
+    def latest(self, index):
+        '''
+        :returns: (ticks_ms, value, error) of the last run of a poll, None before the first run
+        '''
+        return self._latest[index]
+
+    def submit(self, func, args=(), callback=None):
+        '''
+        Queue func(*args) for core 1
+
+        :param callback: callable/None, called as callback(value, error) by dispatch() on core 0
+        :returns: bool, False when the request mailbox is full. A worker that is
+                  not running calls func inline instead and returns its result,
+                  exceptions included, so callers need no second path
+        '''
+        if not self._running:
+            value = func(*args)
+            if callback is not None:
+                callback(value, None)
+            return value
+        if self.requests.put((func, args, callback)):
+            return True
+        self._rejected += 1
+        return False
+
+    def dispatch(self):
+        '''
+        Run the callbacks of finished jobs, call from the core 0 main loop
+
+        :returns: int, number of results handled
+        '''
+        n = 0
+        item = self.results.get()
+        while item is not None:
+            self._finish(*item)
+            n += 1
+            item = self.results.get()
+        return n
+
+    def _finish(self, callback, value, error):
+        if callback is not None:
+            callback(value, error)
+
+    def start(self):
+        import _thread
+        if self._sup and not self._task:
+            self._task = self._sup.register("i2c_worker")
+        self._running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        self._running = False
+
+    def _execute(self, func, args):
+        start = time.ticks_us()
+        try:
+            value, error = func(*args), None
+        except Exception as e:
+            value, error = None, e
+            self._stats[1] += 1
+        dt = time.ticks_diff(time.ticks_us(), start)
+        if dt > self._stats[3]:
+            self._stats[3] = dt
+        return value, error
+
+    def _run(self):
+        while self._running:
+            if self._task:
+                self._sup.progress(self._task)
+            busy = False
+            job = self.requests.get()
+            if job is not None:
+                func, args, callback = job
+                value, error = self._execute(func, args)
+                self._stats[0] += 1
+                if callback is not None:
+                    # results are dropped rather than blocking core 1 when core 0 lags
+                    self.results.put((callback, value, error))
+                busy = True
+            now = time.ticks_ms()
+            for i in range(len(self._polls)):
+                poll = self._polls[i]
+                if time.ticks_diff(now, poll[3]) >= 0:
+                    poll[3] = time.ticks_add(now, poll[2])
+                    value, error = self._execute(poll[0], poll[1])
+                    self._latest[i] = (now, value, error)
+                    self._stats[2] += 1
+                    busy = True
+            if not busy:
+                time.sleep_ms(self._idle_ms)
+
+    def report(self):
+        '''
+        Format the counters for the uart workerinfo command
+
+        :returns: str
+        '''
+        return "running: {}\njobs: {}\nerrors: {}\npolls: {}\nmax_job_us: {}\nqueued: {}\nrejected: {}\n".format(
+            int(self._running), self._stats[0], self._stats[1], self._stats[2], self._stats[3],
+            len(self.requests), self._rejected)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import struct
+
+try:
+    from binascii import crc32
+except ImportError:
+    def crc32(data, crc=0):
+        crc ^= 0xFFFFFFFF
+        for b in data:
+            crc ^= b
+            for _ in range(8):
+                crc = (crc >> 1) ^ (0xEDB88320 if crc & 1 else 0)
+        return crc ^ 0xFFFFFFFF
+
+
+__version__ = '0.1'
+
+# record: magic, key length, value length, crc32(key + value), key, value
+_HEADER = '<BBHI'
+_HEADER_SIZE = 8
+_MAGIC = 0xA5
+_TOMBSTONE = 0xFFFF
+
+
+class KVStore(object):
+    '''
+    KVStore is a log structured key/value store on the board filesystem.
+    Every set() appends one checksummed record instead of rewriting the
+    whole file, reads are served from an in-RAM dict. A torn record at the
+    end of the log (power loss during a write) is dropped on load. When the
+    log grows past compact_size and is mostly stale, it is rewritten to a
+    temp file and renamed over the log, so the old log stays valid until
+    the rename.
+
+    :param path:         str, log file path
+    :param legacy_file:  str/None, JSON file imported when the log does not exist yet
+    :param compact_size: int, log size in bytes that allows compaction
+
+    .. code-block:: python
+
+        store = KVStore("fixture_config.kv", legacy_file="fixture_config.json")
+        store.set("fixture_id", "FIXTURE_002")
+        print(store.get("fixture_id"))
+    '''
+
+    def __init__(self, path, legacy_file=None, compact_size=4096):
+        self._path = path
+        self._compact_size = compact_size
+        self._data = {}
+        self._size = 0
+        self._live = 0
+        # stored record length per live key, to account for the bytes an
+        # overwrite or delete makes stale
+        self._sizes = {}
+        if not self._load() and legacy_file:
+            self._import_json(legacy_file)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def keys(self):
+        return self._data.keys()
+
+    def items(self):
+        return self._data.items()
+
+    def set(self, key, value):
+        '''
+        Store value under key, nothing is written if the value is unchanged
+
+        :param key:   str, key (max 255 bytes encoded)
+        :param value: JSON serializable value
+        '''
+        if key in self._data and self._data[key] == value:
+            return
+        record = self._record(key, json.dumps(value).encode())
+        self._append(record)
+        self._live += len(record) - self._sizes.get(key, 0)
+        self._sizes[key] = len(record)
+        self._data[key] = value
+        self._maybe_compact()
+
+    def delete(self, key):
+        if key not in self._data:
+            return
+        # the tombstone itself is stale as soon as it is written
+        self._append(self._record(key, None))
+        self._live -= self._sizes.pop(key, 0)
+        del self._data[key]
+        self._maybe_compact()
+
+    def compact(self):
+        '''
+        Rewrite the log with one record per live key and rename it over the old log
+        '''
+        tmp = self._path + '.tmp'
+        size = 0
+        sizes = {}
+        with open(tmp, 'wb') as f:
+            for key, value in self._data.items():
+                record = self._record(key, json.dumps(value).encode())
+                f.write(record)
+                size += len(record)
+                sizes[key] = len(record)
+        os.rename(tmp, self._path)
+        self._size = size
+        self._live = size
+        self._sizes = sizes
+
+    def _record(self, key, value):
+        k = key.encode()
+        if value is None:
+            return struct.pack(_HEADER, _MAGIC, len(k), _TOMBSTONE, crc32(k)) + k
+        return struct.pack(_HEADER, _MAGIC, len(k), len(value), crc32(k + value)) + k + value
+
+    def _append(self, record):
+        with open(self._path, 'ab') as f:
+            f.write(record)
+        self._size += len(record)
+
+    def _maybe_compact(self):
+        if self._size > self._compact_size and self._size > 2 * self._live:
+            self.compact()
+
+    def _load(self):
+        try:
+            with open(self._path, 'rb') as f:
+                buf = f.read()
+        except OSError:
+            return False
+        sizes = {}
+        pos = 0
+        end = len(buf)
+        while pos + _HEADER_SIZE <= end:
+            magic, klen, vlen, crc = struct.unpack_from(_HEADER, buf, pos)
+            body = pos + _HEADER_SIZE
+            blen = klen if vlen == _TOMBSTONE else klen + vlen
+            if magic != _MAGIC or body + blen > end:
+                break
+            data = buf[body:body + blen]
+            if crc32(data) & 0xFFFFFFFF != crc:
+                break
+            key = data[:klen].decode()
+            if vlen == _TOMBSTONE:
+                self._data.pop(key, None)
+                sizes.pop(key, None)
+            else:
+                try:
+                    self._data[key] = json.loads(data[klen:])
+                except ValueError:
+                    break
+                sizes[key] = _HEADER_SIZE + blen
+            pos = body + blen
+        self._size = pos
+        self._sizes = sizes
+        self._live = sum(sizes.values())
+        if pos != end:
+            print("kvstore {}: dropped {} bytes of damaged log".format(self._path, end - pos))
+            self.compact()
+        return True
+
+    def _import_json(self, legacy_file):
+        try:
+            with open(legacy_file, 'r') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError) as e:
+            print("kvstore {}: cannot import {}: {}".format(self._path, legacy_file, e))
+            self._data = {}
+        self.compact()
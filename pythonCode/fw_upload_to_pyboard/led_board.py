@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 from cat9555 import CAT9555
-from soft_i2c import SoftI2CBus
+from soft_i2c import SoftI2CBus, require_present
+from timing import timed
+from fastbits import reverse_bits, bitwise_not, field_get, field_set
+from micropython import const
 
 
 __author__ = 'Ming@rtTech'
 __version__ = '0.1'
 
 class ByteRegister(object):
-    __slot__ = ['address', 'value']
+    __slots__ = ('address', 'value')
 
     def __init__(self, address, value):
         self.address = address
@@ -15,14 +18,11 @@ class ByteRegister(object):
 
     def _bitwise_not(self, value, bit_length=8):
         # 取反并限制在 bit_length 位范围内
-        return ~value & ((1 << bit_length) - 1)
+        return bitwise_not(value, bit_length)
 
     def _reverse_bits_bitwise(self, value, bit_length=8):
-        reversed_value = 0
-        for i in range(bit_length):
-            # 将最低位移到目标位置
-            reversed_value |= ((value >> i) & 1) << (bit_length - 1 - i)
-        return reversed_value
+        # 按字节查表反转，见 fastbits.REV8
+        return reverse_bits(value, bit_length)
 
     def get_bytes(self):
         res =  [self.value & 0xff, self.value >> 8]
@@ -36,101 +36,143 @@ class ByteRegister(object):
         return res
 
 class BitsRegister(object):
-    __slot__ = ['masks', 'bit_offset', 'val_mask']
-    masks = [
-        0x0,
-        0x1,
-        0x3,
-        0x7,
-        0xf,
-        0x1f,
-        0x3f,
-        0x7f,
-        0xff,
-        0x1ff,
-        0x3ff,
-        0x7ff,
-        0xfff,
-        0x1fff,
-        0x3fff,
-        0x7fff,
-        0xffff,
-        0x1ffff,
-        0x3ffff,
-        0x7ffff,
-        0xfffff,
-        0x1fffff,
-        0x3fffff,
-        0x7fffff,
-        0xffffff,
-        0x1ffffff,
-        0x3ffffff,
-        0x7ffffff,
-        0xfffffff,
-        0x1fffffff,
-        0x3fffffff,
-        0x7fffffff
-    ]
+    __slots__ = ('bit_offset', 'val_mask')
 
     def __init__(self, bit_width, bit_offset):
         self.bit_offset = bit_offset
-        self.bit_mask = self.masks[bit_width]
-        self.val_mask = self.bit_mask << bit_offset
+        self.val_mask = ((1 << bit_width) - 1) << bit_offset
 
     def __set__(self, obj, v):
-        origin = obj.value
-        obj.value = (origin & ~self.val_mask) | ((v & self.bit_mask) << self.bit_offset)
+        obj.value = field_set(obj.value, self.val_mask, self.bit_offset, v)
 
     def __get__(self, obj, obj_type):
-        return (obj.value & self.val_mask) >> self.bit_offset
+        return field_get(obj.value, self.val_mask, self.bit_offset)
 
 
 
-class IOMUXRegisters(ByteRegister):
-    LED0 = BitsRegister(3, 0)
-    LED1 = BitsRegister(3, 3)
-    LED2 = BitsRegister(3, 6)
-    LED3 = BitsRegister(3, 9)
-    # LED4 = BitsRegister(3, 12)
-    # LED5 = BitsRegister(3, 15)
-    # LED6 = BitsRegister(3, 18)
-    # LED7 = BitsRegister(3, 21)
-    # LED8 = BitsRegister(3, 24)
-    # LED9 = BitsRegister(3, 27)
+# 每个槽位占 3 个输出位: bit0 红, bit1 绿, bit2 蓝
+SLOT_BITS = const(3)
+_SLOT_MASK = const(0x7)
+_OUTPUT_PORT_0 = const(0x02)
+_OUTPUT_PORT_1 = const(0x03)
+
 
 class LEDBoard:
+    '''
+    LEDBoard drives the slot LEDs through any number of CAT9555 expanders.
+    Slot n uses the 3 output bits from global bit 3 * n, expander k holds
+    global bits 16 * k to 16 * k + 15 (the order of expanders), so a slot may
+    span two expanders. The output ports are kept in a RAM shadow with one
+    dirty bit per port byte: an update only changes the shadow and flush()
+    writes the changed ports in one pass, one transaction per expander that
+    changed, so the I2C traffic of an update does not grow with the number
+    of expanders.
+
+    :param i2c:       SoftI2CBus/None, bus shared by the expanders, created from scl/sda if None
+    :param expanders: list, CAT9555 addresses in slot order
+    :param slots:     int/None, number of slots, as many as the expanders hold if None
+    :param scl:       int, SCL pin when i2c is None
+    :param sda:       int, SDA pin when i2c is None
+    :param freq:      int, bus frequency when i2c is None
+
+    .. code-block:: python
+
+        board = LEDBoard(expanders=[0x20, 0x21], slots=10)
+        board.setStates({0: "g", 7: "r"})
+    '''
     _led_state_value = {
             "r": 0b001,
             "g": 0b010,
             "b": 0b100,
             "off": 0b0
     }
-    def __init__(self, i2c=SoftI2CBus(scl=22, sda=23)):
+    def __init__(self, i2c=None, expanders=(0x20,), slots=None, scl=22, sda=23, freq=100000):
+        if i2c is None:
+            i2c = SoftI2CBus(scl=scl, sda=sda, freq=freq)
         self._i2c = i2c
-        self._REG = IOMUXRegisters(0, 0)  # 初始化地址和值都为0
-        # self._muxs = [CAT9555(0x20, i2c), CAT9555(0x21, i2c)]
-        self._muxs = [CAT9555(0x20, i2c)]
+        self._muxs = [CAT9555(addr, i2c) for addr in expanders]
+        max_slots = len(self._muxs) * 16 // SLOT_BITS
+        self.slots = max_slots if slots is None else slots
+        assert 0 < self.slots <= max_slots
+        # 输出口影子寄存器，每个扩展芯片 2 字节；_dirty 每位对应一个字节
+        self._shadow = bytearray(2 * len(self._muxs))
+        self._dirty = 0
         self.init()
 
+    def set_bus(self, i2c):
+        """替换 I2C 总线，例如换成 i2c_trace.TracingI2CBus 包装"""
+        self._i2c = i2c
+        for mux in self._muxs:
+            mux.i2c_bus = i2c
+
     def init(self):
-        self._REG.value = 0b0
-        values = self._REG.get_bytes_4()
-        self._muxs[0].set_ports(values[0:2])
-        # self._muxs[1].set_ports(values[2::])
+        for i in range(len(self._shadow)):
+            self._shadow[i] = 0
+        # 上电后芯片状态未知，全部写一遍
+        self._dirty = (1 << len(self._shadow)) - 1
+        self.flush()
         # set output
         for mux in self._muxs:
             mux.set_pins_dir([0x00, 0x00])
 
-    def write_register(self, data):
-        self._muxs[0].set_ports(data[0:2])
-        # self._muxs[1].set_ports(data[2::])
+    def _set_byte(self, pos, value):
+        if self._shadow[pos] != value:
+            self._shadow[pos] = value
+            self._dirty |= 1 << pos
+
+    def _set_slot(self, slot, value):
+        bit = slot * SLOT_BITS
+        pos = bit >> 3
+        offset = bit & 0x07
+        last = len(self._shadow) - 1
+        # 槽位可能跨越两个字节（或两个扩展芯片），按 16 位窗口修改
+        window = self._shadow[pos] | (self._shadow[pos + 1] << 8 if pos < last else 0)
+        window = field_set(window, _SLOT_MASK << offset, offset, value)
+        self._set_byte(pos, window & 0xFF)
+        if pos < last:
+            self._set_byte(pos + 1, window >> 8)
+
+    @timed("ledboard.flush")
+    def flush(self):
+        """把有变化的输出口写入对应的扩展芯片，未变化的芯片不产生 I2C 事务；
+        某个芯片写失败时其余芯片照常写入，全部写完后再抛出第一个错误"""
+        shadow = self._shadow
+        error = None
+        for k in range(len(self._muxs)):
+            dirty = (self._dirty >> (k << 1)) & 0x03
+            if not dirty:
+                continue
+            pos = k << 1
+            try:
+                # 不在线的扩展芯片不发写事务，只探测一次地址
+                require_present(self._i2c, self._muxs[k].dev_addr)
+                if dirty == 0x03:
+                    self._muxs[k].write_register(_OUTPUT_PORT_0, [shadow[pos], shadow[pos + 1]])
+                elif dirty == 0x01:
+                    self._muxs[k].write_register(_OUTPUT_PORT_0, [shadow[pos]])
+                else:
+                    self._muxs[k].write_register(_OUTPUT_PORT_1, [shadow[pos + 1]])
+            except OSError as e:
+                # 写失败时保留该芯片的 dirty，下次 flush 重试
+                if error is None:
+                    error = e
+                continue
+            self._dirty &= ~(0x03 << pos)
+        if error is not None:
+            raise error
         return True
 
+    def write_register(self, data):
+        """按字节设置全部输出口，data[2k], data[2k+1] 对应第 k 个扩展芯片"""
+        for pos in range(min(len(data), len(self._shadow))):
+            self._set_byte(pos, data[pos] & 0xFF)
+        return self.flush()
+
     def setState(self, slot, state):
-        assert slot in range(10)
+        assert slot in range(self.slots)
         assert state in ("r", "g", "b", 'off')
-        setattr(self._REG, "LED{}".format(slot), LEDBoard._led_state_value[state])
-        return self.write_register(self._REG.get_bytes_4())
+        self._set_slot(slot, LEDBoard._led_state_value[state])
+        return self.flush()
 
     def setStates(self, states):
         """
@@ -138,10 +180,10 @@ class LEDBoard:
         """
 
         for slot, state in states.items():
-            assert slot in range(10)
+            assert slot in range(self.slots)
             assert state in ("r", "g", "b", 'off')
-            setattr(self._REG, "LED{}".format(slot), LEDBoard._led_state_value[state])
-        return self.write_register(self._REG.get_bytes_4())
+            self._set_slot(slot, LEDBoard._led_state_value[state])
+        return self.flush()
 
     def reset(self):
-        return self.write_register([0x00, 0x00, 0x00, 0x00])
\ No newline at end of file
+        return self.write_register(bytes(len(self._shadow)))
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+import time
+import struct
+from binascii import crc32
+
+
+__version__ = '0.1'
+
+# ticks_ms, slot, charger status, voltage mV, current mA (signed), SOC * 256
+RECORD = '<IBBHhH'
+RECORD_SIZE = 12
+# block on flash: sequence number, record count, crc32 of the records
+BLOCK_HEADER = '<IHxxI'
+BLOCK_HEADER_SIZE = 12
+# export chunk: sync, first record index, record count, records..., crc32
+CHUNK_SYNC = b'\xAA\x55'
+CHUNK_HEADER = '<IH'
+_EMPTY = 0xFFFFFFFF
+
+
+class MeasLog(object):
+    '''
+    MeasLog keeps per-slot measurements as fixed 12 byte records. Records
+    are collected in a RAM block and each full block is written to a fixed
+    size ring file on flash, so a whole charge cycle survives until export
+    and flash is written block by block instead of per sample. Records are
+    addressed by a global index which keeps counting across blocks.
+
+    :param path:        str, ring file on the board filesystem
+    :param block_recs:  int, records per block (RAM buffer size)
+    :param blocks:      int, number of blocks kept on flash
+    :param kick:        callable/None, called after every block written while
+                        the ring file is created, e.g. Supervisor.kick
+
+    .. code-block:: python
+
+        log = MeasLog()
+        log.append(3, 3850, 512, 45 * 256 + 128, 0x02)
+        log.export(uart.write, 0, 100)
+    '''
+
+    def __init__(self, path='meas_log.bin', block_recs=32, blocks=64, kick=None):
+        self._path = path
+        self._block_recs = block_recs
+        self._blocks = blocks
+        self._block_size = BLOCK_HEADER_SIZE + block_recs * RECORD_SIZE
+        self._ram = bytearray(block_recs * RECORD_SIZE)
+        self._ram_count = 0
+        self._seq = 0
+        self._open(kick)
+
+    def append(self, slot, voltage, current, soc, status=0, ticks=None):
+        '''
+        Add one measurement, flushes the RAM block to flash when it is full
+
+        :param slot:    int(0-255), slot number
+        :param voltage: int, mV
+        :param current: int, mA, negative for discharge
+        :param soc:     int, SOC in 1/256 %, e.g. r[0] << 8 | r[1] from OM70201WV
+        :param status:  int(0-255), charger status byte
+        :param ticks:   int/None, time.ticks_ms() stamp, now if None
+        '''
+        if ticks is None:
+            ticks = time.ticks_ms()
+        struct.pack_into(RECORD, self._ram, self._ram_count * RECORD_SIZE,
+                         ticks, slot, status, voltage, current, soc)
+        self._ram_count += 1
+        if self._ram_count == self._block_recs:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write the RAM block to its place in the flash ring, a partial block
+        is written too and completed in place by later flushes
+        '''
+        if self._ram_count == 0:
+            return
+        payload = memoryview(self._ram)[:self._ram_count * RECORD_SIZE]
+        header = struct.pack(BLOCK_HEADER, self._seq, self._ram_count, crc32(payload))
+        with open(self._path, 'r+b') as f:
+            f.seek((self._seq % self._blocks) * self._block_size)
+            f.write(header)
+            f.write(payload)
+        if self._ram_count == self._block_recs:
+            self._seq += 1
+            self._ram_count = 0
+
+    def first(self):
+        '''
+        :returns: int, index of the oldest record still available
+        '''
+        oldest = self._seq - self._blocks + 1
+        return (oldest if oldest > 0 else 0) * self._block_recs
+
+    def next(self):
+        '''
+        :returns: int, index the next appended record will get
+        '''
+        return self._seq * self._block_recs + self._ram_count
+
+    def read(self, start, count):
+        '''
+        Read records [start, start + count) clipped to what is available
+
+        :returns: (first index, bytes of packed records)
+        '''
+        start = max(start, self.first())
+        stop = min(start + count, self.next())
+        out = bytearray()
+        index = start
+        with open(self._path, 'rb') as f:
+            while index < stop:
+                seq = index // self._block_recs
+                offset = index % self._block_recs
+                n = min(stop - index, self._block_recs - offset)
+                if seq == self._seq:
+                    pos = offset * RECORD_SIZE
+                    out += self._ram[pos:pos + n * RECORD_SIZE]
+                else:
+                    f.seek((seq % self._blocks) * self._block_size + BLOCK_HEADER_SIZE + offset * RECORD_SIZE)
+                    out += f.read(n * RECORD_SIZE)
+                index += n
+        return start, out
+
+    def export(self, write, start, count, chunk_recs=32, kick=None):
+        '''
+        Stream records as checksummed binary chunks:
+        b'\\xAA\\x55' + <first index:u32><records:u16> + records + <crc32:u32>,
+        crc32 covers header and records
+
+        :param write:      callable, e.g. uart.write
+        :param start:      int, first record index
+        :param count:      int, number of records
+        :param chunk_recs: int, records per chunk
+        :param kick:       callable/None, called after every chunk, e.g. Supervisor.kick
+        :returns: int, number of records sent
+        '''
+        sent = 0
+        index = max(start, self.first())
+        stop = min(start + count, self.next())
+        while index < stop:
+            first, data = self.read(index, min(chunk_recs, stop - index))
+            n = len(data) // RECORD_SIZE
+            if n == 0:
+                break
+            header = struct.pack(CHUNK_HEADER, first, n)
+            write(CHUNK_SYNC)
+            write(header)
+            write(data)
+            write(struct.pack('<I', crc32(data, crc32(header))))
+            index = first + n
+            sent += n
+            if kick is not None:
+                kick()
+        return sent
+
+    def _open(self, kick=None):
+        try:
+            with open(self._path, 'rb') as f:
+                last = -1
+                for i in range(self._blocks):
+                    f.seek(i * self._block_size)
+                    header = f.read(BLOCK_HEADER_SIZE)
+                    if len(header) < BLOCK_HEADER_SIZE:
+                        raise OSError("short ring file")
+                    seq, n, _crc = struct.unpack(BLOCK_HEADER, header)
+                    if seq != _EMPTY and seq > last and 0 < n <= self._block_recs:
+                        last = seq
+                        last_n = n
+        except OSError:
+            self._format(kick)
+            return
+        if last < 0:
+            return
+        # continue after the newest block, reload it if it was not full
+        if last_n == self._block_recs:
+            self._seq = last + 1
+        else:
+            self._seq = last
+            with open(self._path, 'rb') as f:
+                f.seek((last % self._blocks) * self._block_size + BLOCK_HEADER_SIZE)
+                data = f.read(last_n * RECORD_SIZE)
+            self._ram[:len(data)] = data
+            self._ram_count = last_n
+
+    def _format(self, kick=None):
+        blank = b'\xFF' * self._block_size
+        with open(self._path, 'wb') as f:
+            for _ in range(self._blocks):
+                f.write(blank)
+                if kick is not None:
+                    kick()
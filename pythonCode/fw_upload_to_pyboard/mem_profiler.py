@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import gc
+import time
+from array import array
+
+
+__version__ = '0.1'
+
+
+class MemProfiler(object):
+    '''
+    MemProfiler samples heap usage and main loop timing into fixed ring
+    buffers and runs gc.collect in idle windows, so the heap is compacted
+    before a MemoryError instead of after it. All buffers are allocated
+    in __init__, sampling itself does not allocate.
+
+    :param depth:        int, number of samples kept in each ring buffer
+    :param sample_ms:    int, sample period of mem_free/mem_alloc
+    :param gc_period_ms: int, minimum time between two idle collections
+    :param low_water:    int, collect at the next idle window once
+                              mem_free drops below this many bytes
+
+    .. code-block:: python
+
+        mem = MemProfiler()
+        while True:
+            mem.begin()
+            do_work()
+            mem.end(idle=True)
+        print(mem.report())
+    '''
+
+    def __init__(self, depth=32, sample_ms=1000, gc_period_ms=5000, low_water=16384):
+        self._depth = depth
+        self._sample_ms = sample_ms
+        self._gc_period_ms = gc_period_ms
+        self._low_water = low_water
+        self._free = array('i', [0] * depth)
+        self._alloc = array('i', [0] * depth)
+        self._loop = array('i', [0] * depth)
+        self._index = 0
+        self._count = 0
+        self._start = time.ticks_us()
+        self._window_max = 0
+        self._loop_max = 0
+        self._loops = 0
+        self._min_free = gc.mem_free()
+        self._gc_max = 0
+        self._gc_count = 0
+        now = time.ticks_ms()
+        self._last_sample = now
+        self._last_gc = now
+
+    def begin(self):
+        '''
+        Mark the start of one main loop iteration
+        '''
+        self._start = time.ticks_us()
+
+    def end(self, idle=False):
+        '''
+        Mark the end of one main loop iteration
+
+        :param idle: bool, True if nothing is pending and a collection
+                           may run now without delaying a command
+        '''
+        dt = time.ticks_diff(time.ticks_us(), self._start)
+        self._loops += 1
+        if dt > self._window_max:
+            self._window_max = dt
+        if dt > self._loop_max:
+            self._loop_max = dt
+        now = time.ticks_ms()
+        if time.ticks_diff(now, self._last_sample) >= self._sample_ms:
+            self._last_sample = now
+            self.sample()
+        if idle:
+            if (time.ticks_diff(now, self._last_gc) >= self._gc_period_ms
+                    or gc.mem_free() < self._low_water):
+                self.collect()
+
+    def sample(self):
+        '''
+        Push one mem_free/mem_alloc/loop-time sample into the ring buffers
+        '''
+        free = gc.mem_free()
+        i = self._index
+        self._free[i] = free
+        self._alloc[i] = gc.mem_alloc()
+        self._loop[i] = self._window_max
+        self._window_max = 0
+        self._index = (i + 1) % self._depth
+        if self._count < self._depth:
+            self._count += 1
+        if free < self._min_free:
+            self._min_free = free
+
+    def collect(self):
+        '''
+        Run gc.collect and record how long the pause took
+
+        :returns: int, pause in us
+        '''
+        start = time.ticks_us()
+        gc.collect()
+        dt = time.ticks_diff(time.ticks_us(), start)
+        self._last_gc = time.ticks_ms()
+        self._gc_count += 1
+        if dt > self._gc_max:
+            self._gc_max = dt
+        return dt
+
+    def history(self):
+        '''
+        Samples in the ring buffers, oldest first
+
+        :returns: list of (mem_free, mem_alloc, loop_max_us)
+        '''
+        res = []
+        start = (self._index - self._count) % self._depth
+        for n in range(self._count):
+            i = (start + n) % self._depth
+            res.append((self._free[i], self._alloc[i], self._loop[i]))
+        return res
+
+    def report(self):
+        '''
+        Format the counters for the uart meminfo command
+
+        :returns: str
+        '''
+        lines = [
+            "mem_free: {}".format(gc.mem_free()),
+            "mem_alloc: {}".format(gc.mem_alloc()),
+            "mem_free_min: {}".format(self._min_free),
+            "loops: {}".format(self._loops),
+            "loop_max_us: {}".format(self._loop_max),
+            "gc_count: {}".format(self._gc_count),
+            "gc_pause_max_us: {}".format(self._gc_max),
+        ]
+        for free, alloc, loop in self.history():
+            lines.append("{} {} {}".format(free, alloc, loop))
+        return "\n".join(lines) + "\n"
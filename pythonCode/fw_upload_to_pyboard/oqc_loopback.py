@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import time
+import struct
+from array import array
+from machine import Pin, mem32
+from micropython import const
+from fastbits import xor_sum
+
+
+__version__ = '0.1'
+
+OQC_OUTPUTS = (2, 3, 4, 5, 6, 7, 8, 9)
+OQC_INPUTS = (10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21)
+
+# RP2040 SIO registers
+SIO_GPIO_IN = const(0xD0000004)
+SIO_GPIO_OUT = const(0xD0000010)
+SIO_GPIO_OUT_SET = const(0xD0000014)
+SIO_GPIO_OUT_CLR = const(0xD0000018)
+
+# result frame: 0x25, OQC_LOOPBACK, length, 0x55, pattern count,
+# (output pattern u8, input bits u16) per pattern, xor, 0x0A
+OQC_LOOPBACK = const(0x30)
+ENTRY = '<BH'
+ENTRY_SIZE = const(3)
+
+
+def walking_ones(n=8):
+    '''
+    All low, all high, then one output high at a time
+
+    :returns: tuple of output patterns
+    '''
+    return (0, (1 << n) - 1) + tuple(1 << i for i in range(n))
+
+
+class OQCLoopback(object):
+    '''
+    OQCLoopback owns the OQC pins of the control board. The Pin objects are
+    created once, outputs are driven together through the SIO set/clear
+    registers and inputs are read together from GPIO_IN, so one pattern is
+    one register write pair and one register read. Bit i of a pattern is
+    outputs[i], bit i of an input word is inputs[i].
+
+    :param outputs:   tuple, GPIO numbers driven by the test
+    :param inputs:    tuple, GPIO numbers read back
+    :param settle_us: int, wait between driving and reading a pattern
+
+    .. code-block:: python
+
+        oqc = OQCLoopback()
+        results = oqc.sweep(walking_ones())
+        uart.write(oqc.frame(results))
+    '''
+
+    def __init__(self, outputs=OQC_OUTPUTS, inputs=OQC_INPUTS, settle_us=100):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.settle_us = settle_us
+        self.out_pins = [Pin(p, Pin.OUT, Pin.PULL_DOWN) for p in outputs]
+        self.in_pins = [Pin(p, Pin.IN) for p in inputs]
+        self.out_mask = 0
+        for p in outputs:
+            self.out_mask |= 1 << p
+        self.in_mask = 0
+        for p in inputs:
+            self.in_mask |= 1 << p
+        # pattern -> GPIO word, one lookup per pattern instead of a bit loop
+        self._spread = array('I', [self._to_gpio(v) for v in range(1 << len(outputs))])
+        # inputs on consecutive pins are gathered with one shift
+        self._in_shift = inputs[0] if tuple(range(inputs[0], inputs[0] + len(inputs))) == tuple(inputs) else -1
+
+    def _to_gpio(self, pattern):
+        word = 0
+        for i, p in enumerate(self.outputs):
+            if pattern & (1 << i):
+                word |= 1 << p
+        return word
+
+    def drive(self, pattern):
+        word = self._spread[pattern]
+        mem32[SIO_GPIO_OUT_SET] = word
+        mem32[SIO_GPIO_OUT_CLR] = self.out_mask & ~word
+
+    def read_inputs(self):
+        '''
+        :returns: int, bit i set when inputs[i] is high
+        '''
+        raw = mem32[SIO_GPIO_IN]
+        if self._in_shift >= 0:
+            return (raw >> self._in_shift) & ((1 << len(self.inputs)) - 1)
+        bits = 0
+        for i, p in enumerate(self.inputs):
+            if raw & (1 << p):
+                bits |= 1 << i
+        return bits
+
+    def sweep(self, patterns):
+        '''
+        Drive every pattern and read all inputs back, the outputs are
+        restored afterwards
+
+        :returns: list of (pattern, input bits)
+        '''
+        saved = mem32[SIO_GPIO_OUT] & self.out_mask
+        results = []
+        try:
+            for pattern in patterns:
+                self.drive(pattern)
+                time.sleep_us(self.settle_us)
+                results.append((pattern, self.read_inputs()))
+        finally:
+            mem32[SIO_GPIO_OUT_SET] = saved
+            mem32[SIO_GPIO_OUT_CLR] = self.out_mask & ~saved
+        return results
+
+    def pin(self, pin_num):
+        '''
+        :returns: cached Pin of an OQC pin, None for other pins
+        '''
+        if pin_num in self.outputs:
+            return self.out_pins[self.outputs.index(pin_num)]
+        if pin_num in self.inputs:
+            return self.in_pins[self.inputs.index(pin_num)]
+        return None
+
+    def frame(self, results):
+        '''
+        Pack sweep() results into one result frame
+        '''
+        n = len(results)
+        frame = bytearray(n * ENTRY_SIZE + 7)
+        frame[0] = 0x25
+        frame[1] = OQC_LOOPBACK
+        frame[2] = n * ENTRY_SIZE + 4
+        frame[3] = 0x55
+        frame[4] = n
+        for i, (pattern, bits) in enumerate(results):
+            struct.pack_into(ENTRY, frame, 5 + i * ENTRY_SIZE, pattern, bits)
+        frame[-2] = xor_sum(frame, 0, len(frame) - 2)
+        frame[-1] = 0x0A
+        return frame
@@ -34,8 +34,6 @@ class Pin(object):
         print('dir={}'.format(dir))
 
     '''
-    rpc_public_api = ['get_level','set_level','get_dir','set_dir'
-                      ]
     def __init__(self, io, pin_id, pin_dir=None):
         self.io = io
         self.pin_id = pin_id
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import time
+from micropython import const
+from fastbits import field_get, field_set
+from soft_i2c import require_present
+
+
+__version__ = '0.1'
+
+SC89620_ADDR = const(0x6B)
+
+# contiguous register ranges read in one burst each: (first register, count)
+# control/status 0x00-0x27, ADC results and part number 0x28-0x38
+BLOCKS = ((0x00, 0x28), (0x28, 0x11))
+
+# name: (register, mask, offset, bytes), 2 byte fields are little endian
+FIELDS = {
+    'adc_en': (0x26, 0x80, 7, 1),
+    'ibat_adc': (0x2A, 0xFFFC, 2, 2),
+    'vbat_adc': (0x30, 0x1FFE, 1, 2),
+    'part_info': (0x38, 0xFF, 0, 1),
+}
+
+
+class ChargerSnapshot(object):
+    '''
+    ChargerSnapshot keeps a RAM copy of the SC89620 register map, filled by
+    one burst read per register block instead of one transaction per
+    register. Fields are decoded from the copy, and writes done through
+    update() keep it current, so a read-modify-write needs no read.
+
+    :param bus:    SoftI2CBus (or TracingI2CBus), bus of the charger
+    :param addr:   int, I2C address
+    :param blocks: tuple, (first register, count) ranges refresh() reads
+
+    .. code-block:: python
+
+        snap = ChargerSnapshot(i2c_ch3)
+        prev = snap.copy()
+        snap.refresh()
+        print(diff(prev, snap.regs), snap.field('vbat_adc'))
+    '''
+
+    def __init__(self, bus, addr=SC89620_ADDR, blocks=BLOCKS):
+        self.bus = bus
+        self.addr = addr
+        self.blocks = blocks
+        self.regs = bytearray(max(start + n for start, n in blocks))
+        self.ticks = None
+
+    def refresh(self, blocks=None):
+        '''
+        Burst read the register blocks into the snapshot
+
+        :param blocks: tuple/None, ranges to read, all blocks by default
+        :returns: bytearray, the register copy
+        '''
+        require_present(self.bus, self.addr)
+        for start, n in blocks or self.blocks:
+            self.regs[start:start + n] = bytes(self.bus.read(self.addr, start, n))
+        self.ticks = time.ticks_ms()
+        return self.regs
+
+    def read_word(self, reg):
+        '''
+        Burst read a 2 byte little endian register pair, e.g. an ADC result,
+        so both bytes come from the same conversion, the snapshot is updated
+
+        :returns: int
+        '''
+        data = bytes(self.bus.read(self.addr, reg, 2))
+        if reg + 1 < len(self.regs):
+            self.regs[reg:reg + 2] = data
+        return data[0] | data[1] << 8
+
+    def copy(self):
+        return bytes(self.regs)
+
+    def get(self, reg):
+        '''
+        :returns: int, cached register value, None outside the snapshot
+        '''
+        if self.ticks is None or reg >= len(self.regs):
+            return None
+        return self.regs[reg]
+
+    def field(self, name, regs=None):
+        return decode_field(self.regs if regs is None else regs, FIELDS[name])
+
+    def update(self, reg, mask, offset, value):
+        '''
+        Write a register field, the other bits come from the snapshot (read
+        once when the register is not cached yet)
+
+        :returns: (old, new) register value
+        '''
+        old = self.get(reg)
+        if old is None:
+            old = self.bus.read(self.addr, reg, 1)[0]
+        new = field_set(old, mask, offset, value)
+        self.bus.write(self.addr, [reg, new])
+        if reg < len(self.regs):
+            self.regs[reg] = new
+        return old, new
+
+
+def decode_field(regs, spec):
+    reg, mask, offset, width = spec
+    value = regs[reg]
+    if width == 2:
+        value |= regs[reg + 1] << 8
+    return field_get(value, mask, offset)
+
+
+def decode(regs, fields=FIELDS):
+    '''
+    :returns: dict, field name: value
+    '''
+    return dict((name, decode_field(regs, spec)) for name, spec in fields.items())
+
+
+def diff(prev, curr, base=0):
+    '''
+    Compare two register copies
+
+    :param base: int, register number of the first byte
+    :returns: list of (register, previous, current) for changed registers
+    '''
+    return [(base + i, prev[i], curr[i]) for i in range(min(len(prev), len(curr))) if prev[i] != curr[i]]
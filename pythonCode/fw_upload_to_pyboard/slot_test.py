@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+import time
+import struct
+from micropython import const
+from fastbits import xor_sum, field_set
+
+
+__version__ = '0.1'
+
+# plan step: op, arg, lo, hi (6 bytes, signed 16 bit limits)
+STEP = '<BBhh'
+STEP_SIZE = const(6)
+
+OP_CHARGE = const(1)        # arg: 0/1, switch_charge of every active slot
+OP_DISCHARGE = const(2)     # arg: 0/1, switch_discharge
+OP_OQN = const(3)           # arg: 0/1, switch_oqn
+OP_WAIT = const(4)          # lo: ms, one wait shared by all slots
+OP_DETECT = const(5)        # battery present: fuel gauge answers on the slot bus (UNCHECKED without gauge)
+OP_VBAT = const(6)          # lo/hi: mV
+OP_IBAT = const(7)          # lo/hi: mA, negative for discharge
+OP_SOC = const(8)           # lo/hi: %
+OP_SETTLE = const(9)        # arg: timeout in 100 ms, lo/hi: mV, poll until every slot is inside
+OP_LED = const(10)          # arg: 0 red / 1 green / 2 blue, lo: 0/1
+
+# arg bit 7 of a check step: stop testing the slot when the check fails
+ARG_STOP = const(0x80)
+
+STATUS_PASS = const(0)
+STATUS_FAIL = const(1)
+STATUS_ERROR = const(2)     # I2C error, slot aborted
+STATUS_UNCHECKED = const(3) # every check passed but a step could not run (detect without gauge)
+
+# result frame payload: status, failed step (0xFF none), failed value,
+# last mV, last mA, last SOC * 256, elapsed ms
+RESULT = '<BBhHhHI'
+RUN_PLAN = const(0x3D)
+NO_STEP = const(0xFF)
+
+# log export request data: first record, record count (both optional);
+# answer: MeasLog.export() chunks, then a LOG_EXPORT frame with
+# oldest record, next record, records sent
+LOG_EXPORT = const(0x3E)
+EXPORT_REQUEST = '<II'
+EXPORT_REPLY = '<III'
+
+# SC89620 ADC (16 bit little endian result registers)
+ADC_CTRL = const(0x26)
+ADC_EN = const(0x80)
+ADC_IBAT = const(0x2A)
+ADC_VBAT = const(0x30)
+
+_COLORS = ('red', 'green', 'blue')
+
+
+class SlotResult(object):
+    __slots__ = ('status', 'step', 'value', 'voltage', 'current', 'soc', 'elapsed', 'active')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.status = STATUS_PASS
+        self.step = NO_STEP
+        self.value = 0
+        self.voltage = 0
+        self.current = 0
+        self.soc = 0
+        self.elapsed = 0
+        self.active = True
+
+
+class SlotTester(object):
+    '''
+    SlotTester runs a compact test plan on the board for all slots at once, so
+    a slot OQC costs one request and one result frame per slot instead of a
+    UART round trip per switch and per reading. Steps run in lockstep over the
+    active slots: switches are set for every slot, a wait is spent once for
+    all of them and OP_SETTLE ends as soon as every slot is inside its window
+    instead of waiting a fixed worst case time.
+
+    :param ctl:      XL9555GPIO, slot switches and LEDs
+    :param chargers: list, SC89620 per slot
+    :param gauges:   list/None, OM70201WV or FuelGaugeSession per slot, None where there is none
+    :param log:      MeasLog/None, every reading is appended to it
+    :param sleep_ms: callable/None, e.g. Supervisor.sleep_ms to keep the WDT fed
+    :param snapshots: list/None, ChargerSnapshot per slot, ADC results are
+                      then read with one 2 byte burst
+
+    .. code-block:: python
+
+        tester = SlotTester(ctl, [slot0, slot1, slot2, slot3], log=meas_log)
+        plan = build_plan([(OP_CHARGE, 1, 0, 0), (OP_WAIT, 0, 500, 0),
+                           (OP_VBAT, ARG_STOP, 3000, 4400)])
+        for frame in tester.run_frames(plan):
+            uart.write(frame)
+    '''
+
+    def __init__(self, ctl, chargers, gauges=None, log=None, sleep_ms=None, snapshots=None):
+        self.ctl = ctl
+        self.chargers = chargers
+        self.snapshots = snapshots
+        self.gauges = gauges or [None] * len(chargers)
+        self.log = log
+        self._sleep_ms = sleep_ms or time.sleep_ms
+        self._results = [SlotResult() for _ in chargers]
+
+    def run(self, plan, mask=0x0F):
+        '''
+        Run a plan on the slots in mask
+
+        :param plan: bytes, packed steps, see build_plan()
+        :param mask: int, bit n selects slot n
+        :returns: list of SlotResult, None for slots not in mask
+        '''
+        if len(plan) % STEP_SIZE:
+            raise ValueError("plan length {} is not a multiple of {}".format(len(plan), STEP_SIZE))
+        for index in range(len(plan) // STEP_SIZE):
+            op = plan[index * STEP_SIZE]
+            if not OP_CHARGE <= op <= OP_LED:
+                raise ValueError("unknown plan op {} at step {}".format(op, index))
+            if op == OP_LED and plan[index * STEP_SIZE + 1] & ~ARG_STOP >= len(_COLORS):
+                raise ValueError("unknown led color at step {}".format(index))
+        start = time.ticks_ms()
+        slots = []
+        for slot in range(len(self.chargers)):
+            res = self._results[slot]
+            res.reset()
+            if mask & (1 << slot):
+                slots.append(slot)
+                self._guard(slot, -1, self._adc_enable, slot)
+        for index in range(len(plan) // STEP_SIZE):
+            op, arg, lo, hi = struct.unpack_from(STEP, plan, index * STEP_SIZE)
+            if op == OP_WAIT:
+                self._sleep_ms(lo)
+            elif op == OP_SETTLE:
+                self._settle(slots, index, arg & 0x7F, lo, hi)
+            else:
+                for slot in slots:
+                    if self._results[slot].active:
+                        self._guard(slot, index, self._step, slot, index, op, arg, lo, hi)
+        elapsed = time.ticks_diff(time.ticks_ms(), start)
+        out = [None] * len(self.chargers)
+        for slot in slots:
+            self._results[slot].elapsed = elapsed
+            out[slot] = self._results[slot]
+        return out
+
+    def run_frames(self, plan, mask=0x0F):
+        '''
+        Run a plan and return one 0x25 result frame per tested slot
+        '''
+        frames = []
+        for slot, res in enumerate(self.run(plan, mask)):
+            if res is not None:
+                frames.append(result_frame(slot, res))
+        return frames
+
+    def handle_run_plan(self, rw, mask, data):
+        '''
+        FrameDispatcher handler of RUN_PLAN: the slot byte is the slot mask,
+        the data bytes are the plan. A plan that does not decode is answered
+        with a STATUS_ERROR frame per slot in mask.
+        '''
+        mask &= (1 << len(self.chargers)) - 1
+        try:
+            return self.run_frames(bytes(data), mask)
+        except ValueError:
+            res = SlotResult()
+            res.status = STATUS_ERROR
+            return [result_frame(slot, res) for slot in range(len(self.chargers)) if mask & (1 << slot)]
+
+    def sample(self, slot):
+        '''
+        Read VBAT, IBAT and (where the slot has a gauge) SOC of one slot and
+        append them to the log as one record
+
+        :returns: (mV, mA, SOC * 256), SOC is None without a gauge
+        '''
+        self._adc_enable(slot)
+        mv = self._read_vbat(slot)
+        ma = self._read_ibat(slot)
+        soc = None if self.gauges[slot] is None else self._read_soc(slot)
+        self._append(slot)
+        return mv, ma, soc
+
+    def _guard(self, slot, index, func, *args):
+        try:
+            func(*args)
+        except OSError:
+            res = self._results[slot]
+            if res.step == NO_STEP or res.status == STATUS_UNCHECKED:
+                res.step = index & 0xFF
+            res.status = STATUS_ERROR
+            res.active = False
+
+    def _step(self, slot, index, op, arg, lo, hi):
+        ctl = self.ctl
+        if op == OP_CHARGE:
+            ctl.switch_charge(slot, bool(arg))
+        elif op == OP_DISCHARGE:
+            ctl.switch_discharge(slot, bool(arg))
+        elif op == OP_OQN:
+            ctl.switch_oqn(slot, bool(arg))
+        elif op == OP_LED:
+            ctl.led_ctl(slot, _COLORS[arg & ~ARG_STOP], bool(lo))
+        elif op == OP_DETECT:
+            if self.gauges[slot] is None:
+                # no gauge on this slot: report the step instead of "no battery"
+                res = self._results[slot]
+                if res.status == STATUS_PASS:
+                    res.status = STATUS_UNCHECKED
+                    res.step = index
+                return
+            # the fuel gauge sits in the battery pack, no answer means no battery
+            try:
+                present = self._read_soc(slot, fresh=True) >= 0
+            except OSError:
+                present = False
+            self._check(slot, index, arg, 1 if present else 0, 1, 1)
+        elif op == OP_VBAT:
+            self._check(slot, index, arg, self._read_vbat(slot), lo, hi)
+            self._append(slot)
+        elif op == OP_IBAT:
+            self._check(slot, index, arg, self._read_ibat(slot), lo, hi)
+            self._append(slot)
+        elif op == OP_SOC:
+            soc = self._read_soc(slot)
+            self._check(slot, index, arg, soc >> 8, lo, hi)
+            self._append(slot)
+
+    def _check(self, slot, index, arg, value, lo, hi):
+        if lo <= value <= hi:
+            return
+        res = self._results[slot]
+        if res.status == STATUS_PASS or res.status == STATUS_UNCHECKED:
+            res.status = STATUS_FAIL
+            res.step = index
+            res.value = value
+        if arg & ARG_STOP:
+            res.active = False
+
+    def _settle(self, slots, index, timeout, lo, hi):
+        deadline = time.ticks_add(time.ticks_ms(), timeout * 100)
+        waiting = [s for s in slots if self._results[s].active]
+        while waiting:
+            for slot in waiting[:]:
+                self._guard(slot, index, self._settle_one, slot, waiting, lo, hi)
+                if not self._results[slot].active and slot in waiting:
+                    waiting.remove(slot)
+            if not waiting or time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                break
+            self._sleep_ms(10)
+        for slot in waiting:
+            self._check(slot, index, ARG_STOP, self._results[slot].voltage, lo, hi)
+
+    def _settle_one(self, slot, waiting, lo, hi):
+        mv = self._read_vbat(slot)
+        self._append(slot)
+        if lo <= mv <= hi:
+            waiting.remove(slot)
+
+    def _adc_enable(self, slot):
+        # keep the other ADC control bits (rate, resolution, averaging)
+        charger = self.chargers[slot]
+        charger.write_register(ADC_CTRL, field_set(charger.read_register(ADC_CTRL), ADC_EN, 7, 1))
+
+    def _read_adc(self, slot, reg):
+        if self.snapshots is not None:
+            return self.snapshots[slot].read_word(reg)
+        # byte reads: read the high byte again and retry if a conversion
+        # finished in between, so low and high byte belong together
+        charger = self.chargers[slot]
+        hi = charger.read_register(reg + 1)
+        while True:
+            lo = charger.read_register(reg)
+            again = charger.read_register(reg + 1)
+            if again == hi:
+                return lo | hi << 8
+            hi = again
+
+    def _read_vbat(self, slot):
+        # VBAT_ADC bits 12:1, 1.99 mV per LSB
+        mv = ((self._read_adc(slot, ADC_VBAT) >> 1) & 0xFFF) * 199 // 100
+        self._results[slot].voltage = mv
+        return mv
+
+    def _read_ibat(self, slot):
+        # IBAT_ADC bits 15:2, two's complement, 4 mA per LSB
+        raw = self._read_adc(slot, ADC_IBAT) >> 2
+        if raw & 0x2000:
+            raw -= 0x4000
+        ma = raw * 4
+        self._results[slot].current = ma
+        return ma
+
+    def _read_soc(self, slot, fresh=False):
+        gauge = self.gauges[slot]
+        if gauge is None:
+            raise OSError("slot {} has no fuel gauge".format(slot))
+        if fresh and hasattr(gauge, 'refresh'):
+            # a FuelGaugeSession cache must not hide a removed battery
+            gauge.refresh()
+        r = gauge.get_soc()
+        soc = r[0] << 8 | r[1]
+        self._results[slot].soc = soc
+        return soc
+
+    def _append(self, slot):
+        if self.log is not None:
+            res = self._results[slot]
+            self.log.append(slot, res.voltage, res.current, res.soc, res.status)
+
+
+class FrameDispatcher(object):
+    '''
+    FrameDispatcher splits a byte stream into 0x25 request frames
+    (0x25, function, length, rw, slot, data..., xor, 0x0A) and calls the
+    handler registered for the function code. Bytes before a frame start
+    and frames with a bad checksum are dropped, partial frames are kept
+    for the next feed().
+
+    .. code-block:: python
+
+        dispatcher = FrameDispatcher()
+        dispatcher.register(RUN_PLAN, tester.handle_run_plan)
+        for frame in dispatcher.feed(uart.read()):
+            uart.write(frame)
+    '''
+
+    def __init__(self):
+        self._handlers = {}
+        self._buf = bytearray()
+        self.dropped = 0
+
+    def register(self, code, handler):
+        '''
+        :param handler: callable(rw, slot, data), returns a list of reply frames
+        '''
+        self._handlers[code] = handler
+
+    def feed(self, data):
+        '''
+        :returns: list of reply frames for the complete frames in data
+        '''
+        if data:
+            self._buf.extend(data)
+        replies = []
+        buf = self._buf
+        while buf:
+            if buf[0] != 0x25:
+                start = buf.find(b'\x25')
+                self.dropped += len(buf) if start < 0 else start
+                del buf[:len(buf) if start < 0 else start]
+                continue
+            if len(buf) < 3 or len(buf) < buf[2] + 3:
+                break
+            size = buf[2] + 3
+            frame = bytes(buf[:size])
+            if buf[2] < 4 or frame[-1] != 0x0A or xor_sum(frame, 0, size - 2) != frame[-2]:
+                # resync on the next start byte
+                self.dropped += 1
+                del buf[:1]
+                continue
+            del buf[:size]
+            handler = self._handlers.get(frame[1])
+            if handler is None:
+                self.dropped += size
+                continue
+            replies.extend(handler(frame[3], frame[4], frame[5:-2]))
+        return replies
+
+
+def build_plan(steps):
+    '''
+    Pack (op, arg, lo, hi) tuples into a plan
+
+    :returns: bytes
+    '''
+    plan = bytearray(len(steps) * STEP_SIZE)
+    for i, (op, arg, lo, hi) in enumerate(steps):
+        struct.pack_into(STEP, plan, i * STEP_SIZE, op, arg, lo, hi)
+    return bytes(plan)
+
+
+def log_export_handler(log, write, kick=None):
+    '''
+    Make the FrameDispatcher handler of LOG_EXPORT for a MeasLog. The
+    records are streamed through write while the request is handled, so
+    the export never sits in RAM as a whole.
+
+    :param log:   MeasLog, log to export
+    :param write: callable, e.g. uart.write
+    :param kick:  callable/None, called after every chunk, e.g. Supervisor.kick
+
+    .. code-block:: python
+
+        dispatcher.register(LOG_EXPORT, log_export_handler(meas_log, uart.write))
+    '''
+    def handler(rw, slot, data):
+        start, count = 0, 0xFFFFFFFF
+        if len(data) >= 4:
+            start = struct.unpack_from('<I', data, 0)[0]
+        if len(data) >= 8:
+            count = struct.unpack_from('<I', data, 4)[0]
+        sent = log.export(write, start, count, kick=kick)
+        return [reply_frame(LOG_EXPORT, slot, struct.pack(EXPORT_REPLY, log.first(), log.next(), sent))]
+    return handler
+
+
+def result_frame(slot, res):
+    '''
+    Pack a SlotResult the way the other slot commands answer:
+    0x25, RUN_PLAN, length, 0x55, slot, payload, xor, 0x0A
+    '''
+    payload = struct.pack(RESULT, res.status, res.step, res.value, res.voltage,
+                          res.current, res.soc, res.elapsed)
+    return reply_frame(RUN_PLAN, slot, payload)
+
+
+def reply_frame(code, slot, payload):
+    '''
+    :returns: bytearray, 0x25, code, length, 0x55, slot, payload, xor, 0x0A
+    '''
+    frame = bytearray(len(payload) + 7)
+    frame[0] = 0x25
+    frame[1] = code
+    frame[2] = len(payload) + 4
+    frame[3] = 0x55
+    frame[4] = slot
+    frame[5:5 + len(payload)] = payload
+    frame[-2] = xor_sum(frame, 0, len(frame) - 2)
+    frame[-1] = 0x0A
+    return frame
@@ -43,17 +43,18 @@ class SoftI2CBus(object):
         bool = i2c.is_ready(address)
         print("there are {} slave device on current i2c bus".format(address_list))
         print("current i2c device is ready?{}".format(bool))
-    '''
-    rpc_public_api = [
-        "read", "write", "send", "write_and_read", "scan", "is_ready"
-    ]
 
+        # query the presence map built at open(), no bus traffic
+        bool = i2c.is_present(address)
+    '''
     def __init__(self, scl, sda, freq=100000):
 
         self._scl = scl
         self._sda = sda
         self._freq = freq
         self._ps_i2c = None
+        # one bit per 7-bit address, filled by scan() and probe()
+        self._presence = bytearray(16)
         self.open()
 
     def __del__(self):
@@ -68,6 +69,7 @@ class SoftI2CBus(object):
         self._ps_i2c = SoftI2C(scl=Pin(self._scl), sda=Pin(self._sda), freq=self._freq)
         if not self._ps_i2c:
             raise OSError("Open device fail SCL: {} SDA: {}".format(self._scl, self._sda))
+        self.scan()
 
     def close(self):
         '''
@@ -91,7 +93,11 @@ class SoftI2CBus(object):
         '''
         assert 0 <= addr <= 0xFF
         assert length > 0
-        buffer = self._ps_i2c.readfrom_mem(addr, rd_data, length, addrsize=addrsize)
+        try:
+            buffer = self._ps_i2c.readfrom_mem(addr, rd_data, length, addrsize=addrsize)
+        except OSError:
+            self._mark(addr, False)
+            raise
         return list(buffer)
 
     def write(self, addr, data, addrsize=8):
@@ -111,9 +117,17 @@ class SoftI2CBus(object):
             else:
                 wr_data = bytearray(data[2::])
                 mem_addr = data[0] << 8 | data[1]
-            self._ps_i2c.writeto_mem(addr, mem_addr, wr_data, addrsize=addrsize)
+            try:
+                self._ps_i2c.writeto_mem(addr, mem_addr, wr_data, addrsize=addrsize)
+            except OSError:
+                self._mark(addr, False)
+                raise
         else:
-            self._ps_i2c.writeto(addr, bytearray(data))
+            try:
+                self._ps_i2c.writeto(addr, bytearray(data))
+            except OSError:
+                self._mark(addr, False)
+                raise
 
     def recv(self, addr, length):
         '''
@@ -124,7 +138,11 @@ class SoftI2CBus(object):
         '''
         assert 0 <= addr <= 0xFF
         assert length > 0
-        buffer = self._ps_i2c.readfrom(addr, length)
+        try:
+            buffer = self._ps_i2c.readfrom(addr, length)
+        except OSError:
+            self._mark(addr, False)
+            raise
         return list(buffer)
 
     def send(self, addr, data):
@@ -137,7 +155,11 @@ class SoftI2CBus(object):
         '''
         assert 0 <= addr <= 0xFF
         assert isinstance(data, list)
-        self._ps_i2c.writeto(addr, bytearray(data))
+        try:
+            self._ps_i2c.writeto(addr, bytearray(data))
+        except OSError:
+            self._mark(addr, False)
+            raise
 
     def write_and_read(self, addr, wr_data, length, addrsize=8):
         '''
@@ -158,16 +180,63 @@ class SoftI2CBus(object):
             mem_addr = wr_data[0] <<8 |wr_data[1]
             data = bytearray(wr_data[2::])
         if data:
-            self._ps_i2c.writeto_mem(addr, mem_addr, data, addrsize=addrsize)
+            try:
+                self._ps_i2c.writeto_mem(addr, mem_addr, data, addrsize=addrsize)
+            except OSError:
+                self._mark(addr, False)
+                raise
         return self.read(addr, mem_addr, length, addrsize)
 
     def scan(self):
         '''
-        Scan the slave address of i2c bus
+        Scan the slave address of i2c bus and rebuild the presence map
 
         :return: list, all the device address are in it
         '''
-        return self._ps_i2c.scan()
+        addr_list = self._ps_i2c.scan()
+        presence = self._presence
+        for i in range(len(presence)):
+            presence[i] = 0
+        for addr in addr_list:
+            presence[addr >> 3] |= 1 << (addr & 0x07)
+        return addr_list
+
+    def probe(self, addr):
+        '''
+        Check a single address with one address-only transaction
+        and update the presence map with the result
+
+        :param addr: int(0x00~0x7f), i2c slave address
+        :return: bool, True if the slave acknowledged
+        '''
+        assert 0 <= addr <= 0x7F
+        try:
+            self._ps_i2c.writeto(addr, b'')
+            ack = True
+        except OSError:
+            ack = False
+        self._mark(addr, ack)
+        return ack
+
+    def is_present(self, addr):
+        '''
+        Look up addr in the presence map, no bus transaction
+
+        :param addr: int(0x00~0x7f), i2c slave address
+        :return: bool, True if addr answered the last scan/probe
+        '''
+        return (self._presence[(addr >> 3) & 0x0F] >> (addr & 0x07)) & 1 == 1
+
+    def refresh(self, addr=None):
+        '''
+        Refresh the presence map, one address or the whole bus
+
+        :param addr: int/None, probe only this address if given
+        :return: bool if addr is given, else list of present address
+        '''
+        if addr is None:
+            return self.scan()
+        return self.probe(addr)
 
     def is_ready(self, addr):
         '''
@@ -175,7 +244,33 @@ class SoftI2CBus(object):
 
         :return: bool, is ready if True else not ready
         '''
+        return self.probe(addr)
+
+    def _mark(self, addr, present):
+        addr &= 0x7F
+        if present:
+            self._presence[addr >> 3] |= 1 << (addr & 0x07)
+        else:
+            self._presence[addr >> 3] &= ~(1 << (addr & 0x07)) & 0xFF
 
-        addr_list = self.scan()
-        return True if addr in addr_list else False
 
+def require_present(bus, addr):
+    '''
+    Gate a device access on the presence map of the bus. An address that is
+    not in the map is probed once, so a device that came back is used again.
+    Buses without a presence map (other bus drivers) always pass.
+
+    :param bus:  SoftI2CBus (or a wrapper forwarding is_present/probe)
+    :param addr: int(0x00~0x7f), i2c slave address
+    :raises OSError: ENODEV when the device does not answer
+
+    .. code-block:: python
+
+        require_present(i2c, 0x20)
+        i2c.write(0x20, [0x02, 0xFF])
+    '''
+    is_present = getattr(bus, 'is_present', None)
+    if is_present is None or is_present(addr):
+        return
+    if not bus.probe(addr):
+        raise OSError(19, "no i2c device at 0x{:02X}".format(addr))
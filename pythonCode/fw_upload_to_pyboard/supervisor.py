@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import machine
+import micropython
+
+
+__version__ = '0.1'
+
+
+class Supervisor(object):
+    '''
+    Supervisor owns the hardware WDT and only feeds it when every registered
+    task reported progress since the last feed. The main task is also held to
+    a deadline: any gap between two kick() calls longer than deadline ms is
+    counted as an overrun and recorded in RAM together with the activity
+    that was running; flush_log() writes the records to flash from the main
+    loop, so kick() never waits for flash. A main task that stops kicking is reported from the
+    timer task before the WDT resets the board.
+
+    :param timeout:   int, WDT timeout in ms (RP2040 max 8388)
+    :param deadline:  int, max gap between two kick() calls in ms
+    :param log_file:  str, overrun log on the board filesystem
+    :param log_size:  int, log is rotated to log_file + '.1' beyond this size
+    :param max_logs:  int, max log lines written per boot (flash wear)
+    :param enable:    bool, start the hardware WDT
+
+    .. code-block:: python
+
+        sup = Supervisor(timeout=500, deadline=100)
+        timer_task = sup.register("breath")
+        while True:
+            sup.mark("scan")
+            scan()
+            sup.kick()
+            sup.flush_log()
+    '''
+
+    def __init__(self, timeout=500, deadline=100, log_file='supervisor.log',
+                 log_size=4096, max_logs=32, enable=True):
+        self._timeout = timeout
+        self._deadline = deadline
+        self._log_file = log_file
+        self._log_size = log_size
+        self._logs_left = max_logs
+        self._names = []
+        self._all = 0
+        self._alive = 0
+        self._main = self.register("main")
+        self._activity = "boot"
+        self._last_kick = time.ticks_ms()
+        self._last_feed = self._last_kick
+        self._overruns = 0
+        self._worst = 0
+        self._worst_activity = ""
+        self._stall_logged = False
+        self._log_stall_ref = self._log_stall
+        # lines recorded by kick(), written to flash by flush_log() when idle
+        self._pending = []
+        if machine.reset_cause() == machine.WDT_RESET:
+            self._log("wdt reset")
+        self._wdt = machine.WDT(timeout=timeout) if enable else None
+
+    def register(self, name):
+        '''
+        Register a task which must call progress() between two WDT feeds
+
+        :param  name: str, task name used in the log
+        :returns: int, task bit for progress()
+        '''
+        bit = 1 << len(self._names)
+        self._names.append(name)
+        self._all |= bit
+        return bit
+
+    def progress(self, bit):
+        '''
+        Report progress of a task, safe to call from an IRQ
+        '''
+        self._alive |= bit
+
+    def mark(self, activity):
+        '''
+        Name what the main task does until the next mark(), used as the
+        overrun cause
+        '''
+        self._activity = activity
+
+    def kick(self):
+        '''
+        Report main task progress, check the deadline and feed the WDT
+        once every registered task made progress
+        '''
+        now = time.ticks_ms()
+        gap = time.ticks_diff(now, self._last_kick)
+        self._last_kick = now
+        if gap > self._deadline:
+            self._overrun(gap)
+        self._alive |= self._main
+        if self._alive == self._all:
+            self._alive = 0
+            self._last_feed = now
+            self._stall_logged = False
+            if self._wdt:
+                self._wdt.feed()
+        elif (not self._stall_logged and
+              time.ticks_diff(now, self._last_feed) > self._timeout // 2):
+            self._stall_logged = True
+            self._defer("stall {}".format(self._stalled()))
+
+    def flush_log(self):
+        '''
+        Write the overruns and stalls recorded by kick() to the log file,
+        call from the main loop when idle, the flash write would hold up
+        kick() itself
+        '''
+        if self._pending:
+            lines = self._pending
+            self._pending = []
+            self._write(lines)
+
+    def watch(self, bit):
+        '''
+        Called from a periodic task (timer callback): report its progress
+        and log the activity of a main task that stopped kicking
+        '''
+        self._alive |= bit
+        if (not self._stall_logged and
+                time.ticks_diff(time.ticks_ms(), self._last_kick) > self._timeout // 2):
+            self._stall_logged = True
+            micropython.schedule(self._log_stall_ref, 0)
+
+    def sleep_ms(self, ms, step=10):
+        '''
+        time.sleep_ms replacement for long waits, keeps kicking
+        '''
+        start = time.ticks_ms()
+        while True:
+            left = ms - time.ticks_diff(time.ticks_ms(), start)
+            if left <= 0:
+                break
+            time.sleep_ms(step if left > step else left)
+            self.kick()
+
+    def report(self):
+        '''
+        Format the counters for the uart wdtinfo command
+
+        :returns: str
+        '''
+        return "overruns: {}\nworst_ms: {}\nworst_activity: {}\ndeadline_ms: {}\ntimeout_ms: {}\n".format(
+            self._overruns, self._worst, self._worst_activity, self._deadline, self._timeout)
+
+    def _overrun(self, gap):
+        self._overruns += 1
+        if gap > self._worst:
+            self._worst = gap
+            self._worst_activity = self._activity
+        self._defer("overrun {} {}ms".format(self._activity, gap))
+
+    def _stalled(self):
+        names = [name for i, name in enumerate(self._names) if not self._alive & (1 << i)]
+        return "{} in {}".format(",".join(names), self._activity)
+
+    def _log_stall(self, _arg):
+        # the main task is stuck and will not flush_log() before the WDT
+        # resets the board, so this one is written right away
+        self._log("stall main in {}".format(self._activity))
+
+    def _defer(self, text):
+        if self._logs_left <= 0:
+            return
+        self._logs_left -= 1
+        self._pending.append("{} {}".format(time.ticks_ms(), text))
+
+    def _log(self, text):
+        if self._logs_left <= 0:
+            return
+        self._logs_left -= 1
+        self._write(["{} {}".format(time.ticks_ms(), text)])
+
+    def _write(self, lines):
+        try:
+            try:
+                if os.stat(self._log_file)[6] > self._log_size:
+                    try:
+                        os.remove(self._log_file + '.1')
+                    except OSError:
+                        pass
+                    os.rename(self._log_file, self._log_file + '.1')
+            except OSError:
+                pass
+            with open(self._log_file, 'a') as f:
+                for line in lines:
+                    f.write(line + "\n")
+        except OSError as e:
+            print("Error writing supervisor log: {}".format(e))
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import time
+from array import array
+from micropython import const
+
+
+__version__ = '0.1'
+
+# Set to 1 and rebuild to record section timings. With 0, @timed returns
+# the decorated function itself, so disabled hooks cost nothing per call.
+ENABLED = const(0)
+
+# log2 histogram of ticks_us durations: bucket n counts dt < 2**n us,
+# the last bucket collects everything >= 2**(_BUCKETS - 2) us
+_BUCKETS = const(20)
+_COUNT = const(20)
+_TOTAL = const(21)
+_MAX = const(22)
+_SLOTS = const(23)
+
+_names = []
+_hists = []
+
+
+def section(name):
+    '''
+    Register a named section and preallocate its histogram
+
+    :param  name: str, section name shown by report()
+    :returns: int, section index for record()/end()
+    '''
+    if name in _names:
+        return _names.index(name)
+    _names.append(name)
+    _hists.append(array('I', [0] * _SLOTS))
+    return len(_names) - 1
+
+
+def record(index, dt):
+    '''
+    Add one duration to a section histogram, does not allocate
+
+    :param index: int, index returned by section()
+    :param dt:    int, duration in us
+    '''
+    hist = _hists[index]
+    bucket = 0
+    v = dt
+    while v > 0 and bucket < _BUCKETS - 1:
+        v >>= 1
+        bucket += 1
+    hist[bucket] += 1
+    hist[_COUNT] += 1
+    # total wraps after ~71 minutes of accumulated section time
+    hist[_TOTAL] = (hist[_TOTAL] + dt) & 0xFFFFFFFF
+    if dt > hist[_MAX]:
+        hist[_MAX] = dt
+
+
+def begin():
+    '''
+    Start an inline timed section
+
+    :returns: int, ticks_us start stamp for end()
+    '''
+    return time.ticks_us()
+
+
+def end(index, start):
+    '''
+    Close an inline timed section opened with begin()
+    '''
+    if ENABLED:
+        record(index, time.ticks_diff(time.ticks_us(), start))
+
+
+def _passthrough(func):
+    return func
+
+
+def timed(name):
+    '''
+    Decorator recording every call of the function into section name
+
+    .. code-block:: python
+
+        @timed("scan")
+        def scan(self):
+            ...
+    '''
+    if not ENABLED:
+        return _passthrough
+    index = section(name)
+
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            start = time.ticks_us()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(index, time.ticks_diff(time.ticks_us(), start))
+        return wrapper
+    return decorator
+
+
+def reset():
+    '''
+    Clear every histogram, sections stay registered
+    '''
+    for hist in _hists:
+        for i in range(_SLOTS):
+            hist[i] = 0
+
+
+def report():
+    '''
+    Format the histograms for the uart timinginfo command,
+    one line per section: name count total_us max_us b0 .. b19
+
+    :returns: str
+    '''
+    if not ENABLED:
+        return "timing disabled\n"
+    lines = []
+    for name, hist in zip(_names, _hists):
+        lines.append("{} {} {} {} {}".format(
+            name, hist[_COUNT], hist[_TOTAL], hist[_MAX],
+            " ".join([str(hist[i]) for i in range(_BUCKETS)])))
+    return "\n".join(lines) + "\n"
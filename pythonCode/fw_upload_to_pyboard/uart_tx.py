@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import time
+
+
+__version__ = '0.1'
+
+BAUD_RATES = (115200, 230400, 460800, 921600, 1000000, 1500000, 2000000)
+
+
+class TxBuffer(object):
+    '''
+    TxBuffer wraps a UART and collects the writes of one reply in a
+    preallocated buffer, so a handler that writes line by line costs one
+    uart.write per reply instead of one per line. Data larger than the free
+    space flushes the buffer first, data larger than the buffer is written
+    straight through. Everything else (read, any, irq, init, ...) goes to
+    the wrapped UART.
+
+    :param uart: machine.UART
+    :param size: int, buffer size in bytes
+
+    .. code-block:: python
+
+        uart = TxBuffer(UART(0, baudrate=115200, tx=Pin(0), rx=Pin(1)))
+        for k in names:
+            uart.write("{}: {}\\n".format(k, 1))
+        uart.flush()
+    '''
+
+    def __init__(self, uart, size=1024):
+        self.uart = uart
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._n = 0
+        # uart.write calls and bytes sent, for the baud command report
+        self.writes = 0
+        self.sent = 0
+
+    def __getattr__(self, name):
+        return getattr(self.uart, name)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        if self._n + n > len(self._buf):
+            self.flush()
+            if n > len(self._buf):
+                self._send(data)
+                return n
+        self._buf[self._n:self._n + n] = data
+        self._n += n
+        return n
+
+    def flush(self):
+        '''
+        Send the buffered bytes with one uart.write
+        '''
+        if self._n:
+            self._send(self._view[:self._n])
+            self._n = 0
+
+    def _send(self, data):
+        self.writes += 1
+        self.sent += len(data)
+        self.uart.write(data)
+
+    def drain(self, timeout_ms=100):
+        '''
+        Flush and wait until the last byte left the TX shift register, needed
+        before the baud rate changes
+        '''
+        self.flush()
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        txdone = getattr(self.uart, 'txdone', None)
+        while txdone is not None and not txdone():
+            if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                break
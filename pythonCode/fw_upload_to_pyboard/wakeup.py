@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import time
+import machine
+from array import array
+from micropython import const
+
+
+__version__ = '0.1'
+
+EV_UART = const(1)
+EV_INPUT = const(2)
+EV_TIMER = const(4)
+
+_NAMES = ('uart', 'input', 'timer')
+# per event: count, total latency us, max latency us
+_COUNT = const(0)
+_TOTAL = const(1)
+_MAX = const(2)
+
+
+class Wakeup(object):
+    '''
+    Wakeup lets the main loop sleep in machine.idle() until an IRQ handler
+    reports an event or a deadline passes, instead of sleeping a fixed time
+    per pass. Handlers only set a bit and a ticks_us stamp, so they can run
+    as hard or soft IRQs. The latency from the first pending event to the
+    loop noticing it is kept per event type, together with the time spent
+    idle, for the loopstat report.
+
+    .. code-block:: python
+
+        wake = Wakeup()
+        uart.irq(handler=wake.uart_handler, trigger=UART.IRQ_RXIDLE)
+        while True:
+            events = wake.wait(50, uart.any)
+            if events & EV_UART:
+                process()
+    '''
+
+    def __init__(self):
+        self._pending = 0
+        self._stamp = 0
+        self._stats = array('I', [0] * (3 * len(_NAMES)))
+        self._loops = 0
+        self._spurious = 0
+        self._idle_us = 0
+        self._since = time.ticks_ms()
+        # bound methods are allocated here once, not in every IRQ
+        self.uart_handler = self._on_uart
+        self.input_handler = self._on_input
+
+    def set(self, events):
+        '''
+        Report events, safe to call from an IRQ
+        '''
+        if not self._pending:
+            self._stamp = time.ticks_us()
+        self._pending |= events
+
+    def _on_uart(self, _uart):
+        self.set(EV_UART)
+
+    def _on_input(self, _pin):
+        self.set(EV_INPUT)
+
+    def wait(self, timeout_ms, ready=None):
+        '''
+        Sleep until an event is pending, ready() returns true or timeout_ms
+        passed
+
+        :param timeout_ms: int, deadline, EV_TIMER is returned when it expires
+        :param ready:      callable/None, polled after every wake, e.g. uart.any
+                           for firmware without UART RX IRQ
+        :returns: int, event bits, 0 when woken only by ready()
+        '''
+        self._loops += 1
+        start = time.ticks_us()
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        timed_out = False
+        while not self._pending:
+            if ready is not None and ready():
+                break
+            if time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+                timed_out = True
+                break
+            machine.idle()
+            if not self._pending:
+                self._spurious += 1
+        now = time.ticks_us()
+        self._idle_us += time.ticks_diff(now, start)
+        state = machine.disable_irq()
+        events = self._pending
+        stamp = self._stamp
+        self._pending = 0
+        machine.enable_irq(state)
+        if events:
+            self._record(events, time.ticks_diff(now, stamp))
+        if timed_out:
+            events |= EV_TIMER
+            self._record(EV_TIMER, time.ticks_diff(now, start) - timeout_ms * 1000)
+        return events
+
+    def _record(self, events, latency):
+        if latency < 0:
+            latency = 0
+        for i in range(len(_NAMES)):
+            if events & (1 << i):
+                base = i * 3
+                self._stats[base + _COUNT] += 1
+                self._stats[base + _TOTAL] = (self._stats[base + _TOTAL] + latency) & 0xFFFFFFFF
+                if latency > self._stats[base + _MAX]:
+                    self._stats[base + _MAX] = latency
+
+    def reset(self):
+        for i in range(len(self._stats)):
+            self._stats[i] = 0
+        self._loops = 0
+        self._spurious = 0
+        self._idle_us = 0
+        self._since = time.ticks_ms()
+
+    def report(self):
+        '''
+        Format the counters for the uart loopstat command
+
+        :returns: str
+        '''
+        elapsed = time.ticks_diff(time.ticks_ms(), self._since)
+        busy = 100 - self._idle_us // (elapsed * 10) if elapsed > 0 else 0
+        lines = ["loops: {}\nspurious_wakes: {}\nbusy_pct: {}\n".format(self._loops, self._spurious, busy)]
+        for i, name in enumerate(_NAMES):
+            base = i * 3
+            count = self._stats[base + _COUNT]
+            lines.append("{}: n={} avg_us={} max_us={}\n".format(
+                name, count, self._stats[base + _TOTAL] // count if count else 0, self._stats[base + _MAX]))
+        return "".join(lines)
@@ -1,3 +1,11 @@
+import os
+import sys
+import ast
+import time
+import struct
+import select
+import argparse
+
 FUNCTION_CODE = {
     "set_lowLimit": 0x25,
     "set_highLimit": 0x26,
@@ -19,11 +27,38 @@ FUNCTION_CODE = {
     "read_dlj_bytes": 0x3A,
     "read_voltage": 0x3B,
     "init_system": 0x3C,
+    "run_plan": 0x3D,
+    "log_export": 0x3E,
+}
+
+# log_export 导出流：与固件 meas_log.py 的分块格式一致，之后是一帧 0x3E 应答
+CHUNK_SYNC = b"\xAA\x55"
+CHUNK_HEADER_SIZE = 6
+RECORD_SIZE = 12
+
+# run_plan 步骤，与固件 slot_test.py 一致: 名称 -> 操作码
+PLAN_OPS = {
+    "charge": 1,
+    "discharge": 2,
+    "oqn": 3,
+    "wait": 4,
+    "detect": 5,
+    "vbat": 6,
+    "ibat": 7,
+    "soc": 8,
+    "settle": 9,
+    "led": 10,
 }
+PLAN_STOP = 0x80
+PLAN_STATUS = {0: "PASS", 1: "FAIL", 2: "ERROR", 3: "UNCHECKED"}
 
 
 def get_cmd_hex(cmd_str, slot, data=None):
-    assert slot in [0x00, 0x01, 0x02, 0x03]
+    # run_plan 的通道字节为通道掩码 (bit n 对应通道 n)
+    if cmd_str == "run_plan":
+        assert 0x01 <= slot <= 0x0F
+    else:
+        assert slot in [0x00, 0x01, 0x02, 0x03]
     # 0x25
     cmd_code = FUNCTION_CODE.get(cmd_str, None)
     if cmd_code:
@@ -31,7 +66,7 @@ def get_cmd_hex(cmd_str, slot, data=None):
     else:
         raise RuntimeError("cmd_str {} is avilad".format(cmd_str))
 
-    if cmd_code in [0x31, 0x32, 0x34, 0x35, 0x36, 0x37, 0x38, 0x3A, 0x3B] or cmd_str== "get_lowLimit" or cmd_str == "get_highLimit":
+    if cmd_code in [0x31, 0x32, 0x34, 0x35, 0x36, 0x37, 0x38, 0x3A, 0x3B, 0x3E] or cmd_str== "get_lowLimit" or cmd_str == "get_highLimit":
         wr_code = 0x55
     else:
         wr_code = 0xAA
@@ -62,6 +97,373 @@ def get_cmd_hex(cmd_str, slot, data=None):
     return result
 
 
+def compile_plan(text):
+    """把文本测试计划编译为 run_plan 的数据字节
+    每步以 ; 分隔: <op> [参数...]，数值检查步骤后加 ! 表示失败即停止该通道
+        charge 1; wait 500; detect!; vbat 3000 4400!; ibat 100 2000; soc 5 100
+        settle 30 4100 4300: 最长等待 3.0 s 直到电压进入范围
+        led 1 1: 绿灯亮 (0 红 / 1 绿 / 2 蓝)
+    Returns:
+        list: 每步 6 字节 (op, arg, lo:int16, hi:int16)
+    """
+    data = []
+    for step in text.split(";"):
+        words = step.split()
+        if not words:
+            continue
+        name = words[0]
+        stop = name.endswith("!")
+        name = name.rstrip("!")
+        if name not in PLAN_OPS:
+            raise ValueError("unknown plan step '{}'".format(name))
+        args = [int(w, 0) for w in words[1:]]
+        arg, lo, hi = 0, 0, 0
+        if name in ("charge", "discharge", "oqn"):
+            arg, = args
+        elif name == "wait":
+            lo, = args
+        elif name == "detect":
+            if args:
+                raise ValueError("detect takes no arguments")
+        elif name in ("vbat", "ibat", "soc"):
+            lo, hi = args
+        elif name == "settle":
+            arg, lo, hi = args
+            if not 0 <= arg <= 0x7F:
+                raise ValueError("settle timeout must be 0-127 (x100 ms)")
+        elif name == "led":
+            arg, lo = args
+            if not 0 <= arg <= 2:
+                raise ValueError("led color must be 0-2 (red/green/blue)")
+        if stop:
+            arg |= PLAN_STOP
+        for v in (lo, hi):
+            if not -0x8000 <= v <= 0x7FFF:
+                raise ValueError("plan value {} out of int16 range".format(v))
+        data += [PLAN_OPS[name], arg & 0xFF, lo & 0xFF, (lo >> 8) & 0xFF, hi & 0xFF, (hi >> 8) & 0xFF]
+    if 0x04 + len(data) > 0xFF:
+        raise ValueError("plan too long: {} steps".format(len(data) // 6))
+    return data
+
+
+def decode_plan_result(data):
+    """解码 run_plan 每个通道的结果帧数据 (14 字节)"""
+    if len(data) != 14:
+        return None
+    raw = bytes(data)
+    signed = lambda b: int.from_bytes(b, "little", signed=True)
+    return {
+        "status": PLAN_STATUS.get(raw[0], raw[0]),
+        "failed_step": None if raw[1] == 0xFF else raw[1],
+        "failed_value": signed(raw[2:4]),
+        "voltage_mv": int.from_bytes(raw[4:6], "little"),
+        "current_ma": signed(raw[6:8]),
+        "soc": int.from_bytes(raw[8:10], "little") / 256.0,
+        "elapsed_ms": int.from_bytes(raw[10:14], "little"),
+    }
+
+
+def parse_script_line(line):
+    """解析脚本中的一行: <cmd> <slot> [参数]
+    参数可为整数 (支持 0x 前缀)、列表 [1, 2] 或多个空格分隔的整数；
+    run_plan 的 slot 为通道掩码，参数为 compile_plan 的文本计划；
+    "sleep <ms>" 为延时指令，空行与 # 注释忽略
+    Returns:
+        None / ("sleep", ms, None) / (cmd_str, slot, data)
+    """
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    parts = line.split(None, 2)
+    if parts[0] == "sleep":
+        return "sleep", int(parts[1]), None
+    if len(parts) < 2:
+        raise ValueError("missing slot")
+    cmd_str, slot = parts[0], int(parts[1], 0)
+    if cmd_str not in FUNCTION_CODE:
+        raise ValueError("unknown command")
+    if cmd_str == "log_export":
+        raise ValueError("log_export streams records, use --export-log")
+    if cmd_str == "run_plan":
+        if not 0x01 <= slot <= 0x0F:
+            raise ValueError("run_plan slot mask must be 0x1-0xF")
+    elif slot not in [0, 1, 2, 3]:
+        raise ValueError("slot must be 0-3")
+    data = None
+    if cmd_str == "run_plan":
+        if len(parts) < 3:
+            raise ValueError("missing plan")
+        data = compile_plan(parts[2])
+    elif len(parts) == 3:
+        text = parts[2].strip()
+        if text.startswith("["):
+            data = ast.literal_eval(text)
+            if not isinstance(data, list) or not all(isinstance(d, int) for d in data):
+                raise ValueError("data list must contain integers")
+        else:
+            values = [int(v, 0) for v in text.split()]
+            data = values[0] if len(values) == 1 else values
+    get_cmd_hex(cmd_str, slot, data)  # 提前校验指令与通道
+    return cmd_str, slot, data
+
+
+def decode_frame(frame):
+    """解码 0x25 开头的应答帧
+    Returns:
+        dict: cmd, code, rw, slot, data, xor_ok
+    """
+    names = {}
+    for name, code in FUNCTION_CODE.items():
+        names.setdefault(code, name)
+    if len(frame) < 7 or frame[0] != 0x25:
+        return None
+    xor_code = 0
+    for b in frame[:-2]:
+        xor_code ^= b
+    return {
+        "cmd": names.get(frame[1], "0x{:02X}".format(frame[1])),
+        "code": frame[1],
+        "rw": frame[3],
+        "slot": frame[4],
+        "data": list(frame[5:-2]),
+        "xor_ok": xor_code == frame[-2],
+    }
+
+
+# 每个 fd 的接收缓冲：一次 os.read 可能收到多帧，取走一帧后其余字节留给下一次调用
+_rx_buffers = {}
+
+
+def _read_reply(fd, timeout):
+    """读取一帧应答：0x25 开头按长度字节取整帧，否则读到换行"""
+    buf = _rx_buffers.setdefault(fd, bytearray())
+    deadline = time.monotonic() + timeout
+    while True:
+        end = 0
+        if buf[:1] == b"\x25" and len(buf) >= 3 and len(buf) >= buf[2] + 3:
+            end = buf[2] + 3
+        elif buf[:1] != b"\x25" and b"\n" in buf:
+            end = buf.index(b"\n") + 1
+        if end:
+            frame = bytes(buf[:end])
+            del buf[:end]
+            return frame
+        left = deadline - time.monotonic()
+        if left <= 0:
+            frame = bytes(buf)
+            buf.clear()
+            return frame or None
+        r, _, _ = select.select([fd], [], [], left)
+        if r:
+            try:
+                buf += os.read(fd, 256)
+            except BlockingIOError:
+                pass
+
+
+def export_log(fd, start=0, count=0xFFFFFFFF, timeout=1.0):
+    """请求槽位板导出测量记录
+    Args:
+        fd: open_serial 打开的串口
+        start: 第一条记录的序号
+        count: 记录条数
+        timeout: 相邻两块数据之间的最长等待秒数
+    Returns:
+        (chunks, info)：chunks 为分块二进制流 (bytes)，可直接交给 charge_analytics.parse_export；
+        info 为 {"first", "next", "sent"}，没有收到结束帧时为 None
+    """
+    _write_all(fd, bytes.fromhex(get_cmd_hex("log_export", 0, list(struct.pack("<II", start, count)))))
+    buf = _rx_buffers.setdefault(fd, bytearray())
+    chunks = bytearray()
+    deadline = time.monotonic() + timeout
+    while True:
+        if buf[:2] == CHUNK_SYNC:
+            if len(buf) >= 2 + CHUNK_HEADER_SIZE:
+                n = buf[6] | buf[7] << 8
+                size = 2 + CHUNK_HEADER_SIZE + n * RECORD_SIZE + 4
+                if len(buf) >= size:
+                    chunks += buf[:size]
+                    del buf[:size]
+                    deadline = time.monotonic() + timeout
+                    continue
+        elif buf[:1] == b"\x25":
+            if len(buf) >= 3 and len(buf) >= buf[2] + 3:
+                reply = decode_frame(_read_reply(fd, 0))
+                if reply and reply["code"] == FUNCTION_CODE["log_export"] and len(reply["data"]) == 12:
+                    first, nxt, sent = struct.unpack("<III", bytes(reply["data"]))
+                    return bytes(chunks), {"first": first, "next": nxt, "sent": sent}
+                continue
+        elif buf:
+            # 块与帧之外的字节（例如调试输出）丢弃
+            del buf[:1]
+            continue
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return bytes(chunks), None
+        r, _, _ = select.select([fd], [], [], left)
+        if r:
+            try:
+                buf += os.read(fd, 4096)
+            except BlockingIOError:
+                pass
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        try:
+            view = view[os.write(fd, view):]
+        except BlockingIOError:
+            select.select([], [fd], [])
+
+
+def run_batch(steps, port=None, baudrate=115200, interval_ms=0, timeout=1.0, out=sys.stdout):
+    """按顺序发送已解析的指令并收集应答
+    Args:
+        steps: parse_script_line 的结果列表
+        port: 串口或 pty 路径，None 时只输出编码结果
+        interval_ms: 相邻两条指令之间的额外间隔
+        timeout: 每条指令等待应答的秒数
+    Returns:
+        每条指令的结果字典列表
+    """
+    fd = None
+    if port:
+        from fixture_line import open_serial
+        fd = open_serial(port, baudrate)
+    results = []
+    try:
+        for index, (cmd_str, slot, data) in enumerate(steps):
+            if cmd_str == "sleep":
+                time.sleep(slot / 1000.0)
+                continue
+            tx = get_cmd_hex(cmd_str, slot, data)
+            result = {"index": index, "cmd": cmd_str, "slot": slot, "tx": tx, "rx": None, "reply": None, "latency_ms": None}
+            if fd is not None:
+                start = time.monotonic()
+                _write_all(fd, bytes.fromhex(tx))
+                frames = []
+                if cmd_str == "run_plan":
+                    # 每个被测通道回复一帧，计划中的等待时间计入超时
+                    rx = _read_reply(fd, timeout + _plan_seconds(data))
+                    while rx is not None:
+                        frames.append(rx)
+                        if len(frames) == bin(slot).count("1"):
+                            break
+                        rx = _read_reply(fd, timeout)
+                else:
+                    rx = _read_reply(fd, timeout)
+                    if rx is not None:
+                        frames.append(rx)
+                if frames:
+                    result["latency_ms"] = (time.monotonic() - start) * 1000.0
+                    result["rx"] = ' | '.join(' '.join(["{:02X}".format(b) for b in f]) for f in frames)
+                    result["reply"] = decode_frame(frames[0])
+                    if cmd_str == "run_plan":
+                        result["plan"] = [(r["slot"], decode_plan_result(r["data"]))
+                                          for r in map(decode_frame, frames) if r]
+                if interval_ms:
+                    time.sleep(interval_ms / 1000.0)
+            results.append(result)
+            _print_result(result, out)
+    finally:
+        if fd is not None:
+            _rx_buffers.pop(fd, None)
+            os.close(fd)
+    _print_summary(results, out)
+    return results
+
+
+def _print_result(r, out):
+    text = "{:4d} {:<16} slot{} TX: {}".format(r["index"], r["cmd"], r["slot"], r["tx"])
+    if r["rx"] is not None:
+        text += " RX: {}".format(r["rx"])
+        if r["reply"]:
+            text += " data={} xor={}".format(r["reply"]["data"], "OK" if r["reply"]["xor_ok"] else "BAD")
+        text += " {:.1f}ms".format(r["latency_ms"])
+    print(text, file=out)
+    for slot, res in r.get("plan", []):
+        print("     slot{} {}".format(slot, res), file=out)
+
+
+def _plan_seconds(data):
+    # wait 与 settle 步骤的最长耗时
+    total = 0
+    for i in range(0, len(data), 6):
+        if data[i] == PLAN_OPS["wait"]:
+            total += data[i + 2] | data[i + 3] << 8
+        elif data[i] == PLAN_OPS["settle"]:
+            total += (data[i + 1] & 0x7F) * 100
+    return total / 1000.0
+
+
+def _print_summary(results, out):
+    latencies = [r["latency_ms"] for r in results if r["latency_ms"] is not None]
+    timeouts = sum(1 for r in results if r["rx"] is None)
+    if not latencies:
+        print("# {} commands".format(len(results)), file=out)
+        return
+    print("# {} commands, {} replies, {} no reply, latency min/avg/max {:.1f}/{:.1f}/{:.1f} ms, total {:.1f} ms".format(
+        len(results), len(latencies), timeouts, min(latencies), sum(latencies) / len(latencies), max(latencies), sum(latencies)), file=out)
+
+
+def batch_main(argv=None):
+    """非交互模式：从文件或标准输入读取指令脚本并批量执行"""
+    parser = argparse.ArgumentParser(description="批量编码并发送指令脚本，每行: <cmd> <slot> [参数]")
+    parser.add_argument("--script", help="脚本文件，- 表示标准输入")
+    parser.add_argument("--export-log", default=None, help="从 --port 导出测量记录到该文件，供 charge_analytics.py 分析")
+    parser.add_argument("--start", type=lambda v: int(v, 0), default=0, help="导出的第一条记录序号")
+    parser.add_argument("--count", type=lambda v: int(v, 0), default=0xFFFFFFFF, help="导出的记录条数")
+    parser.add_argument("--port", default=None, help="串口或 pty 路径，不指定时只输出编码结果")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--interval", type=int, default=0, help="指令间隔 ms")
+    parser.add_argument("--timeout", type=float, default=1.0, help="每条指令等待应答的秒数")
+    args = parser.parse_args(argv)
+    if args.export_log:
+        if not args.port:
+            parser.error("--export-log needs --port")
+        return export_main(args)
+    if not args.script:
+        parser.error("--script or --export-log is required")
+
+    f = sys.stdin if args.script == "-" else open(args.script, "r", encoding="utf-8")
+    steps = []
+    errors = 0
+    with f:
+        for lineno, line in enumerate(f, 1):
+            try:
+                step = parse_script_line(line)
+            except Exception as e:
+                print("line {}: {}: {}".format(lineno, line.strip(), e), file=sys.stderr)
+                errors += 1
+                continue
+            if step:
+                steps.append(step)
+    if errors:
+        return 1
+    results = run_batch(steps, args.port, args.baud, args.interval, args.timeout)
+    if args.port and any(r["rx"] is None for r in results):
+        return 1
+    return 0
+
+
+def export_main(args):
+    from fixture_line import open_serial
+    fd = open_serial(args.port, args.baud)
+    try:
+        chunks, info = export_log(fd, args.start, args.count, args.timeout)
+    finally:
+        _rx_buffers.pop(fd, None)
+        os.close(fd)
+    with open(args.export_log, "wb") as f:
+        f.write(chunks)
+    if info is None:
+        print("log_export: no end frame, {} bytes saved".format(len(chunks)), file=sys.stderr)
+        return 1
+    print("log_export: {} records saved, board keeps {}-{}".format(info["sent"], info["first"], info["next"] - 1))
+    return 0
+
+
 def show_menu():
     """显示指令菜单"""
     print("\n=== 指令选择菜单 ===")
@@ -127,7 +529,7 @@ def get_user_input():
                 except ValueError:
                     # 尝试解析为列表
                     try:
-                        data = eval(param_input)
+                        data = ast.literal_eval(param_input)
                         if not isinstance(data, (int, list)):
                             print("参数格式错误，忽略参数")
                             data = None
@@ -169,4 +571,6 @@ def main():
     print("程序结束，感谢使用！")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(batch_main())
     main()
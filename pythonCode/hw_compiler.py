@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+
+# 设备类参数表：(参数名, 类型, 默认值)，默认值为 REQUIRED 表示必填
+# 顺序必须与 b06_main.py 中各类 __init__ 的位置参数一致
+REQUIRED = object()
+
+DEVICE_SCHEMA = {
+    "OutputDev": (("pin", int, REQUIRED), ("asserted", int, 1)),
+    "LED": (("pin", int, REQUIRED), ("asserted", int, 0)),
+    "Cylinder": (),
+    "Button": (("pin", int, REQUIRED), ("pull_up", bool, True), ("long_press", int, 1500)),
+    "Sensor": (("pin", int, REQUIRED), ("pull_up", bool, True)),
+}
+
+# InputDev 子类绑定时必须给出触发模式，其余类不接受 mode
+INPUT_CLASSES = ("Button", "Sensor")
+BIND_MODES = ("IRQ_FALLING", "IRQ_RISING", "IRQ_RISING_FALLING")
+# 可以被绑定（需要 on/off/stop）的目标类
+TARGET_CLASSES = ("OutputDev", "LED", "Cylinder")
+
+GPIO_RANGE = range(0, 30)
+# 固件自身占用的引脚：UART0 TX/RX、呼吸灯 PWM；LEDBoard 的 SCL/SDA 来自 ledboard 段
+RESERVED_PINS = {0: "uart tx", 1: "uart rx", 29: "pwm"}
+
+# ledboard 段：(参数名, 类型, 默认值)，与 led_board.LEDBoard 的关键字参数一致
+LEDBOARD_SCHEMA = (
+    ("scl", int, 22),
+    ("sda", int, 23),
+    ("freq", int, 100000),
+    ("expanders", list, [0x20]),
+    ("slots", int, None),
+)
+CAT9555_ADDRESSES = range(0x20, 0x28)
+SLOT_BITS = 3
+
+
+class ConfigError(Exception):
+    def __init__(self, errors):
+        super().__init__("\n".join(errors))
+        self.errors = errors
+
+
+def _check_type(value, typ):
+    # bool 是 int 的子类，需要单独区分
+    if typ is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, typ)
+
+
+def _validate_ledboard(cfg, pins, errors):
+    if not isinstance(cfg, dict):
+        errors.append("'ledboard' must be an object")
+        return {}
+    known = {p[0] for p in LEDBOARD_SCHEMA}
+    for key in cfg:
+        if key not in known:
+            errors.append(f"ledboard: unknown parameter '{key}'")
+    table = {}
+    for param, typ, default in LEDBOARD_SCHEMA:
+        value = cfg.get(param, default)
+        if param in cfg and not (value is None and default is None) and not _check_type(value, typ):
+            errors.append(f"ledboard: '{param}' must be {typ.__name__}, got {value!r}")
+            continue
+        table[param] = value
+    for param in ("scl", "sda"):
+        pin = table.get(param)
+        if not isinstance(pin, int):
+            continue
+        if pin not in GPIO_RANGE:
+            errors.append(f"ledboard: {param} pin {pin} out of range 0-29")
+        elif pin in pins:
+            errors.append(f"ledboard: {param} pin {pin} already used by {pins[pin]}")
+        else:
+            pins[pin] = f"ledboard {param}"
+    expanders = table.get("expanders")
+    if isinstance(expanders, list):
+        if not expanders:
+            errors.append("ledboard: 'expanders' must not be empty")
+        for addr in expanders:
+            if not _check_type(addr, int) or addr not in CAT9555_ADDRESSES:
+                errors.append(f"ledboard: expander address {addr!r} not in 0x20-0x27")
+        # 类型错误的条目已报告过，不再参与重复检查
+        valid = [a for a in expanders if _check_type(a, int)]
+        if len(set(valid)) != len(valid):
+            errors.append("ledboard: duplicate expander address")
+        slots = table.get("slots")
+        max_slots = len(expanders) * 16 // SLOT_BITS
+        if isinstance(slots, int) and not 0 < slots <= max_slots:
+            errors.append(f"ledboard: slots {slots} out of range 1-{max_slots} for {len(expanders)} expanders")
+    return table
+
+
+def _validate_devices(devices, errors, pins):
+    table = []
+    if not isinstance(devices, dict) or not devices:
+        errors.append("'device' must be a non-empty object")
+        return table
+    for name, cfg in devices.items():
+        if not isinstance(cfg, dict):
+            errors.append(f"device '{name}': config must be an object")
+            continue
+        cls = cfg.get("class")
+        schema = DEVICE_SCHEMA.get(cls) if isinstance(cls, str) else None
+        if schema is None:
+            errors.append(f"device '{name}': unknown class {cls!r}")
+            continue
+        known = {"class"} | {p[0] for p in schema}
+        for key in cfg:
+            if key not in known:
+                errors.append(f"device '{name}': unknown parameter '{key}' for {cls}")
+        args = []
+        for param, typ, default in schema:
+            if param not in cfg:
+                if default is REQUIRED:
+                    errors.append(f"device '{name}': missing parameter '{param}'")
+                args.append(default)
+                continue
+            value = cfg[param]
+            if not _check_type(value, typ):
+                errors.append(f"device '{name}': '{param}' must be {typ.__name__}, got {value!r}")
+            elif param == "pin":
+                if value not in GPIO_RANGE:
+                    errors.append(f"device '{name}': pin {value} out of range 0-29")
+                elif value in pins:
+                    errors.append(f"device '{name}': pin {value} already used by {pins[value]}")
+                else:
+                    pins[value] = f"'{name}'"
+            elif param == "asserted" and value not in (0, 1):
+                errors.append(f"device '{name}': asserted must be 0 or 1")
+            args.append(value)
+        table.append((name, cls, tuple(args)))
+    return table
+
+
+def _validate_bindings(bindings, devices, errors, valid=None):
+    # valid 为通过校验的设备名；引用其余设备的绑定跳过，设备本身的错误已经报告过
+    table = []
+    if not isinstance(bindings, list):
+        errors.append("'bindings' must be an array")
+        return table
+    for i, action in enumerate(bindings):
+        if not isinstance(action, dict):
+            errors.append(f"binding #{i}: must be an object")
+            continue
+        for key in action:
+            if key not in ("source", "target", "mode"):
+                errors.append(f"binding #{i}: unknown key '{key}'")
+        source = action.get("source")
+        target = action.get("target")
+        mode = action.get("mode")
+        if not isinstance(source, str):
+            errors.append(f"binding #{i}: source must be a device name, got {source!r}")
+            continue
+        if not isinstance(target, str):
+            errors.append(f"binding #{i}: target must be a device name, got {target!r}")
+            continue
+        if source not in devices:
+            errors.append(f"binding #{i}: source device {source!r} not found")
+            continue
+        if target not in devices:
+            errors.append(f"binding #{i}: target device {target!r} not found")
+            continue
+        if valid is not None and (source not in valid or target not in valid):
+            continue
+        if source == target:
+            errors.append(f"binding #{i}: '{source}' bound to itself")
+        source_cls = devices[source].get("class")
+        target_cls = devices[target].get("class")
+        if target_cls not in TARGET_CLASSES:
+            errors.append(f"binding #{i}: target '{target}' ({target_cls}) cannot be driven")
+        if source_cls in INPUT_CLASSES:
+            if mode not in BIND_MODES:
+                errors.append(f"binding #{i}: {source_cls} '{source}' needs mode in {BIND_MODES}, got {mode!r}")
+        elif mode is not None:
+            errors.append(f"binding #{i}: {source_cls} '{source}' does not take a mode")
+        table.append((source, target, mode))
+    return table
+
+
+def compile_profile(config):
+    """校验 hw_profile 配置并生成预编译设备表
+    Args:
+        config: 已解析的 hw_profile.json 内容
+    Returns:
+        (devices, bindings, ledboard, i2c_worker) 元组，devices 为 (name, class, args)，
+        bindings 为 (source, target, mode)，ledboard 为 LEDBoard 的关键字参数，
+        i2c_worker 为是否在第二个核心上运行 I2C
+    Raises:
+        ConfigError: 配置中存在的全部错误
+    """
+    errors = []
+    if not isinstance(config, dict):
+        raise ConfigError(["top level must be an object"])
+    for key in config:
+        if key not in ("device", "bindings", "ledboard", "i2c_worker"):
+            errors.append(f"unknown top level key '{key}'")
+    i2c_worker = config.get("i2c_worker", False)
+    if not isinstance(i2c_worker, bool):
+        errors.append(f"'i2c_worker' must be true or false, got {i2c_worker!r}")
+    pins = dict(RESERVED_PINS)
+    ledboard = _validate_ledboard(config.get("ledboard", {}), pins, errors)
+    devices = config.get("device", {})
+    device_table = _validate_devices(devices, errors, pins)
+    valid = {name for name, _cls, _args in device_table}
+    binding_table = _validate_bindings(config.get("bindings", []), devices if isinstance(devices, dict) else {}, errors, valid)
+    if errors:
+        raise ConfigError(errors)
+    return device_table, binding_table, ledboard, i2c_worker
+
+
+def render_table(device_table, binding_table, ledboard=None, i2c_worker=False, source_name="hw_profile.json"):
+    lines = [
+        f"# generated by hw_compiler.py from {source_name}, do not edit",
+        "DEVICES = (",
+    ]
+    for name, cls, args in device_table:
+        lines.append(f"    ({name!r}, {cls!r}, {args!r}),")
+    lines.append(")")
+    lines.append("BINDINGS = (")
+    for source, target, mode in binding_table:
+        lines.append(f"    ({source!r}, {target!r}, {mode!r}),")
+    lines.append(")")
+    lines.append(f"LEDBOARD = {ledboard or {}!r}")
+    lines.append(f"I2C_WORKER = {i2c_worker!r}")
+    return "\n".join(lines) + "\n"
+
+
+def compile_file(profile_path, output_path):
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        try:
+            config = json.load(f)
+        except ValueError as e:
+            raise ConfigError([f"{profile_path}: invalid JSON: {e}"])
+    device_table, binding_table, ledboard, i2c_worker = compile_profile(config)
+    with open(output_path, 'w') as f:
+        f.write(render_table(device_table, binding_table, ledboard, i2c_worker, os.path.basename(profile_path)))
+    return len(device_table), len(binding_table)
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    profile_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(current_dir, "fw_upload_to_pyboard", "hw_profile.json")
+    output_path = sys.argv[2] if len(sys.argv) > 2 else "hw_devices.py"
+    try:
+        n_dev, n_bind = compile_file(profile_path, output_path)
+    except ConfigError as e:
+        for err in e.errors:
+            print(f"Error: {err}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{profile_path}: {n_dev} devices, {n_bind} bindings -> {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import sys
+import zlib
+import struct
+import argparse
+from collections import namedtuple, defaultdict
+
+# 与固件 i2c_trace.py 一致
+RECORD = struct.Struct("<IHBBBBB5s")
+CHUNK_SYNC = b"\xAA\x5A"
+CHUNK_HEADER = struct.Struct("<IH")
+TICKS_US_PERIOD = 1 << 30
+
+OP_READ, OP_WRITE, OP_RECV, OP_SEND, OP_PROBE, OP_SCAN = range(1, 7)
+OP_NAMES = {OP_READ: "read", OP_WRITE: "write", OP_RECV: "recv", OP_SEND: "send", OP_PROBE: "probe", OP_SCAN: "scan"}
+
+# 已知器件：名称与可缓存（锁存、不会自行变化）的寄存器
+DEVICES = {
+    0x20: ("CAT9555", range(0x02, 0x08)),
+    0x21: ("CAT9555", range(0x02, 0x08)),
+    0x6B: ("SC89620", ()),
+    0x38: ("OM70201WV", ()),
+}
+
+# SoftI2C.scan 探测的地址范围
+SCAN_ADDRESSES = 0x78 - 0x08
+
+Transaction = namedtuple("Transaction", "seq t_us duration_us op addr reg result length data")
+
+
+def parse_export(data):
+    """解析 trace_export 输出的分块二进制流，校验失败的块被丢弃
+    Returns:
+        按序号排序去重的 Transaction 列表，t_us 已展开 ticks_us 回绕
+    """
+    data = bytes(data)
+    records = {}
+    pos = data.find(CHUNK_SYNC)
+    while pos >= 0 and pos + 2 + CHUNK_HEADER.size <= len(data):
+        first, count = CHUNK_HEADER.unpack_from(data, pos + 2)
+        body = pos + 2 + CHUNK_HEADER.size
+        end = body + count * RECORD.size
+        if end + 4 <= len(data):
+            crc = int.from_bytes(data[end:end + 4], "little")
+            if zlib.crc32(data[pos + 2:end]) == crc:
+                for i in range(count):
+                    records[first + i] = RECORD.unpack_from(data, body + i * RECORD.size)
+                pos = data.find(CHUNK_SYNC, end + 4)
+                continue
+        pos = data.find(CHUNK_SYNC, pos + 1)
+    out = []
+    t = None
+    for seq in sorted(records):
+        ticks, duration, op, addr, reg, result, length, raw = records[seq]
+        t = ticks if t is None else t + (ticks - t) % TICKS_US_PERIOD
+        out.append(Transaction(seq, t, duration, op, addr, reg, result, length, raw[:min(length, 5)]))
+    return out
+
+
+def device_name(addr):
+    if addr == 0xFF:
+        return "scan"
+    return DEVICES.get(addr, ("0x{:02X}".format(addr), ()))[0]
+
+
+def transfer_bits(op, length):
+    """一次事务在总线上的位数：每字节 9 位，START/STOP/重复 START 各计 1 位"""
+    if op == OP_READ:
+        return (3 + length) * 9 + 3
+    if op in (OP_WRITE, OP_SEND):
+        return (2 + length) * 9 + 2
+    if op == OP_RECV:
+        return (1 + length) * 9 + 2
+    if op == OP_PROBE:
+        return 9 + 2
+    if op == OP_SCAN:
+        return SCAN_ADDRESSES * (9 + 2)
+    return 0
+
+
+class SimBus(object):
+    """模拟 I2C 总线：按寄存器镜像应答，按位数和频率计时，结果可重复
+
+    寄存器初值取自回放轨迹中读到的数据；接口与 SoftI2CBus 相同，
+    也可以直接给 cat9555.CAT9555 等驱动使用
+    """
+
+    def __init__(self, freq=100000, present=None):
+        self.freq = freq
+        self.present = set(present) if present is not None else set(DEVICES)
+        self.regs = defaultdict(lambda: bytearray(256))
+        self.bus_us = 0.0
+        self.transactions = 0
+
+    def _cost(self, op, length):
+        self.transactions += 1
+        self.bus_us += transfer_bits(op, length) * 1e6 / self.freq
+
+    def _check(self, addr):
+        if addr not in self.present:
+            raise OSError(19, "ENODEV")
+
+    def read(self, addr, reg, length, addrsize=8):
+        self._cost(OP_READ, length)
+        self._check(addr)
+        regs = self.regs[addr]
+        return [regs[(reg + i) & 0xFF] for i in range(length)]
+
+    def write(self, addr, data, addrsize=8):
+        self._cost(OP_WRITE if len(data) > 1 else OP_SEND, len(data) - 1)
+        self._check(addr)
+        regs = self.regs[addr]
+        for i, v in enumerate(data[1:]):
+            regs[(data[0] + i) & 0xFF] = v
+
+    def send(self, addr, data):
+        self.write(addr, data)
+
+    def recv(self, addr, length):
+        self._cost(OP_RECV, length)
+        self._check(addr)
+        return [0] * length
+
+    def write_and_read(self, addr, wr_data, length, addrsize=8):
+        if len(wr_data) > 1:
+            self.write(addr, wr_data)
+        return self.read(addr, wr_data[0], length)
+
+    def probe(self, addr):
+        self._cost(OP_PROBE, 0)
+        return addr in self.present
+
+    is_ready = probe
+
+    def scan(self):
+        self._cost(OP_SCAN, 0)
+        return sorted(self.present)
+
+
+def timelines(transactions):
+    """按器件整理寄存器时间线
+    Returns:
+        {addr: {reg: [(t_ms, op, values, result), ...]}}
+    """
+    start = transactions[0].t_us if transactions else 0
+    out = defaultdict(lambda: defaultdict(list))
+    for tr in transactions:
+        if tr.op in (OP_READ, OP_WRITE):
+            out[tr.addr][tr.reg].append(((tr.t_us - start) / 1000.0, OP_NAMES[tr.op], list(tr.data), tr.result))
+    return out
+
+
+def replay(transactions, bus=None, optimize=()):
+    """把轨迹回放到模拟总线上，可选优化：
+        dedup-writes: 写入值与寄存器已知值相同时跳过
+        cache-reads:  可缓存寄存器已知时跳过读取（见 DEVICES）
+    Returns:
+        dict: 回放统计，含每个器件的事务数与模型总线时间
+    """
+    bus = bus or SimBus()
+    known = defaultdict(dict)
+    stats = defaultdict(lambda: {"transactions": 0, "skipped": 0, "bus_us": 0.0, "recorded_us": 0})
+    for tr in transactions:
+        dev = stats[tr.addr]
+        dev["recorded_us"] += tr.duration_us
+        values = list(tr.data)
+        regs = [(tr.reg + i) & 0xFF for i in range(len(values))]
+        full = len(values) == tr.length
+        if tr.op == OP_WRITE and "dedup-writes" in optimize and full and values and \
+                all(known[tr.addr].get(r) == v for r, v in zip(regs, values)):
+            dev["skipped"] += 1
+            continue
+        if tr.op == OP_READ and "cache-reads" in optimize and full and tr.result == 0 and \
+                all(r in _cacheable(tr.addr) and r in known[tr.addr] for r in regs):
+            dev["skipped"] += 1
+            continue
+        before = bus.bus_us
+        try:
+            if tr.op == OP_READ:
+                if tr.result == 0:
+                    # 读到的值写入模拟器件，后续回放按真实数据应答
+                    for r, v in zip(regs, values):
+                        bus.regs[tr.addr][r] = v
+                bus.read(tr.addr, tr.reg, tr.length)
+            elif tr.op == OP_WRITE:
+                bus.write(tr.addr, [tr.reg] + values + [0] * (tr.length - len(values)))
+            elif tr.op == OP_SEND:
+                bus.send(tr.addr, [tr.reg] + values)
+            elif tr.op == OP_RECV:
+                bus.recv(tr.addr, tr.length)
+            elif tr.op == OP_PROBE:
+                bus.probe(tr.addr)
+            elif tr.op == OP_SCAN:
+                bus.scan()
+        except OSError:
+            pass
+        dev["transactions"] += 1
+        dev["bus_us"] += bus.bus_us - before
+        if tr.result == 0 and tr.op in (OP_READ, OP_WRITE) and full:
+            known[tr.addr].update(zip(regs, values))
+    return {
+        "transactions": sum(d["transactions"] for d in stats.values()),
+        "skipped": sum(d["skipped"] for d in stats.values()),
+        "bus_us": bus.bus_us,
+        "devices": dict(stats),
+    }
+
+
+def _cacheable(addr):
+    return DEVICES.get(addr, (None, ()))[1]
+
+
+def print_timeline(transactions, out=sys.stdout):
+    for addr, regs in sorted(timelines(transactions).items()):
+        print(f"{device_name(addr)} @0x{addr:02X}", file=out)
+        for reg, events in sorted(regs.items()):
+            text = " ".join(
+                f"{t:.1f}ms:{'R' if op == 'read' else 'W'}{'/'.join(f'{v:02X}' for v in values)}{'' if result == 0 else '!'}"
+                for t, op, values, result in events)
+            print(f"  reg 0x{reg:02X}: {text}", file=out)
+
+
+def print_replay(name, result, out=sys.stdout):
+    print(f"{name}: {result['transactions']} transactions, {result['skipped']} skipped, "
+          f"modelled bus time {result['bus_us'] / 1000.0:.2f} ms", file=out)
+    for addr, dev in sorted(result["devices"].items()):
+        print(f"  {device_name(addr):<10} @0x{addr:02X} n={dev['transactions']:<5} skipped={dev['skipped']:<5} "
+              f"bus={dev['bus_us'] / 1000.0:.2f}ms recorded={dev['recorded_us'] / 1000.0:.2f}ms", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解码 trace_export 抓包，输出寄存器时间线并在模拟总线上回放")
+    parser.add_argument("capture", help="trace_export 的原始串口抓包")
+    parser.add_argument("--freq", type=int, default=100000, help="模拟总线频率")
+    parser.add_argument("--timeline", action="store_true", help="输出每个器件的寄存器时间线")
+    parser.add_argument("--optimize", default="dedup-writes,cache-reads", help="回放时比较的优化，逗号分隔")
+    args = parser.parse_args()
+
+    with open(args.capture, "rb") as f:
+        transactions = parse_export(f.read())
+    if not transactions:
+        print("no valid trace chunks found", file=sys.stderr)
+        return 1
+    errors = sum(1 for tr in transactions if tr.result)
+    span = (transactions[-1].t_us - transactions[0].t_us) / 1000.0
+    print(f"# {len(transactions)} transactions over {span:.1f} ms, {errors} failed")
+    if args.timeline:
+        print_timeline(transactions)
+    print_replay("baseline", replay(transactions, SimBus(args.freq)))
+    optimize = tuple(o for o in args.optimize.split(",") if o)
+    if optimize:
+        print_replay("+".join(optimize), replay(transactions, SimBus(args.freq), optimize))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
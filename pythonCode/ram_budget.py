@@ -0,0 +1,41 @@
+# 板上运行 (mpremote run ram_budget.py)：逐个导入固件模块，测量每个模块导入后常驻的堆内存
+import gc
+import sys
+
+# 按依赖顺序排列，先导入的依赖不计入后面模块；b06_main 导入即运行主循环，不在此列
+MODULES = (
+    "timing", "fastbits", "soft_i2c", "cat9555", "pin", "led_board",
+    "kvstore", "meas_log", "mem_profiler", "supervisor", "slot_test",
+)
+
+
+def import_cost(name):
+    """导入一个模块并返回其常驻堆内存（字节），已导入的模块先卸载再测"""
+    if name in sys.modules:
+        del sys.modules[name]
+    gc.collect()
+    before = gc.mem_alloc()
+    __import__(name)
+    gc.collect()
+    return gc.mem_alloc() - before
+
+
+def main():
+    gc.collect()
+    base_free = gc.mem_free()
+    total = 0
+    print("{:<16}{:>10}".format("module", "ram bytes"))
+    for name in MODULES:
+        try:
+            cost = import_cost(name)
+        except Exception as e:
+            print("{:<16}{:>10}  {}".format(name, "-", e))
+            continue
+        total += cost
+        print("{:<16}{:>10}".format(name, cost))
+    gc.collect()
+    print("{:<16}{:>10}".format("total", total))
+    print("heap free {} -> {}".format(base_free, gc.mem_free()))
+
+
+main()
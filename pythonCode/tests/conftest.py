@@ -0,0 +1,9 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+# 主机工具在 pythonCode/，可在 CPython 下运行的固件模块在 fw_upload_to_pyboard/
+for path in (ROOT, os.path.join(ROOT, "fw_upload_to_pyboard")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
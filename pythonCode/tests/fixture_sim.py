@@ -0,0 +1,93 @@
+import os
+import pty
+import time
+import select
+import threading
+
+
+class SimBoard:
+    """在 pty 上模拟 b06_main 的指令处理，供 fixture_line 测试使用
+
+    与 UARTManager 一致：收到的行进入深度为 depth 的队列，队列满时回复 "#<seq> [BUSY]"；
+    每次循环只执行一条，执行中的指令不占队列位置。支持的指令：
+        echo <text>    输出 "<text>\\n" 后回复 [OK]
+        fail           回复 "[ERR] boom"
+        slow <ms>      等待 ms 毫秒后回复 [OK]
+        silent         不回复
+        其他           回复 "not found function [ERR]"
+
+    Args:
+        depth: 板端指令队列深度
+        exec_delay: 每条指令的执行时间（秒）
+    """
+
+    def __init__(self, depth=8, exec_delay=0.0):
+        self.depth = depth
+        self.exec_delay = exec_delay
+        self.master, self._slave = pty.openpty()
+        self.path = os.ttyname(self._slave)
+        self.received = []
+        self.busy = 0
+        self.max_queue = 0
+        self._queue = []
+        self._rx = bytearray()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._running = False
+        self._thread.join()
+        os.close(self.master)
+        os.close(self._slave)
+
+    def _run(self):
+        while self._running:
+            ready, _, _ = select.select([self.master], [], [], 0.005)
+            if ready:
+                self._rx += os.read(self.master, 4096)
+                self._enqueue_lines()
+            if self._queue:
+                self._execute(*self._queue.pop(0))
+
+    def _enqueue_lines(self):
+        while b"\n" in self._rx:
+            line, _, rest = bytes(self._rx).partition(b"\n")
+            self._rx = bytearray(rest)
+            seq = None
+            if line.startswith(b"#"):
+                head, _, line = line.partition(b" ")
+                seq = head[1:].decode()
+            self.received.append(line.decode())
+            if len(self._queue) >= self.depth:
+                self.busy += 1
+                self._reply(seq, "[BUSY]")
+                continue
+            self._queue.append((seq, line.decode()))
+            self.max_queue = max(self.max_queue, len(self._queue))
+
+    def _execute(self, seq, line):
+        name, _, arg = line.partition(" ")
+        if self.exec_delay:
+            time.sleep(self.exec_delay)
+        if name == "echo":
+            os.write(self.master, arg.encode() + b"\n")
+            self._reply(seq, "echo [OK]")
+        elif name == "fail":
+            self._reply(seq, "[ERR] boom")
+        elif name == "slow":
+            time.sleep(int(arg) / 1000)
+            self._reply(seq, "slow [OK]")
+        elif name == "silent":
+            pass
+        else:
+            self._reply(seq, "not found function [ERR]")
+
+    def _reply(self, seq, text):
+        if seq is None:
+            os.write(self.master, f"{text}\n".encode())
+        else:
+            os.write(self.master, f"#{seq} {text}\n".encode())
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from fixture_line import FixtureLine, FixturePort, FixtureTimeout
+from fixture_sim import SimBoard
+
+
+async def _with_port(board, body, **kwargs):
+    port = FixturePort("A", board.path, **kwargs)
+    await port.open()
+    try:
+        return await body(port)
+    finally:
+        await port.close()
+
+
+def test_seq_matching_keeps_payload_with_its_command():
+    async def body(port):
+        return await asyncio.gather(*[port.request("echo", f"line{i}") for i in range(6)])
+
+    with SimBoard() as board:
+        replies = asyncio.run(_with_port(board, body))
+    for i, reply in enumerate(replies):
+        assert reply.ok
+        assert reply.status == "echo [OK]"
+        assert reply.lines == [f"line{i}"]
+
+
+def test_late_reply_after_timeout_is_dropped():
+    async def body(port):
+        with pytest.raises(FixtureTimeout):
+            await port.request("slow", 200, timeout=0.05)
+        # 迟到的 "#1 slow [OK]" 不能被当作下一条指令的回复
+        return await port.request("echo", "after")
+
+    with SimBoard() as board:
+        reply = asyncio.run(_with_port(board, body))
+    assert reply.ok
+    assert reply.lines == ["after"]
+
+
+def test_window_of_eight_never_overflows_board_queue():
+    async def body(port):
+        return await asyncio.gather(*[port.request("echo", i) for i in range(30)])
+
+    with SimBoard(depth=8, exec_delay=0.002) as board:
+        replies = asyncio.run(_with_port(board, body, window=8))
+        assert board.busy == 0
+        assert board.max_queue <= 8
+    assert [r.lines for r in replies] == [[str(i)] for i in range(30)]
+
+
+def test_busy_replies_are_retried():
+    async def body(port):
+        return await asyncio.gather(*[port.request("echo", i) for i in range(20)])
+
+    with SimBoard(depth=8, exec_delay=0.005) as board:
+        replies = asyncio.run(_with_port(board, body, window=16))
+        assert board.busy > 0
+    assert all(r.ok for r in replies)
+    assert sorted(r.lines[0] for r in replies) == sorted(str(i) for i in range(20))
+
+
+def test_err_replies():
+    async def body(port):
+        return await port.request("fail"), await port.request("missing")
+
+    with SimBoard() as board:
+        fail, missing = asyncio.run(_with_port(board, body))
+    assert not fail.ok
+    assert fail.status == "[ERR] boom"
+    assert not missing.ok
+    assert missing.status == "not found function [ERR]"
+
+
+def test_timeout_retries_then_raises():
+    async def body(port):
+        with pytest.raises(FixtureTimeout):
+            await port.request("silent", timeout=0.05, retries=2)
+
+    with SimBoard() as board:
+        asyncio.run(_with_port(board, body))
+        assert board.received == ["silent"] * 3
+
+
+def test_unsequenced_request():
+    async def body(port):
+        return await port.request("echo", "plain"), await port.request("fail")
+
+    with SimBoard() as board:
+        ok, fail = asyncio.run(_with_port(board, body, sequenced=False))
+        assert board.received == ["echo plain", "fail"]
+    assert ok.ok and ok.lines == ["plain"]
+    assert not fail.ok and fail.status == "[ERR] boom"
+
+
+def test_run_all_reports_each_fixture():
+    async def body(boards):
+        async with FixtureLine({name: b.path for name, b in boards.items()}) as line:
+            return await line.run_all("echo", "hi", timeout=1.0)
+
+    with SimBoard() as a, SimBoard() as b:
+        results = asyncio.run(body({"A": a, "B": b}))
+    assert set(results) == {"A", "B"}
+    assert all(r.ok and r.lines == ["hi"] for r in results.values())
+
+
+def test_run_all_keeps_other_fixtures_when_one_fails():
+    async def body(boards):
+        async with FixtureLine({name: b.path for name, b in boards.items()}) as line:
+            return await line.run_all("slow", 10, timeout=0.1)
+
+    with SimBoard() as a, SimBoard(exec_delay=0.3) as b:
+        results = asyncio.run(body({"A": a, "B": b}))
+    assert results["A"].ok
+    assert isinstance(results["B"], FixtureTimeout)
+
+
+def test_pipeline_returns_replies_in_send_order():
+    commands = [("echo", "one"), ("fail",), ("echo", "two"), ("missing",)]
+
+    async def body(board):
+        async with FixtureLine({"A": board.path}) as line:
+            return await line.pipeline("A", commands, timeout=1.0)
+
+    with SimBoard(exec_delay=0.002) as board:
+        replies = asyncio.run(body(board))
+    assert [r.ok for r in replies] == [True, False, True, False]
+    assert [r.command for r in replies] == ["echo one", "fail", "echo two", "missing"]
+    assert replies[0].lines == ["one"]
+    assert replies[2].lines == ["two"]
@@ -0,0 +1,56 @@
+import os
+import pty
+import struct
+import zlib
+
+from fixture_line import set_baudrate
+from get_cmd import _read_reply, compile_plan, decode_frame, export_log, get_cmd_hex
+
+
+def test_read_reply_keeps_frames_sent_in_one_burst():
+    master, slave = pty.openpty()
+    try:
+        set_baudrate(slave, 115200)
+        first = bytes.fromhex(get_cmd_hex("run_plan", 0x01, compile_plan("led 0 1")))
+        second = bytes.fromhex(get_cmd_hex("run_plan", 0x02, compile_plan("led 1 1")))
+        os.write(master, first + second + b"done\n")
+        assert _read_reply(slave, 0.5) == first
+        assert _read_reply(slave, 0.5) == second
+        assert _read_reply(slave, 0.5) == b"done\n"
+        assert _read_reply(slave, 0.05) is None
+        assert decode_frame(second)["slot"] == 0x02
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def _chunk(first, records):
+    header = struct.pack("<IH", first, len(records))
+    data = b"".join(struct.pack("<IBBHhH", 0x25, i % 4, 0, 3800 + i, -i, 50 << 8) for i in records)
+    return b"\xAA\x55" + header + data + struct.pack("<I", zlib.crc32(data, zlib.crc32(header)))
+
+
+def _end_frame(first, nxt, sent):
+    frame = bytearray([0x25, 0x3E, 16, 0x55, 0]) + struct.pack("<III", first, nxt, sent)
+    check = 0
+    for b in frame:
+        check ^= b
+    return bytes(frame + bytes([check, 0x0A]))
+
+
+def test_export_log_collects_chunks_until_end_frame():
+    master, slave = pty.openpty()
+    try:
+        set_baudrate(slave, 115200)
+        stream = _chunk(8, range(8, 40)) + _chunk(40, range(40, 45))
+        # 0x25 字节出现在记录数据中也不能被当作结束帧
+        assert b"\x25" in stream
+        os.write(master, b"boot\n" + stream + _end_frame(8, 45, 37))
+        chunks, info = export_log(slave, 0, 0xFFFFFFFF, 0.5)
+        request = os.read(master, 64)
+        assert decode_frame(request)["data"] == [0] * 4 + [0xFF] * 4
+        assert chunks == stream
+        assert info == {"first": 8, "next": 45, "sent": 37}
+    finally:
+        os.close(master)
+        os.close(slave)
@@ -0,0 +1,60 @@
+from hw_compiler import ConfigError, _validate_ledboard, compile_profile
+
+
+def _errors(expanders):
+    errors = []
+    _validate_ledboard({"expanders": expanders}, {}, errors)
+    return errors
+
+
+def test_bad_expander_entry_is_not_reported_as_duplicate():
+    assert _errors([0x20, "0x21"]) == ["ledboard: expander address '0x21' not in 0x20-0x27"]
+    assert _errors([0x20, True]) == ["ledboard: expander address True not in 0x20-0x27"]
+
+
+def test_duplicate_expander_address():
+    assert _errors([0x20, 0x21, 0x20]) == ["ledboard: duplicate expander address"]
+
+
+def _config_errors(config):
+    try:
+        compile_profile(config)
+    except ConfigError as e:
+        return e.errors
+    return []
+
+
+def test_binding_to_device_with_bad_config_is_skipped():
+    errors = _config_errors({
+        "device": {"a": 5, "led": {"class": "LED", "pin": 3}},
+        "bindings": [{"source": "a", "target": "led"}],
+    })
+    assert errors == ["device 'a': config must be an object"]
+
+
+def test_binding_to_device_with_unknown_class_is_skipped():
+    errors = _config_errors({
+        "device": {"a": {"class": ["Button"]}, "led": {"class": "LED", "pin": 3}},
+        "bindings": [{"source": "a", "target": "led", "mode": "IRQ_FALLING"}],
+    })
+    assert errors == ["device 'a': unknown class ['Button']"]
+
+
+def test_binding_with_non_string_device_names():
+    devices = {"btn": {"class": "Button", "pin": 2}, "led": {"class": "LED", "pin": 3}}
+    errors = _config_errors({"device": devices, "bindings": [
+        {"source": ["btn"], "target": "led", "mode": "IRQ_FALLING"},
+        {"source": "btn", "target": {"name": "led"}, "mode": "IRQ_FALLING"},
+    ]})
+    assert errors == [
+        "binding #0: source must be a device name, got ['btn']",
+        "binding #1: target must be a device name, got {'name': 'led'}",
+    ]
+
+
+def test_valid_profile_compiles():
+    devices = {"btn": {"class": "Button", "pin": 2}, "led": {"class": "LED", "pin": 3}}
+    bindings = [{"source": "btn", "target": "led", "mode": "IRQ_FALLING"}]
+    device_table, binding_table, _ledboard, _worker = compile_profile({"device": devices, "bindings": bindings})
+    assert [name for name, _cls, _args in device_table] == ["btn", "led"]
+    assert binding_table == [("btn", "led", "IRQ_FALLING")]
@@ -0,0 +1,40 @@
+import os
+
+from kvstore import KVStore
+
+
+def test_rewrite_loop_compacts(tmp_path):
+    path = str(tmp_path / "cfg.kv")
+    store = KVStore(path, compact_size=512)
+    peak = 0
+    for i in range(500):
+        store.set("count", i)
+        store.set("name", "fixture_{}".format(i % 7))
+        peak = max(peak, os.path.getsize(path))
+    # 500 次覆盖写若不压缩会超过 20 KB
+    assert peak <= 2 * 512
+    reopened = KVStore(path)
+    assert reopened.get("count") == 499
+    assert reopened.get("name") == "fixture_2"
+
+
+def test_delete_frees_live_bytes(tmp_path):
+    path = str(tmp_path / "cfg.kv")
+    store = KVStore(path, compact_size=256)
+    for i in range(200):
+        store.set("k{}".format(i % 5), "x" * 20)
+        store.delete("k{}".format(i % 5))
+    assert os.path.getsize(path) <= 2 * 256
+    assert len(KVStore(path)) == 0
+
+
+def test_reload_keeps_accounting(tmp_path):
+    path = str(tmp_path / "cfg.kv")
+    store = KVStore(path, compact_size=256)
+    for i in range(20):
+        store.set("a", i)
+    reopened = KVStore(path, compact_size=256)
+    for i in range(200):
+        reopened.set("a", i)
+    assert os.path.getsize(path) <= 2 * 256
+    assert KVStore(path).get("a") == 199